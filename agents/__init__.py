@@ -2,7 +2,7 @@
 وكلاء منصة الذكاء الاصطناعي للمحفظة (أ)
 """
 
-from .base_agent import BaseAgent, AgentResponse
+from .base_agent import BaseAgent, AgentResponse, ExecutionContext, RequestCancelled, SessionState, execution_context
 
 # Project 1 agents
 from .project1 import (
@@ -26,6 +26,10 @@ __all__ = [
     # Base
     "BaseAgent",
     "AgentResponse",
+    "ExecutionContext",
+    "RequestCancelled",
+    "SessionState",
+    "execution_context",
     # Project 1
     "CoordinatorAgent",
     "DataAnalysisAgent",
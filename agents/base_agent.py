@@ -3,11 +3,21 @@
 """
 
 import os
+import threading
+import time
 from abc import ABC, abstractmethod
-from typing import Optional, Dict, Any, List
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional, Dict, Any, Callable, Iterator, List
 from pydantic import BaseModel, Field
 from anthropic import Anthropic
 from dotenv import load_dotenv
+from utils.concurrency import map_concurrently
+from utils.kb_tools import ToolCall, ToolLoopResult
+from utils.review_chunks import format_chunked_review, run_chunked_review
+from config import (
+    CRITIQUE_CHUNK_CHARS, CRITIQUE_CHUNK_MAX_TOKENS, CRITIQUE_MAX_FINDINGS, MAX_CONCURRENT_CALLS
+)
 
 load_dotenv()
 
@@ -21,6 +31,77 @@ class AgentResponse(BaseModel):
     agent_name_en: Optional[str] = Field(default=None, description="Agent name for display")
 
 
+class SessionState(BaseModel):
+    """Follow-up state of one user session, kept between requests."""
+    last_response: Optional[AgentResponse] = None
+    last_agent: Optional[str] = None
+    last_deck: Optional[Dict] = Field(default=None, description="Structured deck of the latest slides, for single-slide edits")
+
+
+class ExecutionContext(BaseModel):
+    """
+    State of one request. Agents are shared across sessions, so nothing that
+    belongs to a request or a session may live on the agent itself.
+    """
+    session: SessionState = Field(default_factory=SessionState)
+    thinking: Dict[int, List[str]] = Field(default_factory=dict, description="Thinking log per agent instance")
+    progress: List[str] = Field(default_factory=list, description="Every agent's steps in order, for live progress")
+    cancel_check: Optional[Callable[[], bool]] = Field(default=None, description="Returns True once the request was cancelled")
+
+
+class RequestCancelled(Exception):
+    """Raised at the next model call after the request was cancelled."""
+
+
+_current_context: ContextVar[Optional[ExecutionContext]] = ContextVar("execution_context", default=None)
+
+
+def current_context() -> ExecutionContext:
+    """The active request's context; agents only run inside execution_context()."""
+    context = _current_context.get()
+    if context is None:
+        # A context created here would be shared by every later call on this thread
+        raise RuntimeError("Agents must be invoked inside execution_context()")
+    return context
+
+
+@contextmanager
+def execution_context(
+    session: Optional[SessionState] = None,
+    cancel_check: Optional[Callable[[], bool]] = None
+) -> Iterator[ExecutionContext]:
+    """Run one request against the given session's follow-up state."""
+    token = _current_context.set(ExecutionContext(session=session or SessionState(), cancel_check=cancel_check))
+    try:
+        yield _current_context.get()
+    finally:
+        _current_context.reset(token)
+
+
+_clients: Dict[str, Anthropic] = {}
+_clients_lock = threading.Lock()
+
+
+def get_shared_client() -> Anthropic:
+    """One API client (and connection pool) per key for the whole process; the client is thread-safe."""
+    api_key = None
+    try:
+        import streamlit as st
+        api_key = st.secrets.get("ANTHROPIC_API_KEY")
+    except Exception:
+        pass
+
+    if not api_key:
+        api_key = os.getenv("ANTHROPIC_API_KEY")
+
+    if not api_key:
+        raise ValueError("ANTHROPIC_API_KEY not found")
+    with _clients_lock:
+        if api_key not in _clients:
+            _clients[api_key] = Anthropic(api_key=api_key)
+        return _clients[api_key]
+
+
 class BaseAgent(ABC):
     """Abstract base class for all agents."""
 
@@ -40,37 +121,205 @@ class BaseAgent(ABC):
         self.max_tokens = max_tokens
         self.temperature = temperature
 
-        api_key = None
-        try:
-            import streamlit as st
-            api_key = st.secrets.get("ANTHROPIC_API_KEY")
-        except Exception:
-            pass
-
-        if not api_key:
-            api_key = os.getenv("ANTHROPIC_API_KEY")
+        self.client = get_shared_client()
 
-        if not api_key:
-            raise ValueError("ANTHROPIC_API_KEY not found")
-        self.client = Anthropic(api_key=api_key)
-
-        self._thinking_log: List[str] = []
+        # Guards lazily created sub-agents and helpers; one instance serves every session
+        self._lazy_lock = threading.RLock()
 
     @abstractmethod
     def get_system_prompt(self) -> str:
         pass
 
+    @property
+    def session(self) -> SessionState:
+        """Follow-up state of the session the current request belongs to."""
+        return current_context().session
+
+    @property
+    def _thinking_log(self) -> List[str]:
+        return current_context().thinking.setdefault(id(self), [])
+
+    def _lazy(self, attribute: str, factory: Callable[[], Any]) -> Any:
+        """Create a sub-component on first use, once, even when sessions ask for it concurrently."""
+        value = getattr(self, attribute)
+        if value is None:
+            with self._lazy_lock:
+                value = getattr(self, attribute)
+                if value is None:
+                    value = factory()
+                    setattr(self, attribute, value)
+        return value
+
     def _log_thinking(self, thought: str):
-        self._thinking_log.append(thought)
+        context = current_context()
+        context.thinking.setdefault(id(self), []).append(thought)
+        context.progress.append(thought)
 
     def _clear_thinking(self):
-        self._thinking_log = []
+        current_context().thinking[id(self)] = []
 
     def _get_thinking_trace(self) -> str:
         if not self._thinking_log:
             return ""
         return "\n".join([f"- {thought}" for thought in self._thinking_log])
 
+    def _call_model(
+        self,
+        messages: List[Dict],
+        system: Optional[str] = None,
+        max_tokens: Optional[int] = None,
+        temperature: Optional[float] = None,
+        model: Optional[str] = None,
+        tools: Optional[List[Dict]] = None,
+        tool_choice: Optional[Dict] = None
+    ):
+        """Single model call with the agent's defaults; safe to run from worker threads."""
+        cancel_check = current_context().cancel_check
+        if cancel_check and cancel_check():
+            raise RequestCancelled("تم إلغاء الطلب")
+        # Tool arguments are only sent when given so plain calls stay unchanged
+        extra = {}
+        if tools:
+            extra["tools"] = tools
+        if tool_choice:
+            extra["tool_choice"] = tool_choice
+        return self.client.messages.create(
+            model=model or self.model,
+            max_tokens=max_tokens or self.max_tokens,
+            temperature=self.temperature if temperature is None else temperature,
+            system=system if system is not None else self.get_system_prompt(),
+            messages=messages,
+            **extra
+        )
+
+    @staticmethod
+    def _response_text(response) -> str:
+        """Text blocks of a response, ignoring tool calls."""
+        return "\n".join(b.text for b in response.content if getattr(b, "type", "") == "text").strip()
+
+    def _run_tool_loop(
+        self,
+        messages: List[Dict],
+        executor,
+        max_rounds: int,
+        system: Optional[str] = None,
+        max_tokens: Optional[int] = None
+    ) -> ToolLoopResult:
+        """
+        Let the model fetch what it needs through the executor's tools, then answer.
+
+        After max_rounds the model is called with tool use disabled so it answers
+        from the results it already has.
+        """
+        messages = list(messages)
+        result = ToolLoopResult()
+        while True:
+            limit_reached = result.rounds >= max_rounds
+            response = self._call_model(
+                messages,
+                system=system,
+                max_tokens=max_tokens,
+                tools=executor.tools,
+                tool_choice={"type": "none"} if limit_reached else None
+            )
+            result.input_tokens += response.usage.input_tokens
+            result.output_tokens += response.usage.output_tokens
+            tool_uses = [b for b in response.content if getattr(b, "type", "") == "tool_use"]
+            if response.stop_reason != "tool_use" or not tool_uses or limit_reached:
+                result.text = self._response_text(response)
+                result.hit_limit = limit_reached
+                return result
+
+            result.rounds += 1
+            assistant_blocks = [
+                {"type": "text", "text": b.text} if b.type == "text"
+                else {"type": "tool_use", "id": b.id, "name": b.name, "input": b.input}
+                for b in response.content if b.type in ("text", "tool_use")
+            ]
+            calls = self._execute_tool_calls(executor, tool_uses)
+            result.calls.extend(calls)
+            tool_results = [
+                {"type": "tool_result", "tool_use_id": block.id, "content": call.content, "is_error": call.is_error}
+                for block, call in zip(tool_uses, calls)
+            ]
+            messages.append({"role": "assistant", "content": assistant_blocks})
+            messages.append({"role": "user", "content": tool_results})
+
+    def _execute_tool_calls(self, executor, tool_uses: List) -> List[ToolCall]:
+        """Run one turn's tool calls concurrently; results keep the order of the calls."""
+        results = map_concurrently(lambda block: executor.execute(block.name, block.input or {}), tool_uses, MAX_CONCURRENT_CALLS)
+        calls = []
+        for block, task in zip(tool_uses, results):
+            call = task.value if task.ok else ToolCall(name=block.name, arguments=block.input or {}, content=task.error, is_error=True)
+            flags = [label for label, on in (("من الذاكرة المؤقتة", call.cached), ("مقتطعة", call.truncated), ("خطأ", call.is_error)) if on]
+            self._log_thinking(
+                f"أداة {call.name}({', '.join(f'{k}={v}' for k, v in call.arguments.items())}) "
+                f"{call.seconds * 1000:.1f} ملي ثانية{''.join(f' — {f}' for f in flags)}"
+            )
+            calls.append(call)
+        return calls
+
+    def _review_in_chunks(
+        self,
+        content_to_review: str,
+        source_agent: Optional[str] = None,
+        original_request: Optional[str] = None,
+        focus: str = ""
+    ) -> AgentResponse:
+        """Section-aware chunks reviewed concurrently, findings merged into one ranked list."""
+        self._clear_thinking()
+        start = time.perf_counter()
+        self._log_thinking(f"المحتوى طويل ({len(content_to_review):,} حرف) — تقسيمه إلى أجزاء حسب الأقسام ومراجعتها بالتوازي...")
+
+        request = original_request or ""
+        if source_agent:
+            request = f"{request} (المصدر: {source_agent})".strip()
+        review = run_chunked_review(
+            self._call_model,
+            content_to_review,
+            request,
+            model=self.model,
+            max_chars=CRITIQUE_CHUNK_CHARS,
+            max_tokens=CRITIQUE_CHUNK_MAX_TOKENS,
+            max_workers=MAX_CONCURRENT_CALLS,
+            max_items=CRITIQUE_MAX_FINDINGS,
+            focus=focus
+        )
+        elapsed = round(time.perf_counter() - start, 2)
+
+        self._log_thinking(f"روجع {len(review.chunks)} جزء ({review.cached_count} من الذاكرة المؤقتة) خلال {elapsed} ثانية")
+        for chunk in review.failed:
+            self._log_thinking(f"تعذرت مراجعة الجزء \"{chunk.heading}\": {chunk.error}")
+
+        metadata = {
+            "model": self.model,
+            "input_tokens": sum(c.input_tokens for c in review.chunks if not c.from_cache),
+            "output_tokens": sum(c.output_tokens for c in review.chunks if not c.from_cache),
+            "analysis_type": "critique_chunked",
+            "chunks": len(review.chunks),
+            "chunks_from_cache": review.cached_count,
+            "rating": review.rating,
+            "elapsed_seconds": elapsed
+        }
+        if len(review.failed) == len(review.chunks):
+            metadata["error"] = review.failed[0].error if review.failed else "no content"
+            return AgentResponse(
+                content=f"حدث خطأ أثناء المراجعة: {metadata['error']}",
+                thinking=self._get_thinking_trace(),
+                metadata=metadata,
+                agent_name=self.name,
+                agent_name_en=self.name_en
+            )
+
+        self._log_thinking(f"دمج الملاحظات: {len(review.issues)} مجال تحسين و{len(review.strengths)} نقطة قوة")
+        return AgentResponse(
+            content=format_chunked_review(review),
+            thinking=self._get_thinking_trace(),
+            metadata=metadata,
+            agent_name=self.name,
+            agent_name_en=self.name_en
+        )
+
     def _build_messages(
         self,
         user_message: str,
@@ -83,8 +332,10 @@ class BaseAgent(ABC):
             messages.extend(conversation_history)
 
         content = user_message
-        if context:
-            context_str = "\n".join([f"{k}: {v}" for k, v in context.items()])
+        # Keys starting with "_" carry structured data for agents, not prompt text
+        prompt_context = {k: v for k, v in (context or {}).items() if not k.startswith("_")}
+        if prompt_context:
+            context_str = "\n".join([f"{k}: {v}" for k, v in prompt_context.items()])
             content = f"""السياق:
 {context_str}
 
@@ -116,13 +367,7 @@ class BaseAgent(ABC):
         try:
             self._log_thinking("استدعاء النموذج...")
 
-            response = self.client.messages.create(
-                model=self.model,
-                max_tokens=self.max_tokens,
-                temperature=self.temperature,
-                system=system_prompt,
-                messages=messages
-            )
+            response = self._call_model(messages, system=system_prompt)
 
             response_text = response.content[0].text
             self._log_thinking("تم استلام الرد")
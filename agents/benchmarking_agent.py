@@ -176,13 +176,7 @@ class BenchmarkingAgent(BaseAgent):
         messages = self._build_messages(user_message, enhanced_context, conversation_history)
 
         try:
-            response = self.client.messages.create(
-                model=self.model,
-                max_tokens=self.max_tokens,
-                temperature=self.temperature,
-                system=self.get_system_prompt(),
-                messages=messages
-            )
+            response = self._call_model(messages)
 
             response_text = response.content[0].text
             self._log_thinking("تم توليد التحليل بنجاح")
@@ -8,6 +8,7 @@ This agent specializes in reviewing and critiquing outputs from other agents.
 from typing import Optional, Dict, List
 from .base_agent import BaseAgent, AgentResponse
 from prompts.critique_prompt import CRITIQUE_SYSTEM_PROMPT
+from config import CRITIQUE_CHUNK_CHARS
 
 
 class CritiqueAgent(BaseAgent):
@@ -45,6 +46,9 @@ class CritiqueAgent(BaseAgent):
         Returns:
             AgentResponse with critique and recommendations
         """
+        if len(content_to_review) > CRITIQUE_CHUNK_CHARS:
+            return self._review_in_chunks(content_to_review, source_agent, original_request)
+
         self._clear_thinking()
         self._log_thinking(f"استلام محتوى للمراجعة من: {source_agent}")
 
@@ -102,13 +106,7 @@ class CritiqueAgent(BaseAgent):
         try:
             self._log_thinking("جارٍ تحليل المحتوى...")
 
-            response = self.client.messages.create(
-                model=self.model,
-                max_tokens=self.max_tokens,
-                temperature=self.temperature,
-                system=self.get_system_prompt(),
-                messages=messages
-            )
+            response = self._call_model(messages)
 
             response_text = response.content[0].text
             self._log_thinking("تم إكمال المراجعة بنجاح")
@@ -148,6 +146,15 @@ class CritiqueAgent(BaseAgent):
         Returns:
             Dictionary with strengths, improvements, and rating
         """
+        # Long content is reviewed in full as parallel chunks instead of being cut off
+        if len(content) > CRITIQUE_CHUNK_CHARS:
+            response = self._review_in_chunks(content)
+            return {
+                "feedback": response.content,
+                "agent": self.name,
+                "thinking": response.thinking
+            }
+
         self._clear_thinking()
 
         quick_prompt = f"""راجع هذا المحتوى بسرعة وقدم:
@@ -156,7 +163,7 @@ class CritiqueAgent(BaseAgent):
 3. تقييم من 1-5
 
 المحتوى:
-{content[:2000]}...
+{content}
 
 قدم الإجابة بتنسيق موجز."""
 
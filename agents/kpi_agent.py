@@ -5,10 +5,12 @@ KPI Agent for MS Portfolio AI Agent Demo
 This agent specializes in KPI recommendations and performance measurement.
 """
 
-from typing import Optional, Dict, List
+from typing import Optional, Dict, List, Tuple
 from .base_agent import BaseAgent, AgentResponse
 from prompts.kpi_prompt import KPI_SYSTEM_PROMPT
 from utils.knowledge_base import KnowledgeBase
+from utils.kpi_ranking import get_kpi_ranker
+from config import KPI_TOP_K, KPI_TOKEN_BUDGET
 
 
 class KPIAgent(BaseAgent):
@@ -30,55 +32,22 @@ class KPIAgent(BaseAgent):
         """Return the KPI-specific system prompt."""
         return KPI_SYSTEM_PROMPT
 
-    def _identify_relevant_categories(self, query: str) -> List[str]:
+    def _select_relevant_kpis(self, query: str) -> Tuple[List[Dict], bool]:
         """
-        Identify which KPI categories are relevant to the query.
+        Rank the KPI library against the query and keep the top KPIs within the token budget.
 
         Args:
             query: User's query in Arabic
 
         Returns:
-            List of relevant category names
+            Selected KPI dictionaries (with category_name) and whether the ranking matched the query
         """
-        category_keywords = {
-            "مؤشرات الحضور والمشاركة": ["حضور", "مشاركة", "زوار", "جمهور", "إشغال"],
-            "مؤشرات التغطية الإعلامية": ["إعلام", "تغطية", "صحافة", "تواصل", "رقمي"],
-            "مؤشرات الأثر الاقتصادي": ["اقتصاد", "استثمار", "وظائف", "إنفاق", "عائد"],
-            "مؤشرات رضا الجمهور": ["رضا", "تجربة", "شكاوى", "NPS", "تقييم"],
-            "مؤشرات التنفيذ والتسليم": ["تنفيذ", "جدول", "ميزانية", "أمان", "جودة"],
-        }
-
-        relevant = []
-        query_lower = query.lower()
-
-        for category, keywords in category_keywords.items():
-            if any(kw in query_lower for kw in keywords):
-                relevant.append(category)
-
-        # If no specific category identified, return all
-        if not relevant:
-            relevant = list(category_keywords.keys())
-
-        return relevant
-
-    def _get_kpis_for_categories(self, categories: List[str]) -> List[Dict]:
-        """
-        Get KPIs for the specified categories.
-
-        Args:
-            categories: List of category names
-
-        Returns:
-            List of KPI dictionaries
-        """
-        all_kpis = []
-        for category in categories:
-            kpis = self.kb.get_kpis_by_category(category)
-            for kpi in kpis:
-                kpi_with_cat = kpi.copy()
-                kpi_with_cat["category_name"] = category
-                all_kpis.append(kpi_with_cat)
-        return all_kpis
+        return get_kpi_ranker(self.kb).rank(
+            query,
+            top_k=KPI_TOP_K,
+            token_budget=KPI_TOKEN_BUDGET,
+            row_formatter=lambda kpi: self._format_kpi_context([kpi])
+        )
 
     def _format_kpi_context(self, kpis: List[Dict]) -> str:
         """
@@ -143,13 +112,13 @@ class KPIAgent(BaseAgent):
         self._clear_thinking()
         self._log_thinking("تحليل الطلب لتحديد فئات المؤشرات ذات الصلة...")
 
-        # Identify relevant categories
-        relevant_categories = self._identify_relevant_categories(user_message)
-        self._log_thinking(f"تم تحديد {len(relevant_categories)} فئة ذات صلة")
-
-        # Get KPIs for those categories
-        relevant_kpis = self._get_kpis_for_categories(relevant_categories)
-        self._log_thinking(f"تم استرجاع {len(relevant_kpis)} مؤشر أداء")
+        # Rank the library and keep the most relevant KPIs
+        relevant_kpis, matched = self._select_relevant_kpis(user_message)
+        relevant_categories = list(dict.fromkeys(kpi.get("category_name", "") for kpi in relevant_kpis))
+        if matched:
+            self._log_thinking(f"تم اختيار {len(relevant_kpis)} مؤشر أداء من {len(relevant_categories)} فئة ذات صلة")
+        else:
+            self._log_thinking(f"لم يحدد الطلب فئة بعينها — تم اختيار {len(relevant_kpis)} مؤشر من جميع الفئات")
 
         # Format KPI context
         kpi_context = self._format_kpi_context(relevant_kpis)
@@ -179,13 +148,7 @@ class KPIAgent(BaseAgent):
         messages = self._build_messages(user_message, enhanced_context, conversation_history)
 
         try:
-            response = self.client.messages.create(
-                model=self.model,
-                max_tokens=self.max_tokens,
-                temperature=self.temperature,
-                system=self.get_system_prompt(),
-                messages=messages
-            )
+            response = self._call_model(messages)
 
             response_text = response.content[0].text
             self._log_thinking("تم إعداد التوصيات بنجاح")
@@ -196,6 +159,7 @@ class KPIAgent(BaseAgent):
                 "output_tokens": response.usage.output_tokens,
                 "categories_analyzed": relevant_categories,
                 "kpis_considered": len(relevant_kpis),
+                "kpis_matched": matched,
                 "stop_reason": response.stop_reason,
             }
 
@@ -14,6 +14,11 @@ from .media_agent import MediaAgent
 from .slide_agent import SlideAgent
 from prompts.orchestrator_prompt import ORCHESTRATOR_SYSTEM_PROMPT
 from config import INTENT_KEYWORDS, AGENT_NAMES
+from utils.intent_matcher import get_intent_matcher
+
+
+# Intents with a specialist in the original demo
+LEGACY_INTENTS = ("benchmarking", "kpi", "critique", "slide")
 
 
 class OrchestratorAgent(BaseAgent):
@@ -55,23 +60,7 @@ class OrchestratorAgent(BaseAgent):
         Returns:
             Tuple of (intent_type, confidence_score)
         """
-        message_lower = message.lower()
-
-        # Count keyword matches for each intent
-        scores = {}
-        for intent, keywords in INTENT_KEYWORDS.items():
-            score = sum(1 for kw in keywords if kw in message_lower)
-            if score > 0:
-                scores[intent] = score
-
-        if not scores:
-            return ("general", 0.5)
-
-        # Get the intent with highest score
-        best_intent = max(scores, key=scores.get)
-        confidence = min(scores[best_intent] / 3, 1.0)  # Normalize confidence
-
-        return (best_intent, confidence)
+        return get_intent_matcher(INTENT_KEYWORDS).classify(message, LEGACY_INTENTS)
 
     def _get_agent_for_intent(self, intent: str) -> BaseAgent:
         """
@@ -128,7 +117,8 @@ class OrchestratorAgent(BaseAgent):
             response = self.critique_agent.review(
                 content_to_review=self._last_response.content,
                 source_agent=self._last_agent,
-                original_request=user_message
+                original_request=user_message,
+                allow_style_only=True
             )
 
             # Merge thinking traces
@@ -2,9 +2,15 @@
 وكيل التنسيق — لجنة الفعاليات
 """
 
+import re
+import time
 from typing import Optional, Dict, List, Tuple
 from ..base_agent import BaseAgent, AgentResponse
-from config import INTENT_KEYWORDS
+from config import INTENT_KEYWORDS, INTENT_DESCRIPTIONS, INTENT_CONFIDENCE_THRESHOLD, ROUTER_MODEL, ROUTER_MAX_TOKENS, MAX_CONCURRENT_CALLS, COMPOUND_MAX_AGENTS, SYNTHESIS_MAX_TOKENS, SYNTHESIS_INPUT_CHARS
+from utils.stats_query import StatsQueryPlanner, get_stats_planner
+from utils.concurrency import map_concurrently
+from utils.intent_matcher import get_intent_matcher
+from utils.intent_router import IntentRouter, RoutingDecision, ask_model_for_intent, routing_cache_stats
 
 
 COORDINATOR_SYSTEM_PROMPT = """أنت وكيل التنسيق في نظام لجنة الفعاليات.
@@ -42,6 +48,23 @@ COORDINATOR_SYSTEM_PROMPT = """أنت وكيل التنسيق في نظام لج
 - طلبات فحص الجودة والتحقق -> وكيل فحص الجودة"""
 
 
+# Intents routed by this coordinator
+COORDINATOR_INTENTS = ("data_analysis", "followup", "reporting", "quality_check")
+
+# Numbered request items ("1.", "٢)", "3-") at the start of a line
+_ENUMERATED_ITEM_RE = re.compile(r"^\s*(?:\d+|[\u0660-\u0669])\s*[\.\)\-–:]\s*", re.MULTILINE)
+
+# Intents whose agent already aggregates the others; their sub-items are sections, not separate tasks
+AGGREGATOR_INTENTS = {"reporting"}
+
+SYNTHESIS_PROMPT = """طلب المستخدم: {request}
+
+نتائج الوكلاء المتخصصين:
+{results}
+
+اكتب فقرة تنسيقية موجزة (بحد أقصى ١٥٠ كلمة) تربط بين هذه النتائج وتبرز أهم ما يحتاج إليه المستخدم، دون تكرار تفاصيلها."""
+
+
 class CoordinatorAgent(BaseAgent):
     """وكيل التنسيق — المنسق الرئيسي للجنة الفعاليات"""
 
@@ -57,65 +80,117 @@ class CoordinatorAgent(BaseAgent):
         self._followup_agent = None
         self._reporting_agent = None
         self._quality_check_agent = None
-
-        self._last_response: Optional[AgentResponse] = None
-        self._last_agent: Optional[str] = None
+        self._router = IntentRouter(
+            COORDINATOR_INTENTS, INTENT_KEYWORDS, INTENT_CONFIDENCE_THRESHOLD,
+            fallback=self._route_with_model, resolve_agent=self._agent_name_for_intent
+        )
 
     @property
     def data_analysis_agent(self):
-        if self._data_analysis_agent is None:
-            from .data_analysis import DataAnalysisAgent
-            self._data_analysis_agent = DataAnalysisAgent()
-        return self._data_analysis_agent
+        from .data_analysis import DataAnalysisAgent
+        return self._lazy("_data_analysis_agent", DataAnalysisAgent)
 
     @property
     def followup_agent(self):
-        if self._followup_agent is None:
-            from .followup import FollowupAgent
-            self._followup_agent = FollowupAgent()
-        return self._followup_agent
+        from .followup import FollowupAgent
+        return self._lazy("_followup_agent", FollowupAgent)
 
     @property
     def reporting_agent(self):
-        if self._reporting_agent is None:
-            from .reporting import ReportingAgent
-            self._reporting_agent = ReportingAgent()
-        return self._reporting_agent
+        from .reporting import ReportingAgent
+        return self._lazy("_reporting_agent", ReportingAgent)
 
     @property
     def quality_check_agent(self):
-        if self._quality_check_agent is None:
-            from .quality_check import QualityCheckAgent
-            self._quality_check_agent = QualityCheckAgent()
-        return self._quality_check_agent
+        from .quality_check import QualityCheckAgent
+        return self._lazy("_quality_check_agent", QualityCheckAgent)
+
+    @property
+    def stats_planner(self) -> StatsQueryPlanner:
+        return get_stats_planner(self.data_analysis_agent.knowledge_base)
 
     def get_system_prompt(self) -> str:
         return COORDINATOR_SYSTEM_PROMPT
 
-    def _classify_intent(self, message: str) -> Tuple[str, float]:
-        """Classify user intent based on keywords."""
-        message_lower = message.lower()
-
-        intent_keywords = {
-            "data_analysis": ["تحليل", "بيانات", "إحصائيات", "توزيع", "إجمالي", "فعاليات", "تصنيف", "نوع", "جهة", "analyze", "analysis", "statistics", "data", "events", "total", "count", "الرياض", "جدة", "العلا", "عسير", "الدمام", "مدينة", "مدن"],
-            "followup": ["متابعة", "رسالة", "بريد", "تواصل", "ناقص", "مطلوب", "استكمال", "إرسال", "missing", "follow-up", "follow up", "email", "gap", "incomplete"],
-            "reporting": ["تقرير", "ملخص", "لجنة", "اجتماع", "تنفيذي", "report", "committee", "executive", "briefing", "summary", "prepare"],
-            "quality_check": ["جودة", "فحص", "تحقق", "اكتمال", "صحة", "quality", "check", "validate", "verify", "complete", "accuracy"]
-        }
+    def _answer_locally(self, user_message: str, context: Optional[Dict]) -> Optional[AgentResponse]:
+        """Answer pure count/distribution/list questions straight from the KB."""
+        if context and context.get('uploaded_data'):
+            return None
+
+        query = self.stats_planner.plan(user_message)
+        if query is None:
+            return None
+
+        self._log_thinking(f"استعلام إحصائي مباشر: {query.operation} — إجابة محلية من قاعدة المعرفة دون استدعاء النموذج")
+        content = self.stats_planner.execute(query)
+
+        return AgentResponse(
+            content=content,
+            thinking=self._get_thinking_trace(),
+            metadata={
+                "type": "local_stats",
+                "operation": query.operation,
+                "group_by": query.group_by,
+                "filters": query.filters,
+                "input_tokens": 0,
+                "output_tokens": 0,
+            },
+            agent_name=self.data_analysis_agent.name,
+            agent_name_en=self.data_analysis_agent.name_en
+        )
+
+    def _score_intents(self, message: str) -> Dict[str, float]:
+        """Keyword score per intent (only intents with a positive score)."""
+        return get_intent_matcher(INTENT_KEYWORDS).score(message, COORDINATOR_INTENTS)
 
-        scores = {}
-        for intent, keywords in intent_keywords.items():
-            score = sum(1 for kw in keywords if kw in message_lower)
-            if score > 0:
-                scores[intent] = score
+    def _route_with_model(self, message: str, labels: List[str]) -> Optional[str]:
+        """Cheap routing call used only when the local classifier is unsure."""
+        return ask_model_for_intent(
+            self._call_model, message, labels, INTENT_DESCRIPTIONS, ROUTER_MODEL, ROUTER_MAX_TOKENS
+        )
 
-        if not scores:
-            return ("general", 0.5)
+    def _agent_name_for_intent(self, intent: str) -> str:
+        agent = self._get_agent_for_intent(intent)
+        return agent.name if agent else ""
 
-        best_intent = max(scores, key=scores.get)
-        confidence = min(scores[best_intent] / 3, 1.0)
+    def _route(self, message: str) -> RoutingDecision:
+        """Routing decision (cached per request text and follow-up state), model fallback below the threshold."""
+        return self._router.route(message, state=self.session.last_agent or "")
 
-        return (best_intent, confidence)
+    def _classify_intent(self, message: str) -> Tuple[str, float]:
+        """Classify user intent (intent, confidence)."""
+        decision = self._route(message)
+        return (decision.intent, decision.confidence)
+
+    def _split_request_items(self, message: str) -> List[str]:
+        """Split a request into its numbered items; fewer than two items means it is not a list."""
+        starts = [m.start() for m in _ENUMERATED_ITEM_RE.finditer(message)]
+        if len(starts) < 2:
+            return []
+        return [message[start:end] for start, end in zip(starts, starts[1:] + [len(message)])]
+
+    def _plan_dispatch(self, message: str, primary: str) -> List[str]:
+        """
+        Intents to run for a request, primary first.
+
+        A numbered item adds its intent when that intent clearly wins the item
+        (no tie). Requests led by an aggregating agent stay single-agent.
+        """
+        intents = [primary]
+        if primary in AGGREGATOR_INTENTS:
+            return intents
+
+        for item in self._split_request_items(message):
+            scores = self._score_intents(item)
+            if not scores:
+                continue
+            ranked = sorted(scores.items(), key=lambda x: x[1], reverse=True)
+            if len(ranked) > 1 and ranked[0][1] == ranked[1][1]:
+                continue
+            intent = ranked[0][0]
+            if intent not in intents:
+                intents.append(intent)
+        return intents[:COMPOUND_MAX_AGENTS]
 
     def _get_agent_for_intent(self, intent: str) -> Optional[BaseAgent]:
         """Get the appropriate agent for an intent."""
@@ -137,9 +212,23 @@ class CoordinatorAgent(BaseAgent):
         self._clear_thinking()
         self._log_thinking("تحليل الطلب لتحديد الوكيل المناسب...")
 
+        local_response = self._answer_locally(user_message, context)
+        if local_response:
+            self.session.last_response = local_response
+            self.session.last_agent = local_response.agent_name
+            return local_response
+
         # Classify intent
-        intent, confidence = self._classify_intent(user_message)
-        self._log_thinking(f"تصنيف الطلب: {intent} (ثقة: {confidence:.0%})")
+        decision = self._route(user_message)
+        intent = decision.intent
+        self._log_thinking(f"تصنيف الطلب: {intent} (ثقة: {decision.confidence:.0%}، المصدر: {decision.source})")
+        if decision.cached:
+            self._log_thinking(f"قرار التوجيه من الذاكرة المؤقتة (نسبة الإصابة {routing_cache_stats()['hit_rate']:.0%})")
+
+        if intent != "general":
+            intents = self._plan_dispatch(user_message, intent)
+            if len(intents) > 1:
+                return self._invoke_compound(intents, user_message, context, conversation_history)
 
         # Get appropriate agent
         agent = self._get_agent_for_intent(intent)
@@ -148,8 +237,8 @@ class CoordinatorAgent(BaseAgent):
             self._log_thinking(f"توجيه إلى: {agent.name}")
             response = agent.invoke(user_message, context, conversation_history)
 
-            self._last_response = response
-            self._last_agent = agent.name
+            self.session.last_response = response
+            self.session.last_agent = agent.name
 
             combined_thinking = self._get_thinking_trace() + "\n\n" + response.thinking
             response.thinking = combined_thinking
@@ -157,6 +246,96 @@ class CoordinatorAgent(BaseAgent):
 
         return self._provide_general_response(user_message)
 
+    def _synthesize(self, user_message: str, responses: List[AgentResponse]) -> Tuple[str, int, int]:
+        """Short linking paragraph over the specialists' outputs; empty on failure."""
+        results = "\n\n".join(
+            f"### {r.agent_name}\n{r.content[:SYNTHESIS_INPUT_CHARS]}" for r in responses
+        )
+        try:
+            response = self._call_model(
+                [{"role": "user", "content": SYNTHESIS_PROMPT.format(request=user_message, results=results)}],
+                max_tokens=SYNTHESIS_MAX_TOKENS
+            )
+            return response.content[0].text.strip(), response.usage.input_tokens, response.usage.output_tokens
+        except Exception as e:
+            self._log_thinking(f"تعذر إعداد الخلاصة التنسيقية: {str(e)}")
+            return "", 0, 0
+
+    def _invoke_compound(
+        self,
+        intents: List[str],
+        user_message: str,
+        context: Optional[Dict],
+        conversation_history: Optional[List[Dict]]
+    ) -> AgentResponse:
+        """Run every relevant specialist concurrently, then merge and synthesize."""
+        agents = [self._get_agent_for_intent(intent) for intent in intents]
+        self._log_thinking(f"طلب مركب — تشغيل {len(agents)} وكلاء بالتوازي: {'، '.join(a.name for a in agents)}")
+
+        def run(agent: BaseAgent) -> AgentResponse:
+            focused = f"{user_message}\n\n(هذا طلب مركب يعالجه أكثر من وكيل — ركز على ما يخص اختصاصك: {agent.description})"
+            return agent.invoke(focused, context, conversation_history)
+
+        started = time.perf_counter()
+        results = map_concurrently(run, agents, max_workers=MAX_CONCURRENT_CALLS)
+        fan_out_seconds = time.perf_counter() - started
+
+        responses: List[AgentResponse] = []
+        timings = {}
+        input_tokens = output_tokens = 0
+        for agent, result in zip(agents, results):
+            timings[agent.name] = round(result.seconds, 2)
+            if result.ok:
+                response = result.value
+                self._log_thinking(f"{agent.name}: {result.seconds:.1f} ثانية")
+            else:
+                self._log_thinking(f"{agent.name}: تعذر التنفيذ ({result.error})")
+                response = AgentResponse(
+                    content=f"تعذر الحصول على نتيجة هذا الوكيل: {result.error}",
+                    metadata={"error": result.error},
+                    agent_name=agent.name,
+                    agent_name_en=agent.name_en
+                )
+            input_tokens += response.metadata.get("input_tokens", 0)
+            output_tokens += response.metadata.get("output_tokens", 0)
+            responses.append(response)
+
+        self._log_thinking(f"اكتمل التنفيذ المتوازي خلال {fan_out_seconds:.1f} ثانية (مجموع أزمنة الوكلاء {sum(timings.values()):.1f} ثانية)")
+
+        synthesis, used_in, used_out = self._synthesize(user_message, responses)
+        input_tokens += used_in
+        output_tokens += used_out
+
+        content = f"{synthesis}\n\n" if synthesis else ""
+        content += "\n\n".join(f"## {r.agent_name}\n\n{r.content}" for r in responses)
+
+        thinking = self._get_thinking_trace()
+        for response in responses:
+            if response.thinking:
+                thinking += f"\n\n**{response.agent_name}:**\n{response.thinking}"
+
+        merged = AgentResponse(
+            content=content,
+            thinking=thinking,
+            metadata={
+                "type": "compound",
+                "model": self.model,
+                "intents": intents,
+                "agents": [r.agent_name for r in responses],
+                "timings": timings,
+                "elapsed_seconds": round(time.perf_counter() - started, 2),
+                "input_tokens": input_tokens,
+                "output_tokens": output_tokens,
+                "agent_metadata": {r.agent_name: r.metadata for r in responses}
+            },
+            agent_name="، ".join(r.agent_name for r in responses),
+            agent_name_en="، ".join(r.agent_name_en or r.agent_name for r in responses)
+        )
+
+        self.session.last_response = merged
+        self.session.last_agent = self.name
+        return merged
+
     def _provide_general_response(self, user_message: str) -> AgentResponse:
         """Provide general guidance in Arabic."""
         general_guidance = """نظام لجنة الفعاليات يضم الوكلاء التالية:
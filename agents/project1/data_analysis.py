@@ -4,7 +4,12 @@
 
 from typing import Optional, Dict, List
 from ..base_agent import BaseAgent, AgentResponse
-from utils.knowledge_base import KnowledgeBase
+from utils.knowledge_base import get_shared_knowledge_base
+from utils.event_retrieval import EventRetriever, get_event_retriever
+from utils.event_analytics import get_event_stats
+from utils.timeline import get_timeline, MIN_GAP_DAYS
+from utils.kb_tools import EVENT_TOOLS, TOOLS_INSTRUCTION, KBToolExecutor, tool_overview
+from config import RETRIEVAL_TOP_K, RETRIEVAL_TOKEN_BUDGET, KB_TOOLS_ENABLED, KB_TOOL_MAX_ROUNDS, KB_TOOL_RESULT_TOKENS
 
 
 DATA_ANALYSIS_SYSTEM_PROMPT = """أنت وكيل تحليل البيانات المتخصص في نظام لجنة الفعاليات.
@@ -30,8 +35,10 @@ DATA_ANALYSIS_SYSTEM_PROMPT = """أنت وكيل تحليل البيانات ا
 - حالة التضمين (تضمن, لن تضمن, تحسب بدون تضمين)
 - الفترة الزمنية والمدة
 - التقاطعات: المدينة × التصنيف، المدينة × النوع، المدينة × حالة التضمين، الجهة × المدينة
+- الجدول الزمني: التعارضات بين الفعاليات الكبرى في المدينة نفسها، والفجوات في التقويم، وكثافة الإشغال اليومي
 
 مهم جداً: البيانات المقدمة لك تتضمن جداول تقاطعية كاملة (مدينة × تصنيف، مدينة × نوع، إلخ). استخدم هذه البيانات مباشرة في تحليلك — لا تقل إن التقاطعات غير متوفرة.
+التعارضات والفجوات الزمنية محسوبة مسبقاً من التواريخ الفعلية — اعتمد عليها ولا تستنتج تعارضات من عندك.
 
 أسلوب التحليل:
 - استخدم الجداول للمقارنات
@@ -66,65 +73,33 @@ class DataAnalysisAgent(BaseAgent):
             description="تحليل بيانات الفعاليات وإنتاج التقارير التحليلية",
             temperature=0.3
         )
-        self.knowledge_base = KnowledgeBase()
+        self.knowledge_base = get_shared_knowledge_base()
+        self._kb_tools: Optional[KBToolExecutor] = None
 
     def get_system_prompt(self) -> str:
         return DATA_ANALYSIS_SYSTEM_PROMPT
 
-    def _get_events_summary(self) -> str:
+    @property
+    def retriever(self) -> EventRetriever:
+        # Rebuilt when the knowledge base reloads; shared by every agent on the same data
+        return get_event_retriever(self.knowledge_base)
+
+    @property
+    def kb_tools(self) -> KBToolExecutor:
+        return self._lazy("_kb_tools", lambda: KBToolExecutor(self.knowledge_base, EVENT_TOOLS, KB_TOOL_RESULT_TOKENS))
+
+    @staticmethod
+    def _format_event_row(event: Dict) -> str:
+        """Format one event as a markdown table row."""
+        name = (event.get('name', '') or '')[:35]
+        org_name = (event.get('responsible_org', '') or '')[:25]
+        return f"| {name} | {event.get('city', '')} | {org_name} | {event.get('tier', '')} | {event.get('type', '')} | {event.get('start_date', '')} | {event.get('end_date', '')} | {event.get('inclusion_status', '')} |\n"
+
+    def _get_events_summary(self, query: str = "") -> str:
         """Get a comprehensive summary of events data including cross-tabulations."""
-        events = self.knowledge_base.get_all_events()
-
-        total = len(events)
-        by_city = {}
-        by_type = {}
-        by_tier = {}
-        by_org = {}
-        by_inclusion = {}
-        # Cross-tabulations
-        city_tier = {}
-        city_type = {}
-        city_inclusion = {}
-        city_org = {}
-        incomplete = []
-
-        for event in events:
-            city = event.get('city', '') or 'غير محدد'
-            by_city[city] = by_city.get(city, 0) + 1
-
-            event_type = event.get('type', '') or 'غير محدد'
-            by_type[event_type] = by_type.get(event_type, 0) + 1
-
-            tier = event.get('tier', '') or 'غير محدد'
-            by_tier[tier] = by_tier.get(tier, 0) + 1
-
-            org = event.get('responsible_org', '') or 'غير محدد'
-            by_org[org] = by_org.get(org, 0) + 1
-
-            inclusion = event.get('inclusion_status', '') or 'غير محدد'
-            by_inclusion[inclusion] = by_inclusion.get(inclusion, 0) + 1
-
-            # Cross-tabulations
-            city_tier.setdefault(city, {})
-            city_tier[city][tier] = city_tier[city].get(tier, 0) + 1
-
-            city_type.setdefault(city, {})
-            city_type[city][event_type] = city_type[city].get(event_type, 0) + 1
-
-            city_inclusion.setdefault(city, {})
-            city_inclusion[city][inclusion] = city_inclusion[city].get(inclusion, 0) + 1
-
-            city_org.setdefault(city, {})
-            city_org[city][org] = city_org[city].get(org, 0) + 1
-
-            required_fields = ['name', 'start_date', 'city', 'responsible_org', 'tier', 'type']
-            missing = [f for f in required_fields if not event.get(f)]
-            if missing:
-                incomplete.append({
-                    'name': event.get('name', 'بدون اسم'),
-                    'city': city,
-                    'missing': missing
-                })
+        stats = get_event_stats(self.knowledge_base)
+        total = stats.total
+        cities = stats.cities_by_size()
 
         # === Build summary ===
         summary = f"""## ملخص بيانات الفعاليات
@@ -135,79 +110,118 @@ class DataAnalysisAgent(BaseAgent):
 | المدينة | العدد | النسبة |
 |---------|-------|--------|
 """
-        for city, count in sorted(by_city.items(), key=lambda x: x[1], reverse=True):
+        for city in cities:
+            count = stats.by_city[city]
             pct = count * 100 // total if total > 0 else 0
             summary += f"| {city} | {count} | {pct}% |\n"
 
         summary += "\n### التوزيع حسب التصنيف:\n| التصنيف | العدد |\n|---------|-------|\n"
-        for tier, count in sorted(by_tier.items(), key=lambda x: x[1], reverse=True):
+        for tier, count in stats.top(stats.by_tier, len(stats.by_tier)):
             summary += f"| {tier} | {count} |\n"
 
         summary += "\n### التوزيع حسب النوع:\n| النوع | العدد |\n|-------|-------|\n"
-        for event_type, count in sorted(by_type.items(), key=lambda x: x[1], reverse=True):
+        for event_type, count in stats.top(stats.by_type, len(stats.by_type)):
             summary += f"| {event_type} | {count} |\n"
 
         summary += "\n### التوزيع حسب حالة التضمين:\n| الحالة | العدد |\n|--------|-------|\n"
-        for status, count in sorted(by_inclusion.items(), key=lambda x: x[1], reverse=True):
+        for status, count in stats.top(stats.by_inclusion, len(stats.by_inclusion)):
             summary += f"| {status} | {count} |\n"
 
         # === Cross-tabulation: City × Tier ===
-        all_tiers = sorted(by_tier.keys())
+        all_tiers = sorted(stats.by_tier.keys())
         summary += f"\n### التقاطع: المدينة × التصنيف\n| المدينة | {' | '.join(all_tiers)} | المجموع |\n|---------|{'|'.join([' ------- ' for _ in all_tiers])}|---------|\n"
-        for city in sorted(city_tier.keys(), key=lambda c: by_city.get(c, 0), reverse=True):
-            vals = [str(city_tier[city].get(t, 0)) for t in all_tiers]
-            summary += f"| {city} | {' | '.join(vals)} | {by_city.get(city, 0)} |\n"
+        for city in cities:
+            vals = [str(stats.city_tier[city].get(t, 0)) for t in all_tiers]
+            summary += f"| {city} | {' | '.join(vals)} | {stats.by_city[city]} |\n"
 
         # === Cross-tabulation: City × Type ===
-        all_types = sorted(by_type.keys())
+        all_types = sorted(stats.by_type.keys())
         summary += f"\n### التقاطع: المدينة × النوع\n| المدينة | {' | '.join(all_types)} | المجموع |\n|---------|{'|'.join([' ------- ' for _ in all_types])}|---------|\n"
-        for city in sorted(city_type.keys(), key=lambda c: by_city.get(c, 0), reverse=True):
-            vals = [str(city_type[city].get(t, 0)) for t in all_types]
-            summary += f"| {city} | {' | '.join(vals)} | {by_city.get(city, 0)} |\n"
+        for city in cities:
+            vals = [str(stats.city_type[city].get(t, 0)) for t in all_types]
+            summary += f"| {city} | {' | '.join(vals)} | {stats.by_city[city]} |\n"
 
         # === Cross-tabulation: City × Inclusion Status ===
-        all_statuses = sorted(by_inclusion.keys())
+        all_statuses = sorted(stats.by_inclusion.keys())
         summary += f"\n### التقاطع: المدينة × حالة التضمين\n| المدينة | {' | '.join(all_statuses)} | المجموع |\n|---------|{'|'.join([' ------- ' for _ in all_statuses])}|---------|\n"
-        for city in sorted(city_inclusion.keys(), key=lambda c: by_city.get(c, 0), reverse=True):
-            vals = [str(city_inclusion[city].get(s, 0)) for s in all_statuses]
-            summary += f"| {city} | {' | '.join(vals)} | {by_city.get(city, 0)} |\n"
+        for city in cities:
+            vals = [str(stats.city_inclusion[city].get(s, 0)) for s in all_statuses]
+            summary += f"| {city} | {' | '.join(vals)} | {stats.by_city[city]} |\n"
 
         # === Top orgs per city ===
         summary += "\n### أبرز الجهات المسؤولة حسب المدينة:\n"
-        for city in sorted(city_org.keys(), key=lambda c: by_city.get(c, 0), reverse=True):
-            top_orgs = sorted(city_org[city].items(), key=lambda x: x[1], reverse=True)[:5]
+        for city in cities:
             summary += f"\n**{city}:**\n"
-            for org, count in top_orgs:
-                if org and org != 'غير محدد':
-                    summary += f"- {org}: {count}\n"
+            for org, count in stats.top_orgs(5, city=city):
+                summary += f"- {org}: {count}\n"
 
         # === Global top orgs ===
         summary += "\n### أبرز الجهات المسؤولة (أعلى ١٥):\n| الجهة | العدد |\n|-------|-------|\n"
-        for org, count in sorted(by_org.items(), key=lambda x: x[1], reverse=True)[:15]:
-            if org and org != 'غير محدد':
-                summary += f"| {org} | {count} |\n"
+        for org, count in stats.top_orgs(15):
+            summary += f"| {org} | {count} |\n"
 
         # === Incomplete events ===
-        if incomplete:
-            summary += f"\n### فعاليات تحتاج استكمال ({len(incomplete)} من {total}):\n"
-            for item in incomplete[:10]:
-                summary += f"- **{item['name']}** ({item['city']})"
-                if item['missing']:
-                    summary += f" — حقول ناقصة: {', '.join(item['missing'])}"
-                summary += "\n"
-            if len(incomplete) > 10:
-                summary += f"\n*و{len(incomplete) - 10} فعاليات أخرى تحتاج استكمال...*\n"
-
-        # === Raw data sample ===
-        summary += "\n### عينة من البيانات الخام (أول ٢٥ فعالية):\n"
+        if stats.gaps:
+            summary += f"\n### فعاليات تحتاج استكمال ({len(stats.gaps)} من {total}):\n"
+            for gap in stats.gaps[:10]:
+                summary += f"- **{gap.name}** ({gap.city}) — حقول ناقصة: {', '.join(gap.missing_labels)}\n"
+            if len(stats.gaps) > 10:
+                summary += f"\n*و{len(stats.gaps) - 10} فعاليات أخرى تحتاج استكمال...*\n"
+
+        # === Timeline: clashes, gaps, occupancy ===
+        summary += self._get_timeline_summary()
+
+        # === Rows most relevant to the request ===
+        relevant, matched = self.retriever.retrieve(
+            query,
+            top_k=RETRIEVAL_TOP_K,
+            token_budget=RETRIEVAL_TOKEN_BUDGET,
+            row_formatter=self._format_event_row
+        )
+        if matched:
+            summary += f"\n### الفعاليات الأكثر صلة بالطلب ({len(relevant)} فعالية):\n"
+        else:
+            summary += f"\n### عينة ممثلة من البيانات الخام ({len(relevant)} فعالية من جميع المدن):\n"
         summary += "| الاسم | المدينة | الجهة المسؤولة | التصنيف | النوع | تاريخ البداية | تاريخ النهاية | حالة التضمين |\n"
         summary += "|-------|---------|----------------|---------|-------|---------------|---------------|-------------|\n"
-        for event in events[:25]:
-            name = (event.get('name', '') or '')[:35]
-            org_name = (event.get('responsible_org', '') or '')[:25]
-            summary += f"| {name} | {event.get('city', '')} | {org_name} | {event.get('tier', '')} | {event.get('type', '')} | {event.get('start_date', '')} | {event.get('end_date', '')} | {event.get('inclusion_status', '')} |\n"
+        for event in relevant:
+            summary += self._format_event_row(event)
+
+        summary += f"\nملاحظة: الصفوف أعلاه مختارة من {total} فعالية حسب صلتها بالطلب. جميع الجداول التقاطعية مبنية على كامل البيانات المتاحة.\n"
 
-        summary += f"\nملاحظة: البيانات أعلاه عينة من {total} فعالية. جميع الجداول التقاطعية مبنية على كامل البيانات المتاحة.\n"
+        return summary
+
+    def _get_timeline_summary(self) -> str:
+        """Compact summary of precomputed scheduling clashes, gaps and calendar density."""
+        timeline = get_timeline(self.knowledge_base)
+
+        summary = "\n### الجدول الزمني — الكثافة والتعارضات والفجوات:\n"
+        summary += "| المدينة | فعاليات مؤرخة | أزواج متداخلة | أيام بفعاليتين فأكثر | ذروة الإشغال | أطول فجوة |\n"
+        summary += "|---------|---------------|---------------|----------------------|---------------|-----------|\n"
+        for city, data in sorted(timeline.cities.items(), key=lambda item: item[1].dated, reverse=True):
+            gap = timeline.longest_gap(city)
+            gap_text = f"{gap.days} يوم ({gap.start} — {gap.end})" if gap else "لا يوجد"
+            summary += f"| {city} | {data.dated} | {data.overlapping_pairs} | {data.busy_days} | {data.peak_load} فعالية في {data.peak_day} | {gap_text} |\n"
+
+        if timeline.clashes:
+            summary += f"\n**أبرز التعارضات بين فعاليات Marquee و Tier 1 في المدينة نفسها ({len(timeline.clashes)}):**\n"
+            summary += "| المدينة | الفعالية الأولى | الفعالية الثانية | التصنيفان | فترة التداخل | الأيام |\n"
+            summary += "|---------|-----------------|------------------|-----------|--------------|--------|\n"
+            for clash in timeline.clashes:
+                summary += (
+                    f"| {clash.city} | {clash.first[:35]} | {clash.second[:35]} | {clash.first_tier} / {clash.second_tier} "
+                    f"| {clash.overlap_start} — {clash.overlap_end} | {clash.overlap_days} |\n"
+                )
+
+        if timeline.gaps:
+            summary += f"\n**فجوات في التقويم ({MIN_GAP_DAYS} يوماً فأكثر دون فعاليات):**\n"
+            for gap in timeline.gaps[:5]:
+                summary += f"- {gap.city}: {gap.start} — {gap.end} ({gap.days} يوم)\n"
+            if len(timeline.gaps) > 5:
+                summary += f"*و{len(timeline.gaps) - 5} فجوات أخرى.*\n"
+
+        if timeline.undated or timeline.unplaced:
+            summary += f"\nملاحظة: استُبعدت {timeline.undated} فعالية بتاريخ غير قابل للقراءة و{timeline.unplaced} فعالية دون مدينة محددة من التحليل الزمني.\n"
 
         return summary
 
@@ -221,8 +235,12 @@ class DataAnalysisAgent(BaseAgent):
         self._clear_thinking()
         self._log_thinking("تحليل بيانات الفعاليات...")
 
-        events_summary = self._get_events_summary()
-        self._log_thinking("اكتمل تحليل البيانات — الملخص جاهز")
+        if KB_TOOLS_ENABLED:
+            events_summary = tool_overview(self.knowledge_base) + f"\n\n{TOOLS_INSTRUCTION}"
+            self._log_thinking("نظرة عامة مختصرة على البيانات — التفاصيل تُجلب عبر أدوات قاعدة المعرفة حسب الحاجة")
+        else:
+            events_summary = self._get_events_summary(user_message)
+            self._log_thinking("اكتمل تحليل البيانات — الملخص جاهز مع الصفوف الأكثر صلة بالطلب")
 
         enhanced_message = f"""طلب المستخدم: {user_message}
 
@@ -243,24 +261,17 @@ class DataAnalysisAgent(BaseAgent):
         try:
             self._log_thinking("إعداد التقرير التحليلي...")
 
-            response = self.client.messages.create(
-                model=self.model,
-                max_tokens=self.max_tokens,
-                temperature=self.temperature,
-                system=self.get_system_prompt(),
-                messages=messages
-            )
-
-            response_text = response.content[0].text
+            metadata = {"model": self.model, "analysis_type": "events_data"}
+            if KB_TOOLS_ENABLED:
+                loop = self._run_tool_loop(messages, self.kb_tools, KB_TOOL_MAX_ROUNDS)
+                response_text = loop.text
+                metadata.update(input_tokens=loop.input_tokens, output_tokens=loop.output_tokens, **loop.as_metadata())
+            else:
+                response = self._call_model(messages)
+                response_text = response.content[0].text
+                metadata.update(input_tokens=response.usage.input_tokens, output_tokens=response.usage.output_tokens)
             self._log_thinking("اكتمل إعداد التقرير التحليلي")
 
-            metadata = {
-                "model": self.model,
-                "input_tokens": response.usage.input_tokens,
-                "output_tokens": response.usage.output_tokens,
-                "analysis_type": "events_data"
-            }
-
             return AgentResponse(
                 content=response_text,
                 thinking=self._get_thinking_trace(),
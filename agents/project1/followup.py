@@ -2,9 +2,23 @@
 وكيل المتابعة والتواصل — لجنة الفعاليات
 """
 
-from typing import Optional, Dict, List
+import time
+from datetime import date
+from typing import Optional, Dict, List, Tuple
+from pydantic import BaseModel, Field
 from ..base_agent import BaseAgent, AgentResponse
-from utils.knowledge_base import KnowledgeBase
+from utils.knowledge_base import get_shared_knowledge_base
+from utils.event_analytics import get_event_stats, UNSPECIFIED
+from utils.quality_rules import get_rule_engine
+from utils.concurrency import map_concurrently
+from utils.event_diff import format_diff
+from utils.deadlines import extract_deadline, format_date_ar
+from utils.text import normalize_arabic, compile_phrase_pattern
+from utils.kb_tools import EVENT_TOOLS, TOOLS_INSTRUCTION, KBToolExecutor, tool_overview
+from config import (
+    MAX_CONCURRENT_CALLS, FOLLOWUP_MAX_LETTERS, FOLLOWUP_LETTER_MAX_TOKENS, FOLLOWUP_DEADLINE_DAYS,
+    KB_TOOLS_ENABLED, KB_TOOL_MAX_ROUNDS, KB_TOOL_RESULT_TOKENS
+)
 
 
 FOLLOWUP_SYSTEM_PROMPT = """أنت وكيل المتابعة والتواصل المتخصص في نظام لجنة الفعاليات.
@@ -44,6 +58,68 @@ FOLLOWUP_SYSTEM_PROMPT = """أنت وكيل المتابعة والتواصل ا
 - جدول زمني مقترح للمتابعة"""
 
 
+# Requests containing any of these switch to per-organization letter drafting
+LETTER_KEYWORDS = ["رسالة", "رسائل", "خطاب", "خطابات", "مسودة", "مسودات", "راسل", "مراسلة",
+                   "letter", "letters", "email", "emails", "draft", "drafts"]
+
+_LETTER_RE = compile_phrase_pattern(LETTER_KEYWORDS)
+
+# Fixed parts of every letter; only {body} is generated by the model
+LETTER_TEMPLATE = """**إلى:** {organization}
+**الموضوع:** استكمال بيانات الفعاليات المدرجة في المحفظة
+
+السلام عليكم ورحمة الله وبركاته،
+
+{body}
+
+**الفعاليات المطلوب استكمالها أو تصحيحها:**
+{items}
+
+نأمل التكرم بتزويدنا بالبيانات المطلوبة في موعد أقصاه {deadline}{reference}، لضمان اكتمال المحفظة ودقة التقارير المرفوعة.
+
+شاكرين لكم حسن تعاونكم.
+
+لجنة الفعاليات"""
+
+# Used when the model call for an organization fails
+DEFAULT_LETTER_BODY = (
+    "في إطار متابعة لجنة الفعاليات لاكتمال بيانات المحفظة، تبين أن بعض الفعاليات التابعة لجهتكم الموقرة "
+    "تحتاج إلى استكمال أو تصحيح في بياناتها، وذلك وفق التفاصيل الموضحة أدناه."
+)
+
+LETTER_BODY_PROMPT = """طلب المستخدم: {request}
+
+الجهة: {organization}
+المدن: {cities}
+
+البنود المطلوب متابعتها مع هذه الجهة:
+{items}
+
+موعد الرد المطلوب: {deadline}{reference}
+
+اكتب فقرة أو فقرتين فقط (بحد أقصى ١٢٠ كلمة) موجهة إلى هذه الجهة، توضح سبب طلب استكمال البيانات وأهميته بالنسبة لفعالياتها تحديداً.
+يمكنك الإشارة إلى المواعيد والمراجع الواردة في طلب المستخدم (مثل موعد اللجنة) لتوضيح الاستعجال.
+لا تكتب تحية ولا خاتمة ولا قائمة بالفعاليات — تضاف هذه الأجزاء تلقائياً، ومنها سطر موعد الرد."""
+
+
+class FollowupItem(BaseModel):
+    """One thing an organization must complete or correct."""
+    event: str
+    city: str
+    request: str
+
+
+class FollowupLetter(BaseModel):
+    """A rendered follow-up letter for one responsible organization."""
+    organization: str
+    cities: List[str] = Field(default_factory=list)
+    items: List[FollowupItem] = Field(default_factory=list)
+    body: str = ""
+    letter: str = ""
+    generated: bool = Field(default=False, description="False when the template fallback body was used")
+    error: Optional[str] = None
+
+
 class FollowupAgent(BaseAgent):
     """وكيل المتابعة والتواصل — متخصص في تحديد الفجوات وصياغة رسائل المتابعة"""
 
@@ -54,48 +130,206 @@ class FollowupAgent(BaseAgent):
             description="تحديد المعلومات الناقصة وصياغة رسائل المتابعة",
             temperature=0.5
         )
-        self.knowledge_base = KnowledgeBase()
+        self.knowledge_base = get_shared_knowledge_base()
+        self._kb_tools: Optional[KBToolExecutor] = None
 
     def get_system_prompt(self) -> str:
         return FOLLOWUP_SYSTEM_PROMPT
 
+    @property
+    def kb_tools(self) -> KBToolExecutor:
+        return self._lazy("_kb_tools", lambda: KBToolExecutor(self.knowledge_base, EVENT_TOOLS, KB_TOOL_RESULT_TOKENS))
+
     def _identify_missing_info(self) -> Dict[str, List[Dict]]:
         """Identify missing information by city."""
-        events = self.knowledge_base.get_all_events()
+        stats = get_event_stats(self.knowledge_base)
 
         missing_by_city = {}
-
-        required_fields = {
-            'name': 'اسم الفعالية',
-            'start_date': 'تاريخ البداية',
-            'end_date': 'تاريخ النهاية',
-            'city': 'المدينة',
-            'responsible_org': 'الجهة المسؤولة',
-            'description': 'وصف الفعالية',
-            'tier': 'التصنيف',
-            'type': 'النوع',
-        }
-
-        for event in events:
-            city = event.get('city', 'غير محدد')
-            if city not in missing_by_city:
-                missing_by_city[city] = []
-
-            missing_fields = []
-            for field, label in required_fields.items():
-                if not event.get(field):
-                    missing_fields.append(label)
-
-            if missing_fields:
-                missing_by_city[city].append({
-                    'event_name': event.get('name', 'بدون اسم'),
-                    'responsible_org': event.get('responsible_org', 'غير محدد'),
-                    'missing_fields': missing_fields,
-                    'inclusion_status': event.get('inclusion_status', 'غير محدد')
-                })
+        for city, gaps in stats.gaps_by_city().items():
+            missing_by_city[city] = [
+                {
+                    'event_name': gap.name,
+                    'responsible_org': gap.responsible_org,
+                    'missing_fields': gap.missing_labels,
+                    'inclusion_status': gap.inclusion_status
+                }
+                for gap in gaps
+            ]
 
         return missing_by_city
 
+    def _collect_followups(self) -> Tuple[Dict[str, List[FollowupItem]], List[FollowupItem]]:
+        """
+        Group everything an entity must act on by responsible organization.
+
+        Missing required fields come from the event stats, corrections from the
+        quality rule engine. Items without a known organization are returned
+        separately since there is no one to address them to.
+        """
+        stats = get_event_stats(self.knowledge_base)
+        report = get_rule_engine(self.knowledge_base).last_report
+
+        by_org: Dict[str, List[FollowupItem]] = {}
+        for org, gaps in stats.gaps_by_org().items():
+            for gap in gaps:
+                by_org.setdefault(org, []).append(FollowupItem(
+                    event=gap.name,
+                    city=gap.city,
+                    request=f"استكمال: {', '.join(gap.missing_labels)}"
+                ))
+
+        for issue in report.issues:
+            if issue.rule_id == "required_fields":
+                continue
+            by_org.setdefault(issue.responsible_org, []).append(FollowupItem(
+                event=issue.event,
+                city=issue.city,
+                request=f"تصحيح — {issue.type}: {issue.details}"
+            ))
+
+        unaddressed = by_org.pop(UNSPECIFIED, [])
+        return by_org, unaddressed
+
+    @staticmethod
+    def _wants_letters(user_message: str) -> bool:
+        """Whether the request asks for follow-up letters rather than a status summary."""
+        return bool(_LETTER_RE.search(normalize_arabic(user_message)))
+
+    @staticmethod
+    def _format_items(items: List[FollowupItem]) -> str:
+        return "\n".join(f"- **{item.event}** ({item.city}): {item.request}" for item in items)
+
+    def _draft_letter(self, organization: str, items: List[FollowupItem], user_message: str, deadline: str, reference: str) -> Tuple[FollowupLetter, int, int]:
+        """Generate the entity-specific paragraph and render the full letter; returns (letter, input, output tokens)."""
+        cities = sorted({item.city for item in items})
+        formatted_items = self._format_items(items)
+        letter = FollowupLetter(organization=organization, cities=cities, items=items)
+        input_tokens = output_tokens = 0
+
+        prompt = LETTER_BODY_PROMPT.format(
+            request=user_message,
+            organization=organization,
+            cities="، ".join(cities),
+            items=formatted_items,
+            deadline=deadline,
+            reference=reference
+        )
+        try:
+            response = self._call_model(
+                [{"role": "user", "content": prompt}],
+                max_tokens=FOLLOWUP_LETTER_MAX_TOKENS
+            )
+            letter.body = response.content[0].text.strip()
+            letter.generated = True
+            input_tokens = response.usage.input_tokens
+            output_tokens = response.usage.output_tokens
+        except Exception as e:
+            letter.body = DEFAULT_LETTER_BODY
+            letter.error = str(e)
+
+        letter.letter = LETTER_TEMPLATE.format(
+            organization=organization,
+            body=letter.body,
+            items=formatted_items,
+            deadline=deadline,
+            reference=reference
+        )
+        return letter, input_tokens, output_tokens
+
+    def _invoke_batch(self, user_message: str) -> AgentResponse:
+        """Draft one letter per organization concurrently and return them as a bundle."""
+        started = time.perf_counter()
+        by_org, unaddressed = self._collect_followups()
+        changes = self.knowledge_base.get_changes_since_previous()
+        ranked = sorted(by_org.items(), key=lambda item: (-len(item[1]), item[0]))
+        selected = ranked[:FOLLOWUP_MAX_LETTERS]
+        today = date.today()
+        requested = extract_deadline(user_message, today)
+        due = requested.response_due(today, FOLLOWUP_DEADLINE_DAYS)
+        # An explicit date that is not itself the reply date (e.g. the committee meeting) is cited as context
+        reference_date = requested.explicit_date if requested.explicit_date and requested.explicit_date != due else None
+        deadline = format_date_ar(due)
+        reference = f"، تمهيداً للموعد النهائي للجنة في {format_date_ar(reference_date)}" if reference_date else ""
+
+        self._log_thinking(f"{len(by_org)} جهة تحتاج متابعة — صياغة {len(selected)} رسالة بالتوازي")
+
+        results = map_concurrently(
+            lambda entry: self._draft_letter(entry[0], entry[1], user_message, deadline, reference),
+            selected,
+            max_workers=MAX_CONCURRENT_CALLS
+        )
+
+        letters: List[FollowupLetter] = []
+        input_tokens = output_tokens = 0
+        for (org, items), result in zip(selected, results):
+            if result.ok:
+                letter, used_in, used_out = result.value
+                input_tokens += used_in
+                output_tokens += used_out
+            else:
+                letter = FollowupLetter(
+                    organization=org,
+                    cities=sorted({item.city for item in items}),
+                    items=items,
+                    body=DEFAULT_LETTER_BODY,
+                    letter=LETTER_TEMPLATE.format(
+                        organization=org,
+                        body=DEFAULT_LETTER_BODY,
+                        items=self._format_items(items),
+                        deadline=deadline,
+                        reference=reference
+                    ),
+                    error=result.error
+                )
+            letters.append(letter)
+
+        failed = sum(1 for letter in letters if not letter.generated)
+        elapsed = time.perf_counter() - started
+        self._log_thinking(f"اكتملت {len(letters) - failed} رسالة خلال {elapsed:.1f} ثانية")
+        if failed:
+            self._log_thinking(f"استُخدم النص القياسي في {failed} رسالة لتعذر الصياغة")
+
+        content = f"## رسائل المتابعة ({len(letters)} جهة)\n\n"
+        content += "| الجهة | المدن | البنود |\n|-------|-------|--------|\n"
+        for letter in letters:
+            content += f"| {letter.organization} | {'، '.join(letter.cities)} | {len(letter.items)} |\n"
+        if len(ranked) > len(selected):
+            content += f"\n*و{len(ranked) - len(selected)} جهات أخرى لم تُصغ لها رسائل في هذه الدفعة.*\n"
+        if unaddressed:
+            content += f"\n**بنود دون جهة مسؤولة محددة ({len(unaddressed)}):**\n{self._format_items(unaddressed)}\n"
+        if changes.base_version and not changes.is_empty:
+            content += f"\n### التغييرات منذ النسخة السابقة\n\n{format_diff(changes)}"
+
+        for letter in letters:
+            content += f"\n---\n\n{letter.letter}\n"
+
+        return AgentResponse(
+            content=content,
+            thinking=self._get_thinking_trace(),
+            metadata={
+                "model": self.model,
+                "input_tokens": input_tokens,
+                "output_tokens": output_tokens,
+                "mode": "batch_letters",
+                "organizations": len(letters),
+                "failed": failed,
+                "deadline": due.isoformat(),
+                "deadline_source": "request" if requested.found else "default",
+                "reference_date": reference_date.isoformat() if reference_date else None,
+                "elapsed_seconds": round(elapsed, 2),
+                "changes": {
+                    "base_version": changes.base_version,
+                    "added": len(changes.added),
+                    "removed": len(changes.removed),
+                    "modified": len(changes.modified)
+                },
+                "letters": [letter.model_dump() for letter in letters],
+                "unaddressed": [item.model_dump() for item in unaddressed]
+            },
+            agent_name=self.name,
+            agent_name_en=self.name_en
+        )
+
     def _format_missing_info_report(self, missing_by_city: Dict) -> str:
         """Format the missing info into a report."""
         report = "## تقرير المعلومات الناقصة\n\n"
@@ -117,6 +351,14 @@ class FollowupAgent(BaseAgent):
 
         return report
 
+    def _missing_info_overview(self, missing_by_city: Dict) -> str:
+        """Counts per city only; the events behind them are fetched through the tools."""
+        counts = "، ".join(f"{city} {len(events)}" for city, events in sorted(missing_by_city.items()))
+        return f"""{tool_overview(self.knowledge_base)}
+- فعاليات تحتاج استكمال حسب المدينة: {counts}
+
+{TOOLS_INSTRUCTION}"""
+
     def invoke(
         self,
         user_message: str,
@@ -127,8 +369,15 @@ class FollowupAgent(BaseAgent):
         self._clear_thinking()
         self._log_thinking("تحديد المعلومات الناقصة...")
 
+        if self._wants_letters(user_message):
+            return self._invoke_batch(user_message)
+
         missing_by_city = self._identify_missing_info()
-        missing_report = self._format_missing_info_report(missing_by_city)
+        if KB_TOOLS_ENABLED:
+            missing_report = self._missing_info_overview(missing_by_city)
+        else:
+            missing_report = self._format_missing_info_report(missing_by_city)
+        changes = self.knowledge_base.get_changes_since_previous()
 
         self._log_thinking("تم تحديد المعلومات الناقصة لكل مدينة")
 
@@ -137,8 +386,11 @@ class FollowupAgent(BaseAgent):
 تقرير المعلومات الناقصة:
 {missing_report}
 
+التغييرات منذ النسخة السابقة من البيانات:
+{format_diff(changes)}
+
 بناءً على هذه البيانات:
-١. لخص الوضع الحالي
+١. لخص الوضع الحالي وما تغير منذ النسخة السابقة
 ٢. رتب أولويات المتابعة
 ٣. صغ رسائل متابعة رسمية للجهات التي تحتاج استكمال بياناتها"""
 
@@ -147,22 +399,27 @@ class FollowupAgent(BaseAgent):
         try:
             self._log_thinking("صياغة رسائل المتابعة...")
 
-            response = self.client.messages.create(
-                model=self.model,
-                max_tokens=self.max_tokens,
-                temperature=self.temperature,
-                system=self.get_system_prompt(),
-                messages=messages
-            )
-
-            response_text = response.content[0].text
+            if KB_TOOLS_ENABLED:
+                loop = self._run_tool_loop(messages, self.kb_tools, KB_TOOL_MAX_ROUNDS)
+                response_text, usage, tool_metadata = loop.text, (loop.input_tokens, loop.output_tokens), loop.as_metadata()
+            else:
+                response = self._call_model(messages)
+                response_text, tool_metadata = response.content[0].text, {}
+                usage = (response.usage.input_tokens, response.usage.output_tokens)
             self._log_thinking("اكتملت صياغة رسائل المتابعة")
 
             metadata = {
                 "model": self.model,
-                "input_tokens": response.usage.input_tokens,
-                "output_tokens": response.usage.output_tokens,
-                "cities_needing_followup": sum(1 for e in missing_by_city.values() if e)
+                "input_tokens": usage[0],
+                "output_tokens": usage[1],
+                **tool_metadata,
+                "cities_needing_followup": sum(1 for e in missing_by_city.values() if e),
+                "changes": {
+                    "base_version": changes.base_version,
+                    "added": len(changes.added),
+                    "removed": len(changes.removed),
+                    "modified": len(changes.modified)
+                }
             }
 
             return AgentResponse(
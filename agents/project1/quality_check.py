@@ -4,7 +4,9 @@
 
 from typing import Optional, Dict, List
 from ..base_agent import BaseAgent, AgentResponse
-from utils.knowledge_base import KnowledgeBase
+from utils.knowledge_base import get_shared_knowledge_base, row_to_event
+from utils.event_analytics import get_event_stats
+from utils.quality_rules import ValidationReport, SEVERITY_HIGH, get_rule_engine
 
 
 QUALITY_CHECK_SYSTEM_PROMPT = """أنت وكيل فحص الجودة المتخصص في نظام لجنة الفعاليات.
@@ -64,80 +66,48 @@ class QualityCheckAgent(BaseAgent):
             description="التحقق من اكتمال البيانات وجودتها",
             temperature=0.2
         )
-        self.knowledge_base = KnowledgeBase()
+        self.knowledge_base = get_shared_knowledge_base()
 
     def get_system_prompt(self) -> str:
         return QUALITY_CHECK_SYSTEM_PROMPT
 
-    def _check_data_quality(self) -> Dict:
-        """Perform comprehensive data quality check."""
-        events = self.knowledge_base.get_all_events()
+    @staticmethod
+    def _report_issues(report: ValidationReport) -> List[Dict]:
+        """Rule issues as dicts, high severity first."""
+        issues = [issue.model_dump() for issue in report.issues]
+        issues.sort(key=lambda issue: issue['severity'] != SEVERITY_HIGH)
+        return issues
 
-        required_fields = ['name', 'responsible_org', 'description', 'start_date', 'end_date', 'tier', 'type']
-        optional_fields = ['duration_days', 'subcategory', 'funding', 'communication']
+    def _check_data_quality(self, uploaded_rows: Optional[List[Dict]] = None) -> Dict:
+        """Perform comprehensive data quality check."""
+        stats = get_event_stats(self.knowledge_base)
+        engine = get_rule_engine(self.knowledge_base)
+        report = engine.last_report
+        issues_by_city = report.issues_by_city()
 
         quality_report = {
-            'total_events': len(events),
+            'total_events': stats.total,
             'by_city': {},
-            'issues': [],
+            'issues': self._report_issues(report),
+            'rules': [(s.label, s.issues) for s in report.rule_stats],
+            'rule_timings_ms': {s.rule_id: round(s.seconds * 1000, 2) for s in report.rule_stats},
+            'uploaded': None,
             'overall_score': 0
         }
 
-        city_scores = {}
-
-        for event in events:
-            city = event.get('city', 'غير محدد')
-
-            if city not in city_scores:
-                city_scores[city] = {
-                    'total': 0,
-                    'complete': 0,
-                    'issues': []
-                }
-
-            city_scores[city]['total'] += 1
-
-            missing_required = []
-            for field in required_fields:
-                if not event.get(field):
-                    missing_required.append(field)
-
-            missing_optional = []
-            for field in optional_fields:
-                if not event.get(field):
-                    missing_optional.append(field)
-
-            total_fields = len(required_fields) + len(optional_fields)
-            filled_fields = total_fields - len(missing_required) - len(missing_optional)
-            completeness = filled_fields / total_fields if total_fields > 0 else 0
-
-            if completeness >= 0.9:
-                city_scores[city]['complete'] += 1
-
-            if missing_required:
-                field_labels = {
-                    'name': 'اسم الفعالية',
-                    'responsible_org': 'الجهة المسؤولة',
-                    'description': 'وصف الفعالية',
-                    'start_date': 'تاريخ البداية',
-                    'end_date': 'تاريخ النهاية',
-                    'tier': 'التصنيف',
-                    'type': 'النوع',
-                }
-                missing_labels = [field_labels.get(f, f) for f in missing_required]
-                issue = {
-                    'event': event.get('name', 'بدون اسم'),
-                    'city': city,
-                    'type': 'حقول مطلوبة ناقصة',
-                    'details': ', '.join(missing_labels),
-                    'severity': 'عالية'
-                }
-                quality_report['issues'].append(issue)
-                city_scores[city]['issues'].append(issue)
+        if uploaded_rows:
+            events = [e for e in (row_to_event(row) for row in uploaded_rows) if e is not None]
+            uploaded_report = engine.validate_incremental(events)
+            quality_report['uploaded'] = {
+                'rows': len(uploaded_rows),
+                'checked': uploaded_report.checked,
+                'issues': self._report_issues(uploaded_report),
+                'rules': [(s.label, s.issues) for s in uploaded_report.rule_stats],
+            }
 
-        for city, data in city_scores.items():
-            if data['total'] > 0:
-                score = data['complete'] * 100 // data['total']
+        for city, data in stats.completeness.items():
+            if data.total > 0:
+                score = data.well_filled_rate
                 if score >= 90:
                     grade = 'ممتاز'
                 elif score >= 70:
@@ -148,17 +118,15 @@ class QualityCheckAgent(BaseAgent):
                     grade = 'ضعيف'
 
                 quality_report['by_city'][city] = {
-                    'total': data['total'],
-                    'complete': data['complete'],
+                    'total': data.total,
+                    'complete': data.well_filled,
                     'score': score,
                     'grade': grade,
-                    'issues_count': len(data['issues'])
+                    'issues_count': issues_by_city.get(city, 0)
                 }
 
-        if city_scores:
-            total_complete = sum(d['complete'] for d in city_scores.values())
-            total_events = sum(d['total'] for d in city_scores.values())
-            quality_report['overall_score'] = total_complete * 100 // total_events if total_events > 0 else 0
+        if stats.total > 0:
+            quality_report['overall_score'] = stats.well_filled * 100 // stats.total
 
         return quality_report
 
@@ -186,6 +154,21 @@ class QualityCheckAgent(BaseAgent):
             if len(report['issues']) > 10:
                 output += f"*و{len(report['issues']) - 10} مشكلات أخرى...*\n"
 
+        output += "\n### نتائج قواعد الفحص:\n| القاعدة | المشكلات |\n|---------|----------|\n"
+        for label, count in report['rules']:
+            output += f"| {label} | {count} |\n"
+
+        uploaded = report.get('uploaded')
+        if uploaded:
+            output += f"\n### فحص البيانات المحمّلة ({uploaded['checked']} من {uploaded['rows']} سجل بأسماء فعاليات):\n"
+            output += "| القاعدة | المشكلات |\n|---------|----------|\n"
+            for label, count in uploaded['rules']:
+                output += f"| {label} | {count} |\n"
+            for i, issue in enumerate(uploaded['issues'][:10], 1):
+                output += f"**{i}. {issue['event']}** ({issue['city']}) — {issue['type']}: {issue['details']}\n"
+            if len(uploaded['issues']) > 10:
+                output += f"*و{len(uploaded['issues']) - 10} مشكلات أخرى...*\n"
+
         return output
 
     def invoke(
@@ -198,10 +181,14 @@ class QualityCheckAgent(BaseAgent):
         self._clear_thinking()
         self._log_thinking("فحص جودة البيانات...")
 
-        quality_report = self._check_data_quality()
+        uploaded_rows = (context or {}).get('_uploaded_rows')
+        quality_report = self._check_data_quality(uploaded_rows)
         formatted_report = self._format_quality_report(quality_report)
 
         self._log_thinking(f"تم فحص {quality_report['total_events']} فعالية")
+        self._log_thinking(f"زمن القواعد (ms): {quality_report['rule_timings_ms']}")
+        if quality_report['uploaded']:
+            self._log_thinking(f"تم فحص {quality_report['uploaded']['checked']} سجل من البيانات المحمّلة")
         self._log_thinking(f"النتيجة الإجمالية: {quality_report['overall_score']}%")
 
         enhanced_message = f"""طلب المستخدم: {user_message}
@@ -216,13 +203,7 @@ class QualityCheckAgent(BaseAgent):
         try:
             self._log_thinking("إعداد التوصيات...")
 
-            response = self.client.messages.create(
-                model=self.model,
-                max_tokens=self.max_tokens,
-                temperature=self.temperature,
-                system=self.get_system_prompt(),
-                messages=messages
-            )
+            response = self._call_model(messages)
 
             response_text = response.content[0].text
             self._log_thinking("اكتمل تقرير فحص الجودة")
@@ -232,7 +213,8 @@ class QualityCheckAgent(BaseAgent):
                 "input_tokens": response.usage.input_tokens,
                 "output_tokens": response.usage.output_tokens,
                 "quality_score": quality_report['overall_score'],
-                "issues_found": len(quality_report['issues'])
+                "issues_found": len(quality_report['issues']),
+                "rule_timings_ms": quality_report['rule_timings_ms']
             }
 
             return AgentResponse(
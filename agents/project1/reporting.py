@@ -2,9 +2,19 @@
 وكيل إعداد التقارير — لجنة الفعاليات
 """
 
-from typing import Optional, Dict, List
+import time
+from typing import Optional, Dict, List, Tuple
+from pydantic import BaseModel
 from ..base_agent import BaseAgent, AgentResponse
-from utils.knowledge_base import KnowledgeBase
+from utils.knowledge_base import get_shared_knowledge_base
+from utils.event_analytics import get_event_stats
+from utils.quality_rules import get_rule_engine
+from utils.timeline import get_timeline, UNPLACED_CITIES
+from utils.cache import LRUCache
+from utils.concurrency import map_concurrently
+from utils.event_diff import format_diff
+from utils.text import normalize_arabic, compile_phrase_pattern
+from config import MAX_CONCURRENT_CALLS, REPORT_SECTION_MAX_TOKENS, REPORT_SECTION_CACHE_SIZE
 
 
 REPORTING_SYSTEM_PROMPT = """أنت وكيل إعداد التقارير المتخصص في نظام لجنة الفعاليات.
@@ -48,6 +58,50 @@ REPORTING_SYSTEM_PROMPT = """أنت وكيل إعداد التقارير الم
 - قدم توصيات قابلة للتنفيذ"""
 
 
+# Requests containing any of these get a change-only report (changed cities only)
+CHANGE_KEYWORDS = ["ما الذي تغير", "ماذا تغير", "التغييرات", "تغييرات", "المستجدات", "مستجدات",
+                   "منذ الاجتماع", "منذ آخر اجتماع", "منذ الاجتماع السابق",
+                   "what changed", "changes", "since last", "what's new"]
+
+_CHANGE_RE = compile_phrase_pattern(CHANGE_KEYWORDS)
+
+# Label of the snapshot recorded when a committee report is produced
+REPORT_SNAPSHOT_LABEL = "تقرير اللجنة"
+
+CITY_SECTION_PROMPT = """بيانات مدينة {city}:
+{aggregates}
+
+اكتب قسم هذه المدينة في تقرير اللجنة الإشرافية: الوضع الحالي بالأرقام، ثم أبرز التحديات والمخاطر، ثم الإجراءات المقترحة.
+لا تزد على ٢٥٠ كلمة. ابدأ بالمحتوى مباشرة دون عنوان — يضاف عنوان المدينة تلقائياً."""
+
+EXECUTIVE_SUMMARY_PROMPT = """طلب المستخدم: {request}
+
+البيانات الإجمالية:
+{status}
+
+التغييرات منذ النسخة السابقة من البيانات:
+{changes}
+
+أقسام المدن (معدة مسبقاً وستُرفق بالتقرير كما هي):
+{sections}
+
+اكتب الجزء العام من تقرير اللجنة الإشرافية: الملخص التنفيذي، والتحديات والمخاطر المشتركة بين المدن، والخطوات التالية، والتوصيات.
+لا تكرر تفاصيل أقسام المدن — أشر إليها عند الحاجة فقط."""
+
+
+class ReportSection(BaseModel):
+    """A generated per-city report section, cached by the city's data version."""
+    city: str
+    version: str
+    content: str
+    input_tokens: int = 0
+    output_tokens: int = 0
+
+
+# Shared across agent instances: a city's section is reused until its data changes
+_section_cache = LRUCache(REPORT_SECTION_CACHE_SIZE)
+
+
 class ReportingAgent(BaseAgent):
     """وكيل إعداد التقارير — متخصص في تجميع النتائج وإعداد تقارير اللجان"""
 
@@ -58,62 +112,34 @@ class ReportingAgent(BaseAgent):
             description="تجميع النتائج وإعداد تقارير اللجان",
             temperature=0.4
         )
-        self.knowledge_base = KnowledgeBase()
+        self.knowledge_base = get_shared_knowledge_base()
 
     def get_system_prompt(self) -> str:
         return REPORTING_SYSTEM_PROMPT
 
     def _get_status_summary(self) -> Dict:
         """Get overall status summary."""
-        events = self.knowledge_base.get_all_events()
-
-        total = len(events)
-        by_city = {}
-        by_tier = {}
-        by_inclusion = {}
-        complete = 0
-
-        required_fields = ['name', 'start_date', 'city', 'responsible_org', 'tier', 'type', 'description']
-
-        for event in events:
-            city = event.get('city', 'غير محدد')
-            if city not in by_city:
-                by_city[city] = {'total': 0, 'complete': 0}
-            by_city[city]['total'] += 1
-
-            tier = event.get('tier', 'غير محدد')
-            by_tier[tier] = by_tier.get(tier, 0) + 1
-
-            inclusion = event.get('inclusion_status', 'غير محدد')
-            by_inclusion[inclusion] = by_inclusion.get(inclusion, 0) + 1
-
-            is_complete = all(event.get(f) for f in required_fields)
-            if is_complete:
-                complete += 1
-                by_city[city]['complete'] += 1
+        stats = get_event_stats(self.knowledge_base)
 
         return {
-            'total_events': total,
-            'complete_events': complete,
-            'completion_rate': complete * 100 // total if total > 0 else 0,
-            'by_city': by_city,
-            'by_tier': by_tier,
-            'by_inclusion': by_inclusion
+            'total_events': stats.total,
+            'complete_events': stats.complete,
+            'completion_rate': stats.completion_rate,
+            'by_city': {
+                city: {'total': c.total, 'complete': c.complete}
+                for city, c in stats.completeness.items()
+            },
+            'by_tier': dict(stats.by_tier),
+            'by_inclusion': dict(stats.by_inclusion)
         }
 
-    def invoke(
-        self,
-        user_message: str,
-        context: Optional[Dict] = None,
-        conversation_history: Optional[List[Dict]] = None
-    ) -> AgentResponse:
-        """Prepare reports based on user request."""
-        self._clear_thinking()
-        self._log_thinking("تجميع البيانات لإعداد التقرير...")
-
-        status = self._get_status_summary()
-        self._log_thinking(f"تم تجميع بيانات {status['total_events']} فعالية")
+    @staticmethod
+    def _wants_changes(user_message: str) -> bool:
+        """Whether the request asks only for what changed since the previous data version."""
+        return bool(_CHANGE_RE.search(normalize_arabic(user_message)))
 
+    def _format_status_summary(self, status: Dict) -> str:
+        """Format the overall status as the shared input of the reduce step."""
         status_text = f"""## ملخص الوضع الحالي
 
 ### الإحصائيات العامة:
@@ -137,35 +163,169 @@ class ReportingAgent(BaseAgent):
         for inc, count in sorted(status['by_inclusion'].items(), key=lambda x: x[1], reverse=True):
             status_text += f"- {inc}: {count}\n"
 
-        enhanced_message = f"""طلب المستخدم: {user_message}
+        return status_text
 
-البيانات المتاحة:
-{status_text}
+    def _get_city_aggregates(self, city: str) -> str:
+        """City-scoped aggregates feeding one map step; depends only on that city's events."""
+        stats = get_event_stats(self.knowledge_base)
+        completeness = stats.completeness[city]
 
-أعد تقريراً مناسباً للجنة الإشرافية بناءً على هذه البيانات وطلب المستخدم."""
+        text = f"""- إجمالي الفعاليات: {completeness.total}
+- مكتملة الحقول المطلوبة: {completeness.complete} ({completeness.completion_rate}%)
+- موثقة بشكل جيد: {completeness.well_filled} ({completeness.well_filled_rate}%)
+- التصنيف: {', '.join(f'{k}: {v}' for k, v in stats.top(stats.city_tier[city], len(stats.city_tier[city])))}
+- النوع: {', '.join(f'{k}: {v}' for k, v in stats.top(stats.city_type[city], len(stats.city_type[city])))}
+- حالة التضمين: {', '.join(f'{k}: {v}' for k, v in stats.top(stats.city_inclusion[city], len(stats.city_inclusion[city])))}
+- أبرز الجهات: {', '.join(f'{k} ({v})' for k, v in stats.top_orgs(5, city=city))}
+"""
+        gaps = stats.gaps_by_city().get(city, [])
+        if gaps:
+            text += f"\nفعاليات تنقصها حقول مطلوبة ({len(gaps)}):\n"
+            for gap in gaps[:10]:
+                text += f"- {gap.name}: {', '.join(gap.missing_labels)}\n"
+
+        issue_counts: Dict[str, int] = {}
+        for issue in get_rule_engine(self.knowledge_base).last_report.issues:
+            if issue.city == city and issue.rule_id != "required_fields":
+                issue_counts[issue.type] = issue_counts.get(issue.type, 0) + 1
+        if issue_counts:
+            text += "\nملاحظات فحص الجودة:\n"
+            for label, count in sorted(issue_counts.items(), key=lambda x: x[1], reverse=True):
+                text += f"- {label}: {count}\n"
+
+        timeline = get_timeline(self.knowledge_base)
+        city_timeline = timeline.cities.get(city)
+        if city_timeline:
+            gap = timeline.longest_gap(city)
+            text += f"""
+الجدول الزمني:
+- أيام بفعاليتين فأكثر: {city_timeline.busy_days}
+- ذروة الإشغال: {city_timeline.peak_load} فعالية في {city_timeline.peak_day}
+- أطول فجوة: {f'{gap.days} يوم ({gap.start} — {gap.end})' if gap else 'لا يوجد'}
+"""
+            clashes = [c for c in timeline.clashes if c.city == city]
+            for clash in clashes[:5]:
+                text += f"- تعارض: {clash.first} / {clash.second} ({clash.overlap_start} — {clash.overlap_end})\n"
+
+        return text
+
+    def _generate_city_section(self, city: str) -> Tuple[ReportSection, bool]:
+        """Map step: write one city's section, reusing the cached one while its data is unchanged."""
+        version = self.knowledge_base.get_city_version(city)
+        key = (city, version, self.model)
+        cached = _section_cache.get(key)
+        if cached is not None:
+            return cached, True
+
+        prompt = CITY_SECTION_PROMPT.format(city=city, aggregates=self._get_city_aggregates(city))
+        response = self._call_model(
+            [{"role": "user", "content": prompt}],
+            max_tokens=REPORT_SECTION_MAX_TOKENS
+        )
+        section = ReportSection(
+            city=city,
+            version=version,
+            content=response.content[0].text.strip(),
+            input_tokens=response.usage.input_tokens,
+            output_tokens=response.usage.output_tokens
+        )
+        _section_cache.put(key, section)
+        return section, False
+
+    def invoke(
+        self,
+        user_message: str,
+        context: Optional[Dict] = None,
+        conversation_history: Optional[List[Dict]] = None
+    ) -> AgentResponse:
+        """Prepare reports based on user request."""
+        self._clear_thinking()
+        self._log_thinking("تجميع البيانات لإعداد التقرير...")
+
+        status = self._get_status_summary()
+        self._log_thinking(f"تم تجميع بيانات {status['total_events']} فعالية")
+        status_text = self._format_status_summary(status)
+
+        stats = get_event_stats(self.knowledge_base)
+        cities = [c for c in stats.cities_by_size() if c not in UNPLACED_CITIES]
+
+        changes = self.knowledge_base.get_changes_since_previous()
+        change_only = self._wants_changes(user_message) and bool(changes.base_version)
+        if change_only:
+            changed = set(changes.changed_cities())
+            cities = [c for c in cities if c in changed]
+            self._log_thinking(f"تقرير التغييرات فقط — {len(cities)} مدن تغيرت بياناتها")
+        elif changes.base_version:
+            self._log_thinking(f"التغييرات منذ النسخة السابقة: +{len(changes.added)} / -{len(changes.removed)} / ~{len(changes.modified)}")
+
+        started = time.perf_counter()
+        self._log_thinking(f"إعداد أقسام {len(cities)} مدن بالتوازي...")
+        results = map_concurrently(self._generate_city_section, cities, max_workers=MAX_CONCURRENT_CALLS)
+
+        sections: List[ReportSection] = []
+        section_meta = {}
+        input_tokens = output_tokens = 0
+        for city, result in zip(cities, results):
+            from_cache = False
+            if result.ok:
+                section, from_cache = result.value
+                if not from_cache:
+                    input_tokens += section.input_tokens
+                    output_tokens += section.output_tokens
+            else:
+                self._log_thinking(f"تعذر إعداد قسم {city}: {result.error}")
+                section = ReportSection(
+                    city=city,
+                    version="",
+                    content=f"تعذر إعداد هذا القسم آلياً. البيانات المتاحة:\n{self._get_city_aggregates(city)}"
+                )
+            sections.append(section)
+            section_meta[city] = {"cached": from_cache, "seconds": round(result.seconds, 2), "error": result.error}
+
+        reused = sum(1 for meta in section_meta.values() if meta["cached"])
+        self._log_thinking(f"اكتملت أقسام المدن خلال {time.perf_counter() - started:.1f} ثانية ({reused} من الذاكرة المؤقتة)")
+
+        sections_text = "\n\n".join(f"### {s.city}\n{s.content}" for s in sections)
+        enhanced_message = EXECUTIVE_SUMMARY_PROMPT.format(
+            request=user_message,
+            status=status_text,
+            changes=format_diff(changes),
+            sections=sections_text or "لا توجد مدن تغيرت بياناتها."
+        )
 
         messages = self._build_messages(enhanced_message, context, conversation_history)
 
         try:
-            self._log_thinking("إعداد التقرير...")
-
-            response = self.client.messages.create(
-                model=self.model,
-                max_tokens=self.max_tokens,
-                temperature=self.temperature,
-                system=self.get_system_prompt(),
-                messages=messages
-            )
+            self._log_thinking("إعداد الملخص التنفيذي...")
+
+            response = self._call_model(messages)
 
             response_text = response.content[0].text
+            if sections_text:
+                heading = "المدن التي تغيرت بياناتها" if change_only else "الوضع حسب المدينة"
+                response_text += f"\n\n## {heading}\n\n{sections_text}"
             self._log_thinking("اكتمل إعداد التقرير")
 
+            # Record the dataset the committee saw so the next report can diff against it
+            if self.knowledge_base.ensure_snapshot(REPORT_SNAPSHOT_LABEL):
+                self._log_thinking("تم حفظ نسخة من البيانات للمقارنة في التقرير القادم")
+
             metadata = {
                 "model": self.model,
-                "input_tokens": response.usage.input_tokens,
-                "output_tokens": response.usage.output_tokens,
+                "input_tokens": input_tokens + response.usage.input_tokens,
+                "output_tokens": output_tokens + response.usage.output_tokens,
                 "report_type": "committee_report",
-                "data_summary": status
+                "data_summary": status,
+                "sections": section_meta,
+                "section_cache": _section_cache.stats(),
+                "change_only": change_only,
+                "changes": {
+                    "base_version": changes.base_version,
+                    "added": len(changes.added),
+                    "removed": len(changes.removed),
+                    "modified": len(changes.modified)
+                },
+                "elapsed_seconds": round(time.perf_counter() - started, 2)
             }
 
             return AgentResponse(
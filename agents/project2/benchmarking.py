@@ -2,9 +2,19 @@
 وكيل المقارنة المعيارية — احتفالية مرور ٣٠٠ عام على تأسيس الدولة السعودية
 """
 
-from typing import Optional, Dict, List
+import time
+from typing import Optional, Dict, List, Tuple
+from pydantic import BaseModel
 from ..base_agent import BaseAgent, AgentResponse
-from utils.knowledge_base import KnowledgeBase
+from utils.knowledge_base import get_shared_knowledge_base
+from utils.cache import LRUCache
+from utils.concurrency import map_concurrently
+from utils.benchmark_metrics import DERIVED_METRICS, METRIC_DEFINITIONS, format_metrics_tables, format_number, get_metrics_cube
+from utils.kb_tools import BENCHMARK_TOOLS, TOOLS_INSTRUCTION, KBToolExecutor, tool_overview
+from config import (
+    MAX_CONCURRENT_CALLS, BENCHMARK_CASE_MAX_TOKENS, BENCHMARK_CASE_CACHE_SIZE,
+    KB_TOOLS_ENABLED, KB_TOOL_MAX_ROUNDS, KB_TOOL_RESULT_TOKENS
+)
 
 
 BENCHMARKING_SYSTEM_PROMPT = """أنت وكيل المقارنة المعيارية المتخصص في دراسة تجارب الاحتفاليات الدولية الكبرى.
@@ -38,6 +48,60 @@ BENCHMARKING_SYSTEM_PROMPT = """أنت وكيل المقارنة المعيار
 - لا تستخدم رموز تعبيرية مطلقاً"""
 
 
+# Names and countries that identify a case in a request (several may be named at once)
+CASE_KEYWORDS = {
+    "سانت بطرسبرغ": "St. Petersburg",
+    "بطرسبرغ": "St. Petersburg",
+    "روسيا": "St. Petersburg",
+    "st. petersburg": "St. Petersburg",
+    "petersburg": "St. Petersburg",
+    "روما": "Rome",
+    "إيطاليا": "Rome",
+    "rome": "Rome",
+    "برشلونة": "Barcelona",
+    "إسبانيا": "Barcelona",
+    "barcelona": "Barcelona"
+}
+
+CASE_ANALYSIS_PROMPT = """بيانات التجربة:
+{case}
+
+حلل هذه التجربة تحليلاً موجزاً قابلاً للمقارنة، بالعناوين التالية بالترتيب:
+١. التموضع الاستراتيجي (محلي، وطني، دولي)
+٢. نموذج البرمجة والتفعيل
+٣. الحوكمة وهيكل التنفيذ
+٤. الانتشار الجغرافي وكثافة التفعيل
+٥. أبرز الأرقام
+٦. الدروس المستفادة (للاعتماد، للتكييف، للتجنب)
+
+لا تزد على ٣٠٠ كلمة. استخدم الأرقام الواردة فقط."""
+
+COMPARISON_PROMPT = """طلب المستخدم: {request}
+
+تحليلات موجزة للتجارب الدولية (أُعدت لكل تجربة على حدة):
+{analyses}
+
+الأرقام الموحدة والنسب المحسوبة مسبقاً (اعتمدها كما هي ولا تُعد حسابها):
+{metrics}
+
+قدم تحليلاً مقارناً يجيب عن الطلب: أوجه التشابه والاختلاف عبر المحاور نفسها، ثم ما ينطبق على سياقنا المحلي، ثم توصيات محددة.
+قارن عبر التجارب بدلاً من تكرار كل تحليل."""
+
+
+class CaseAnalysis(BaseModel):
+    """A compact per-case analysis, cached by benchmark id and the case's data version."""
+    benchmark_id: str
+    name: str
+    version: str
+    content: str
+    input_tokens: int = 0
+    output_tokens: int = 0
+
+
+# Shared across agent instances: a case is analyzed once until its data changes
+_case_cache = LRUCache(BENCHMARK_CASE_CACHE_SIZE)
+
+
 class BenchmarkingAgent(BaseAgent):
     """وكيل المقارنة المعيارية — متخصص في دراسة التجارب الدولية"""
 
@@ -48,48 +112,84 @@ class BenchmarkingAgent(BaseAgent):
             description="إجراء البحوث المقارنة وتحليل التجارب الدولية",
             temperature=0.5
         )
-        self.knowledge_base = KnowledgeBase()
+        self.knowledge_base = get_shared_knowledge_base()
+        self._kb_tools: Optional[KBToolExecutor] = None
 
     def get_system_prompt(self) -> str:
         return BENCHMARKING_SYSTEM_PROMPT
 
+    @property
+    def kb_tools(self) -> KBToolExecutor:
+        return self._lazy("_kb_tools", lambda: KBToolExecutor(self.knowledge_base, BENCHMARK_TOOLS, KB_TOOL_RESULT_TOKENS))
+
     def _get_benchmark_context(self, case_name: str = None) -> str:
         """Get benchmark data from knowledge base."""
+        metrics = format_metrics_tables(get_metrics_cube(self.knowledge_base))
         if case_name:
             benchmark = self.knowledge_base.get_benchmark_by_name(case_name)
             if benchmark:
-                return self._format_single_benchmark(benchmark)
+                return self._format_single_benchmark(benchmark) + "\n## موقع التجربة بين التجارب المتاحة\n\n" + metrics
 
         benchmarks = self.knowledge_base.get_all_benchmarks()
         context = "## التجارب الدولية المتاحة:\n\n"
         for b in benchmarks:
             context += self._format_single_benchmark(b) + "\n---\n"
-        return context
+        return context + "\n" + metrics
 
     def _format_single_benchmark(self, benchmark: Dict) -> str:
         """Format a single benchmark for context."""
-        output = f"""### {benchmark.get('name', 'بدون اسم')}
+        overview = benchmark.get('overview', {})
+        output = f"""### {benchmark.get('name', 'بدون اسم')} ({benchmark.get('name_en', '')})
 
-**الموقع:** {benchmark.get('location', 'غير محدد')}
+**الدولة:** {benchmark.get('country', 'غير محدد')}
 **السنة:** {benchmark.get('year', 'غير محدد')}
-**المدة:** {benchmark.get('duration', 'غير محدد')}
+**المدة:** {benchmark.get('duration_days', 'غير محدد')} يوماً
 
-**الوصف:**
-{benchmark.get('description', 'لا يوجد وصف')}
+**الملخص:**
+{overview.get('summary', 'لا يوجد وصف')}
 
-**الأهداف:**
+**الرؤية الاستراتيجية:** {overview.get('strategic_vision', 'غير متاح')}
 """
-        for obj in benchmark.get('objectives', []):
-            output += f"- {obj}\n"
-
-        output += f"\n**النتائج الرئيسية:**\n"
-        for outcome in benchmark.get('key_outcomes', []):
-            output += f"- {outcome}\n"
-
-        output += f"\n**المؤشرات:**\n"
-        metrics = benchmark.get('metrics', {})
-        for key, value in metrics.items():
-            output += f"- {key}: {value}\n"
+        themes = overview.get('key_themes', [])
+        if themes:
+            output += f"**المحاور:** {'، '.join(themes)}\n"
+
+        cube = get_metrics_cube(self.knowledge_base)
+        case_id = benchmark.get('id', '')
+        output += f"\n**المؤشرات (قيم موحدة، العملات بالدولار):**\n"
+        for key, (label, kind) in METRIC_DEFINITIONS.items():
+            value = cube.values.get(key, {}).get(case_id)
+            if value is not None:
+                output += f"- {label}: {format_number(value, kind)}\n"
+        for key, (label, _, _, kind) in DERIVED_METRICS.items():
+            value = cube.derived.get(key, {}).get(case_id)
+            if value is not None:
+                output += f"- {label}: {format_number(value, kind)}\n"
+
+        programming = benchmark.get('programming_model', {})
+        if programming:
+            output += f"\n**نموذج البرمجة:** {programming.get('structure', '')}\n"
+            for category in programming.get('event_categories', []):
+                highlights = '، '.join(category.get('highlights', []))
+                output += f"- {category.get('category', '')} ({category.get('count', '')}): {highlights}\n"
+            if programming.get('temporal_distribution'):
+                output += f"- التوزيع الزمني: {programming['temporal_distribution']}\n"
+
+        governance = benchmark.get('governance', {})
+        if governance:
+            output += f"\n**الحوكمة:** {governance.get('structure', '')}\n"
+            for body in governance.get('key_bodies', []):
+                output += f"- {body.get('name', '')}: {body.get('role', '')}\n"
+            for key, label in (("budget_management", "إدارة الميزانية"), ("decision_timeline", "الإطار الزمني")):
+                if governance.get(key):
+                    output += f"- {label}: {governance[key]}\n"
+
+        for key, title in (("success_factors", "عوامل النجاح"), ("challenges_faced", "التحديات"), ("legacy", "الإرث")):
+            items = benchmark.get(key, [])
+            if items:
+                output += f"\n**{title}:**\n"
+                for item in items:
+                    output += f"- {item}\n"
 
         output += f"\n**الدروس المستفادة:**\n"
         lessons = benchmark.get('lessons_learned', {})
@@ -108,6 +208,103 @@ class BenchmarkingAgent(BaseAgent):
 
         return output
 
+    @staticmethod
+    def _find_cases(user_message: str) -> List[str]:
+        """Every case named in the request, in first-mention order."""
+        message_lower = user_message.lower()
+        found = []
+        for keyword, case in CASE_KEYWORDS.items():
+            position = message_lower.find(keyword)
+            if position >= 0:
+                found.append((position, case))
+        cases = []
+        for _, case in sorted(found):
+            if case not in cases:
+                cases.append(case)
+        return cases
+
+    def _analyze_case(self, benchmark: Dict) -> Tuple[CaseAnalysis, bool]:
+        """Map step: compact analysis of one case, reused while the case data is unchanged."""
+        version = self.knowledge_base.get_benchmark_version(benchmark)
+        key = (benchmark.get("id", ""), version, self.model)
+        cached = _case_cache.get(key)
+        if cached is not None:
+            return cached, True
+
+        response = self._call_model(
+            [{"role": "user", "content": CASE_ANALYSIS_PROMPT.format(case=self._format_single_benchmark(benchmark))}],
+            max_tokens=BENCHMARK_CASE_MAX_TOKENS
+        )
+        analysis = CaseAnalysis(
+            benchmark_id=benchmark.get("id", ""),
+            name=benchmark.get("name", ""),
+            version=version,
+            content=response.content[0].text.strip(),
+            input_tokens=response.usage.input_tokens,
+            output_tokens=response.usage.output_tokens
+        )
+        _case_cache.put(key, analysis)
+        return analysis, False
+
+    def _compare_cases(
+        self,
+        user_message: str,
+        benchmarks: List[Dict],
+        context: Optional[Dict],
+        conversation_history: Optional[List[Dict]]
+    ) -> AgentResponse:
+        """Analyze each case in parallel, then compare over the compact analyses."""
+        started = time.perf_counter()
+        self._log_thinking(f"تحليل {len(benchmarks)} تجارب بالتوازي ثم مقارنتها")
+        results = map_concurrently(self._analyze_case, benchmarks, max_workers=MAX_CONCURRENT_CALLS)
+
+        analyses: List[CaseAnalysis] = []
+        input_tokens = output_tokens = 0
+        cached_count = 0
+        for benchmark, result in zip(benchmarks, results):
+            if not result.ok:
+                self._log_thinking(f"تعذر تحليل {benchmark.get('name', '')}: {result.error}")
+                continue
+            analysis, from_cache = result.value
+            analyses.append(analysis)
+            if from_cache:
+                cached_count += 1
+            else:
+                input_tokens += analysis.input_tokens
+                output_tokens += analysis.output_tokens
+        self._log_thinking(f"اكتمل تحليل {len(analyses)} تجارب ({cached_count} من الذاكرة المؤقتة) خلال {time.perf_counter() - started:.1f} ثانية")
+
+        if not analyses:
+            raise RuntimeError("تعذر تحليل أي من التجارب المطلوبة")
+
+        analyses_text = "\n\n".join(f"### {a.name}\n{a.content}" for a in analyses)
+        messages = self._build_messages(
+            COMPARISON_PROMPT.format(
+                request=user_message,
+                analyses=analyses_text,
+                metrics=format_metrics_tables(get_metrics_cube(self.knowledge_base), [a.benchmark_id for a in analyses])
+            ), context, conversation_history
+        )
+        self._log_thinking("إعداد المقارنة النهائية...")
+        response = self._call_model(messages)
+        self._log_thinking("اكتمل التحليل المقارن")
+
+        return AgentResponse(
+            content=response.content[0].text,
+            thinking=self._get_thinking_trace(),
+            metadata={
+                "model": self.model,
+                "input_tokens": input_tokens + response.usage.input_tokens,
+                "output_tokens": output_tokens + response.usage.output_tokens,
+                "analysis_type": "benchmarking_comparison",
+                "cases": [a.benchmark_id for a in analyses],
+                "cases_from_cache": cached_count,
+                "elapsed_seconds": round(time.perf_counter() - started, 2)
+            },
+            agent_name=self.name,
+            agent_name_en=self.name_en
+        )
+
     def invoke(
         self,
         user_message: str,
@@ -118,29 +315,34 @@ class BenchmarkingAgent(BaseAgent):
         self._clear_thinking()
         self._log_thinking("تحليل طلب المقارنة المعيارية...")
 
-        case_keywords = {
-            "سانت بطرسبرغ": "St. Petersburg",
-            "بطرسبرغ": "St. Petersburg",
-            "روسيا": "St. Petersburg",
-            "st. petersburg": "St. Petersburg",
-            "petersburg": "St. Petersburg",
-            "روما": "Rome",
-            "إيطاليا": "Rome",
-            "rome": "Rome",
-            "برشلونة": "Barcelona",
-            "إسبانيا": "Barcelona",
-            "barcelona": "Barcelona"
-        }
-
-        specific_case = None
-        message_lower = user_message.lower()
-        for keyword, case in case_keywords.items():
-            if keyword in message_lower:
-                specific_case = case
-                break
-
-        benchmark_context = self._get_benchmark_context(specific_case)
-        self._log_thinking("تم تحميل بيانات المقارنة من قاعدة المعرفة")
+        cases = self._find_cases(user_message)
+        if len(cases) != 1:
+            # No case or several cases named: map-reduce over the relevant cases
+            benchmarks = [self.knowledge_base.get_benchmark_by_name(c) for c in cases] if cases else self.knowledge_base.get_all_benchmarks()
+            benchmarks = [b for b in benchmarks if b]
+            if len(benchmarks) > 1:
+                try:
+                    return self._compare_cases(user_message, benchmarks, context, conversation_history)
+                except Exception as e:
+                    self._log_thinking(f"حدث خطأ: {str(e)}")
+                    return AgentResponse(
+                        content=f"حدث خطأ أثناء التحليل: {str(e)}",
+                        thinking=self._get_thinking_trace(),
+                        metadata={"error": str(e)},
+                        agent_name=self.name,
+                        agent_name_en=self.name_en
+                    )
+
+        specific_case = cases[0] if cases else None
+        if KB_TOOLS_ENABLED:
+            benchmark_context = tool_overview(self.knowledge_base, ("benchmarks",))
+            if specific_case:
+                benchmark_context += f"\n- التجربة المطلوبة: {specific_case}"
+            benchmark_context += f"\n\n{TOOLS_INSTRUCTION}"
+            self._log_thinking("قائمة التجارب المتاحة فقط — الأقسام والمقاييس تُجلب عبر الأدوات حسب الحاجة")
+        else:
+            benchmark_context = self._get_benchmark_context(specific_case)
+            self._log_thinking("تم تحميل بيانات المقارنة من قاعدة المعرفة")
 
         enhanced_message = f"""طلب المستخدم: {user_message}
 
@@ -154,25 +356,17 @@ class BenchmarkingAgent(BaseAgent):
         try:
             self._log_thinking("إعداد التحليل المقارن...")
 
-            response = self.client.messages.create(
-                model=self.model,
-                max_tokens=self.max_tokens,
-                temperature=self.temperature,
-                system=self.get_system_prompt(),
-                messages=messages
-            )
-
-            response_text = response.content[0].text
+            metadata = {"model": self.model, "analysis_type": "benchmarking", "specific_case": specific_case}
+            if KB_TOOLS_ENABLED:
+                loop = self._run_tool_loop(messages, self.kb_tools, KB_TOOL_MAX_ROUNDS)
+                response_text = loop.text
+                metadata.update(input_tokens=loop.input_tokens, output_tokens=loop.output_tokens, **loop.as_metadata())
+            else:
+                response = self._call_model(messages)
+                response_text = response.content[0].text
+                metadata.update(input_tokens=response.usage.input_tokens, output_tokens=response.usage.output_tokens)
             self._log_thinking("اكتمل التحليل المقارن")
 
-            metadata = {
-                "model": self.model,
-                "input_tokens": response.usage.input_tokens,
-                "output_tokens": response.usage.output_tokens,
-                "analysis_type": "benchmarking",
-                "specific_case": specific_case
-            }
-
             return AgentResponse(
                 content=response_text,
                 thinking=self._get_thinking_trace(),
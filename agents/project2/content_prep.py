@@ -4,7 +4,12 @@
 
 from typing import Optional, Dict, List
 from ..base_agent import BaseAgent, AgentResponse
-from config import PRESENTATION_GUIDELINES
+from utils.slides import SLIDE_DECK_TOOL, SLIDE_DECK_TOOL_NAME, SlideDeck, deck_from_response, render_markdown
+from utils.slide_artifacts import DeckBuild, build_deck, revise_slides
+from config import (
+    PRESENTATION_GUIDELINES, SLIDE_DECK_MAX_TOKENS, SLIDE_SECTION_CHARS,
+    SLIDE_SECTION_MAX_TOKENS, MAX_CONCURRENT_CALLS
+)
 
 
 CONTENT_PREP_SYSTEM_PROMPT = f"""أنت وكيل إعداد المحتوى المتخصص في تحويل المحتوى إلى عروض تقديمية مهنية.
@@ -67,32 +72,93 @@ class ContentPrepAgent(BaseAgent):
         num_slides: Optional[int] = None,
         target_audience: str = "القيادة العليا"
     ) -> AgentResponse:
-        """Format content into presentation slides."""
+        """
+        Format content into presentation slides.
+
+        Slides are produced per source section and cached on the section's digest,
+        so converting an edited source only regenerates the sections that changed.
+        """
         self._clear_thinking()
         self._log_thinking("تحليل المحتوى لتحويله إلى شرائح عرض...")
+        self._log_thinking(f"إعداد المحتوى لـ{target_audience}")
 
-        format_request = f"""## محتوى للتحويل إلى عرض تقديمي
-
-**الجمهور المستهدف:** {target_audience}
-"""
-        if num_slides:
-            format_request += f"**عدد الشرائح المستهدف:** {num_slides}\n"
-
-        format_request += f"""
-**المحتوى الأصلي:**
-{content}
+        try:
+            build = build_deck(
+                self._call_model,
+                content,
+                audience=target_audience,
+                model=self.model,
+                section_chars=SLIDE_SECTION_CHARS,
+                max_tokens=SLIDE_SECTION_MAX_TOKENS,
+                max_workers=MAX_CONCURRENT_CALLS,
+                num_slides=num_slides
+            )
+            if not build.deck.slides:
+                raise RuntimeError("تعذر تحويل أي قسم من المحتوى إلى شرائح")
+        except Exception as e:
+            return self._error_response(e)
 
----
+        self._log_thinking(
+            f"{build.sections} أقسام ← {len(build.deck.slides)} شرائح: أعيد توليد {len(build.regenerated)}"
+            f" واستُخدمت {build.reused} من الذاكرة المؤقتة ({build.seconds:.1f} ثانية)"
+        )
+        return self._deck_response(build)
 
-حوّل هذا المحتوى إلى شرائح عرض تقديمي مهنية تشمل:
-١. عناوين تنفيذية (جمل كاملة)
-٢. نقاط مختصرة ومباشرة (٤-٦ لكل شريحة)
-٣. بيانات داعمة حيثما أمكن
-٤. ملاحظات للمقدم"""
+    def revise_slides(self, deck: Dict, targets: List[int], instruction: str) -> AgentResponse:
+        """Regenerate only the slides the user points at; every other slide is kept as is."""
+        self._clear_thinking()
+        self._log_thinking(f"تعديل الشرائح {', '.join(map(str, targets))} فقط — بقية العرض دون تغيير")
 
-        self._log_thinking(f"إعداد المحتوى لـ{target_audience}")
+        try:
+            build = revise_slides(
+                self._call_model,
+                SlideDeck.model_validate(deck),
+                targets,
+                instruction,
+                model=self.model,
+                max_tokens=SLIDE_SECTION_MAX_TOKENS,
+                max_workers=MAX_CONCURRENT_CALLS
+            )
+            if not build.regenerated:
+                raise RuntimeError("تعذر تعديل الشرائح المطلوبة")
+        except Exception as e:
+            return self._error_response(e)
+
+        self._log_thinking(f"عُدّلت {len(build.regenerated)} شرائح خلال {build.seconds:.1f} ثانية")
+        return self._deck_response(build)
+
+    def _deck_response(self, build: DeckBuild) -> AgentResponse:
+        """Markdown rendering of the deck, with the structured deck kept for export and later edits."""
+        if build.failed:
+            self._log_thinking(f"تعذر التحويل: {'، '.join(build.failed)}")
+        return AgentResponse(
+            content=render_markdown(build.deck),
+            thinking=self._get_thinking_trace(),
+            metadata={
+                "model": self.model,
+                "input_tokens": build.input_tokens,
+                "output_tokens": build.output_tokens,
+                "format": "presentation_slides",
+                "slide_count": len(build.deck.slides),
+                "slide_deck": build.deck.model_dump(),
+                "regenerated_slides": build.regenerated,
+                "reused_slides": build.reused,
+                "failed_sections": build.failed,
+                "elapsed_seconds": round(build.seconds, 2)
+            },
+            agent_name=self.name,
+            agent_name_en=self.name_en
+        )
 
-        return self.invoke(format_request)
+    def _error_response(self, error: Exception) -> AgentResponse:
+        self._log_thinking(f"حدث خطأ: {str(error)}")
+        return AgentResponse(
+            content=f"حدث خطأ أثناء تنسيق المحتوى: {str(error)}",
+            thinking=self._get_thinking_trace(),
+            metadata={"error": str(error)},
+            agent_name=self.name,
+            agent_name_en=self.name_en
+        )
 
     def invoke(
         self,
@@ -109,17 +175,14 @@ class ContentPrepAgent(BaseAgent):
         try:
             self._log_thinking("تصميم هيكل الشرائح...")
 
-            response = self.client.messages.create(
-                model=self.model,
-                max_tokens=self.max_tokens,
-                temperature=self.temperature,
-                system=self.get_system_prompt(),
-                messages=messages
+            # The model fills the slide tool; layout and export are rendered locally
+            response = self._call_model(
+                messages,
+                max_tokens=SLIDE_DECK_MAX_TOKENS,
+                tools=[SLIDE_DECK_TOOL],
+                tool_choice={"type": "tool", "name": SLIDE_DECK_TOOL_NAME}
             )
 
-            response_text = response.content[0].text
-            self._log_thinking("اكتمل إعداد محتوى العرض التقديمي")
-
             metadata = {
                 "model": self.model,
                 "input_tokens": response.usage.input_tokens,
@@ -127,6 +190,16 @@ class ContentPrepAgent(BaseAgent):
                 "format": "presentation_slides"
             }
 
+            deck = deck_from_response(response)
+            if deck:
+                response_text = render_markdown(deck)
+                metadata["slide_count"] = len(deck.slides)
+                metadata["slide_deck"] = deck.model_dump()
+                self._log_thinking(f"اكتمل إعداد محتوى العرض التقديمي ({len(deck.slides)} شرائح) — التنسيق محلي")
+            else:
+                response_text = "\n".join(b.text for b in response.content if getattr(b, "type", "") == "text")
+                self._log_thinking("اكتمل إعداد محتوى العرض التقديمي (نص دون هيكل شرائح)")
+
             return AgentResponse(
                 content=response_text,
                 thinking=self._get_thinking_trace(),
@@ -136,11 +209,4 @@ class ContentPrepAgent(BaseAgent):
             )
 
         except Exception as e:
-            self._log_thinking(f"حدث خطأ: {str(e)}")
-            return AgentResponse(
-                content=f"حدث خطأ أثناء تنسيق المحتوى: {str(e)}",
-                thinking=self._get_thinking_trace(),
-                metadata={"error": str(e)},
-                agent_name=self.name,
-                agent_name_en=self.name_en
-            )
+            return self._error_response(e)
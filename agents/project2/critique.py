@@ -4,6 +4,9 @@
 
 from typing import Optional, Dict, List
 from ..base_agent import BaseAgent, AgentResponse
+from utils.style_lint import LintReport, format_lint_report, lint_summary_for_prompt, lint_text
+from utils.text import compile_phrase_pattern, normalize_arabic, tokenize
+from config import CRITIQUE_CHUNK_CHARS
 
 
 CRITIQUE_SYSTEM_PROMPT = """أنت وكيل المراجعة المتخصص في تقييم المخرجات الاستراتيجية.
@@ -41,6 +44,25 @@ CRITIQUE_SYSTEM_PROMPT = """أنت وكيل المراجعة المتخصص في
 - لا تستخدم رموز تعبيرية مطلقاً"""
 
 
+# Requests about form only are answered by the local style check without a model call.
+# Only form nouns count: verbs like "دقق" are as often about the figures as the wording.
+STYLE_ONLY_KEYWORDS = ["الأسلوب", "أسلوب", "الصياغة", "صياغة", "التنسيق", "تنسيق", "style", "formatting", "lint"]
+
+# Besides the form nouns, a style-only request may contain nothing but these;
+# any other word ("والمنطق", "الحجج") sends it to the model review
+STYLE_REQUEST_WORDS = [
+    "راجع", "دقق", "افحص", "صحح", "حسن", "اضبط", "تحقق", "فقط", "لو", "سمحت", "فضلك",
+    "العرض", "النص", "الشرائح", "الشريحة", "التقرير", "الرد", "المسودة",
+    "review", "check", "fix", "improve", "proofread", "only", "just", "deck", "slides", "text", "draft",
+]
+
+_STYLE_ONLY_RE = compile_phrase_pattern(STYLE_ONLY_KEYWORDS)
+_STYLE_REQUEST_TOKENS = frozenset(tokenize(" ".join(STYLE_REQUEST_WORDS)))
+
+LINT_FOCUS_NOTE = ("الأسلوب الشكلي (الرموز التعبيرية، العبارات غير المؤسسية، عدد النقاط، طول الجمل، وجود الأرقام) "
+                   "يُفحص آلياً — لا تعلق عليه، وركّز على الدقة والاكتمال ومنطق التوصيات والملاءمة للسياق المحلي.")
+
+
 class CritiqueAgent(BaseAgent):
     """وكيل المراجعة — متخصص في مراجعة المخرجات وتقديم ملاحظات بناءة"""
 
@@ -59,12 +81,68 @@ class CritiqueAgent(BaseAgent):
         self,
         content_to_review: str,
         source_agent: str = None,
-        original_request: str = None
+        original_request: str = None,
+        allow_style_only: bool = False
     ) -> AgentResponse:
-        """Review content and provide feedback."""
+        """
+        Review content and provide feedback.
+
+        A local style lint runs first; form-only requests end there when the caller
+        allows it (explicit user review follow-ups, never workflow steps). Otherwise the
+        model reviews what the lint cannot judge, in parallel chunks for long content.
+        """
         self._clear_thinking()
-        self._log_thinking("مراجعة المحتوى...")
+        lint = lint_text(content_to_review)
+        self._log_thinking(f"الفحص الآلي للأسلوب: عدد الملاحظات {len(lint.findings)} خلال {lint.seconds * 1000:.1f} ملي ثانية")
+        if allow_style_only and original_request and self._wants_style_only(original_request):
+            return self._lint_response(lint)
+        lint_trace = self._get_thinking_trace()
+
+        if len(content_to_review) > CRITIQUE_CHUNK_CHARS:
+            response = self._review_in_chunks(content_to_review, source_agent, original_request, focus=LINT_FOCUS_NOTE)
+        else:
+            response = self._review_single(content_to_review, source_agent, original_request, lint)
+
+        response.thinking = lint_trace + "\n" + response.thinking
+        if not response.metadata.get("error"):
+            response.content = format_lint_report(lint) + "\n" + response.content
+            response.metadata["style_findings"] = len(lint.findings)
+        return response
+
+    @staticmethod
+    def _wants_style_only(request: str) -> bool:
+        """A request about wording or formatting and nothing else; when unsure, the model reviews."""
+        text = normalize_arabic(request)
+        if not _STYLE_ONLY_RE.search(text):
+            return False
+        remaining = tokenize(_STYLE_ONLY_RE.sub(" ", text), drop_stopwords=True)
+        return all(token in _STYLE_REQUEST_TOKENS for token in remaining)
+
+    def _lint_response(self, lint: LintReport) -> AgentResponse:
+        """Style-only review answered locally in milliseconds."""
+        self._log_thinking("الطلب يخص الأسلوب والتنسيق فقط — الاكتفاء بالفحص الآلي دون استدعاء النموذج")
+        return AgentResponse(
+            content=format_lint_report(lint),
+            thinking=self._get_thinking_trace(),
+            metadata={
+                "analysis_type": "style_lint",
+                "style_findings": len(lint.findings),
+                "by_rule": lint.count_by_rule(),
+                "deck": lint.deck,
+                "elapsed_seconds": round(lint.seconds, 4)
+            },
+            agent_name=self.name,
+            agent_name_en=self.name_en
+        )
 
+    def _review_single(
+        self,
+        content_to_review: str,
+        source_agent: str,
+        original_request: str,
+        lint: LintReport
+    ) -> AgentResponse:
+        """One model call over the whole content, told what the lint already found."""
         review_request = f"""## طلب مراجعة
 
 **المحتوى للمراجعة:**
@@ -76,6 +154,13 @@ class CritiqueAgent(BaseAgent):
         if original_request:
             review_request += f"**الطلب الأصلي:** {original_request}\n"
 
+        review_request += f"""
+**نتائج الفحص الآلي للأسلوب (مرصودة مسبقاً):**
+{lint_summary_for_prompt(lint)}
+
+{LINT_FOCUS_NOTE}
+"""
+
         review_request += """
 ---
 قدم مراجعة شاملة تشمل:
@@ -102,13 +187,7 @@ class CritiqueAgent(BaseAgent):
         try:
             self._log_thinking("تحليل المحتوى...")
 
-            response = self.client.messages.create(
-                model=self.model,
-                max_tokens=self.max_tokens,
-                temperature=self.temperature,
-                system=self.get_system_prompt(),
-                messages=messages
-            )
+            response = self._call_model(messages)
 
             response_text = response.content[0].text
             self._log_thinking("اكتملت المراجعة")
@@ -2,9 +2,12 @@
 وكيل مؤشرات الأداء — احتفالية مرور ٣٠٠ عام على تأسيس الدولة السعودية
 """
 
-from typing import Optional, Dict, List
+from typing import Optional, Dict, List, Tuple
 from ..base_agent import BaseAgent, AgentResponse
-from utils.knowledge_base import KnowledgeBase
+from utils.knowledge_base import get_shared_knowledge_base
+from utils.kpi_ranking import get_kpi_ranker
+from utils.kb_tools import KPI_TOOLS, TOOLS_INSTRUCTION, KBToolExecutor, tool_overview
+from config import KPI_TOP_K, KPI_TOKEN_BUDGET, KB_TOOLS_ENABLED, KB_TOOL_MAX_ROUNDS, KB_TOOL_RESULT_TOKENS
 
 
 KPI_SYSTEM_PROMPT = """أنت وكيل مؤشرات الأداء المتخصص في قياس نجاح الاحتفاليات الوطنية الكبرى.
@@ -49,40 +52,54 @@ class KPIAgent(BaseAgent):
             description="توصية مؤشرات الأداء وتحديد طرق القياس",
             temperature=0.4
         )
-        self.knowledge_base = KnowledgeBase()
+        self.knowledge_base = get_shared_knowledge_base()
+        self._kb_tools: Optional[KBToolExecutor] = None
 
     def get_system_prompt(self) -> str:
         return KPI_SYSTEM_PROMPT
 
-    def _get_kpi_context(self, category: str = None) -> str:
-        """Get KPI data from knowledge base."""
-        if category:
-            kpis = self.knowledge_base.get_kpis_by_category(category)
-        else:
-            kpis = self.knowledge_base.get_all_kpis()
+    @property
+    def kb_tools(self) -> KBToolExecutor:
+        return self._lazy("_kb_tools", lambda: KBToolExecutor(self.knowledge_base, KPI_TOOLS, KB_TOOL_RESULT_TOKENS))
+
+    @staticmethod
+    def _format_kpi(kpi: Dict) -> str:
+        """One KPI as a compact markdown block."""
+        text = f"**{kpi.get('name', 'بدون اسم')}**\n"
+        text += f"- التعريف: {kpi.get('definition', 'غير متاح')}\n"
+        text += f"- طريقة القياس: {kpi.get('measurement_method', 'غير محدد')}\n"
+        text += f"- مصدر البيانات: {kpi.get('data_source', 'غير محدد')}\n"
+        text += f"- الدورية: {kpi.get('frequency', 'غير محدد')}\n"
+        if kpi.get('target_example'):
+            text += f"- مستهدف مقترح: {kpi['target_example']}\n"
+        if kpi.get('benchmark'):
+            text += f"- القيمة المرجعية: {kpi['benchmark']}\n"
+        return text + "\n"
+
+    def _get_kpi_context(self, query: str) -> Tuple[str, List[Dict], bool]:
+        """The library KPIs most relevant to the request, grouped by category, within the token budget."""
+        kpis, matched = get_kpi_ranker(self.knowledge_base).rank(
+            query,
+            top_k=KPI_TOP_K,
+            token_budget=KPI_TOKEN_BUDGET,
+            row_formatter=self._format_kpi
+        )
 
-        context = "## مؤشرات الأداء المتاحة في قاعدة المعرفة:\n\n"
+        if matched:
+            context = f"## مؤشرات الأداء الأكثر صلة بالطلب ({len(kpis)} من مكتبة المؤشرات):\n\n"
+        else:
+            context = f"## عينة من مكتبة المؤشرات تغطي جميع الفئات ({len(kpis)} مؤشر):\n\n"
 
         by_category = {}
         for kpi in kpis:
-            cat = kpi.get('category', 'أخرى')
-            if cat not in by_category:
-                by_category[cat] = []
-            by_category[cat].append(kpi)
+            by_category.setdefault(kpi.get('category_name', 'أخرى'), []).append(kpi)
 
         for cat, cat_kpis in by_category.items():
             context += f"### {cat}\n\n"
             for kpi in cat_kpis:
-                context += f"**{kpi.get('name', 'بدون اسم')}**\n"
-                context += f"- الوصف: {kpi.get('description', 'غير متاح')}\n"
-                context += f"- الوحدة: {kpi.get('unit', 'غير محدد')}\n"
-                context += f"- طريقة القياس: {kpi.get('measurement_method', 'غير محدد')}\n"
-                context += f"- الدورية: {kpi.get('frequency', 'غير محدد')}\n"
-                if kpi.get('benchmark_value'):
-                    context += f"- القيمة المرجعية: {kpi['benchmark_value']}\n"
-                context += "\n"
+                context += self._format_kpi(kpi)
 
-        return context
+        return context, kpis, matched
 
     def invoke(
         self,
@@ -94,33 +111,18 @@ class KPIAgent(BaseAgent):
         self._clear_thinking()
         self._log_thinking("تحليل طلب مؤشرات الأداء...")
 
-        category_keywords = {
-            "اقتصاد": "Economic Impact",
-            "مالي": "Economic Impact",
-            "economic": "Economic Impact",
-            "مجتمع": "Community Engagement",
-            "زوار": "Community Engagement",
-            "community": "Community Engagement",
-            "إعلام": "Media Coverage",
-            "تواصل": "Media Coverage",
-            "media": "Media Coverage",
-            "إرث": "Legacy and Sustainability",
-            "استدامة": "Legacy and Sustainability",
-            "legacy": "Legacy and Sustainability",
-            "تشغيل": "Operational Efficiency",
-            "ميزانية": "Operational Efficiency",
-            "operation": "Operational Efficiency"
-        }
-
-        specific_category = None
-        message_lower = user_message.lower()
-        for keyword, category in category_keywords.items():
-            if keyword in message_lower:
-                specific_category = category
-                break
-
-        kpi_context = self._get_kpi_context(specific_category)
-        self._log_thinking("تم تحميل مؤشرات الأداء من قاعدة المعرفة")
+        metadata = {"model": self.model, "analysis_type": "kpi_recommendation"}
+        if KB_TOOLS_ENABLED:
+            kpi_context = tool_overview(self.knowledge_base, ("kpis",)) + f"\n\n{TOOLS_INSTRUCTION}"
+            self._log_thinking("فئات المكتبة فقط — المؤشرات تُجلب عبر أدوات البحث حسب الطلب")
+        else:
+            kpi_context, kpis, matched = self._get_kpi_context(user_message)
+            categories = list(dict.fromkeys(kpi.get('category_name', '') for kpi in kpis))
+            if matched:
+                self._log_thinking(f"تم اختيار {len(kpis)} مؤشر من {len(categories)} فئة حسب صلتها بالطلب")
+            else:
+                self._log_thinking("لم يحدد الطلب مجالاً بعينه — عرض عينة من جميع الفئات")
+            metadata.update(categories=categories, kpis_considered=len(kpis), kpis_matched=matched)
 
         enhanced_message = f"""طلب المستخدم: {user_message}
 
@@ -134,25 +136,16 @@ class KPIAgent(BaseAgent):
         try:
             self._log_thinking("إعداد توصيات مؤشرات الأداء...")
 
-            response = self.client.messages.create(
-                model=self.model,
-                max_tokens=self.max_tokens,
-                temperature=self.temperature,
-                system=self.get_system_prompt(),
-                messages=messages
-            )
-
-            response_text = response.content[0].text
+            if KB_TOOLS_ENABLED:
+                loop = self._run_tool_loop(messages, self.kb_tools, KB_TOOL_MAX_ROUNDS)
+                response_text = loop.text
+                metadata.update(input_tokens=loop.input_tokens, output_tokens=loop.output_tokens, **loop.as_metadata())
+            else:
+                response = self._call_model(messages)
+                response_text = response.content[0].text
+                metadata.update(input_tokens=response.usage.input_tokens, output_tokens=response.usage.output_tokens)
             self._log_thinking("اكتملت توصيات مؤشرات الأداء")
 
-            metadata = {
-                "model": self.model,
-                "input_tokens": response.usage.input_tokens,
-                "output_tokens": response.usage.output_tokens,
-                "analysis_type": "kpi_recommendation",
-                "category": specific_category
-            }
-
             return AgentResponse(
                 content=response_text,
                 thinking=self._get_thinking_trace(),
@@ -2,9 +2,25 @@
 وكيل التخطيط الاستراتيجي — احتفالية مرور ٣٠٠ عام على تأسيس الدولة السعودية
 """
 
-from typing import Optional, Dict, List, Tuple
+from typing import Any, Optional, Dict, List, Tuple
 from ..base_agent import BaseAgent, AgentResponse
-from config import INTENT_KEYWORDS
+from config import INTENT_KEYWORDS, INTENT_DESCRIPTIONS, INTENT_CONFIDENCE_THRESHOLD, ROUTER_MODEL, ROUTER_MAX_TOKENS, MAX_CONCURRENT_CALLS
+from utils.intent_matcher import get_intent_matcher
+from utils.intent_router import IntentRouter, RoutingDecision, ask_model_for_intent, routing_cache_stats
+from utils.text import compile_phrase_pattern, normalize_arabic
+from utils.workflow import Workflow, WorkflowRun, WorkflowStep
+from utils.slide_artifacts import parse_slide_targets
+
+
+# Intents routed by the strategic planning agent
+STRATEGIC_INTENTS = ("benchmarking", "kpi", "critique", "slide")
+
+# Requests for the full leadership deliverable (benchmarking + KPIs -> critique -> slides)
+DELIVERABLE_KEYWORDS = [
+    "عرض متكامل", "حزمة متكاملة", "مخرج متكامل", "ملف متكامل", "عرض للقيادة", "عرض القيادة",
+    "leadership deck", "full deck", "deliverable", "end-to-end",
+]
+_DELIVERABLE_RE = compile_phrase_pattern(DELIVERABLE_KEYWORDS)
 
 
 STRATEGIC_PLANNING_SYSTEM_PROMPT = """أنت وكيل التخطيط الاستراتيجي في نظام احتفالية مرور ٣٠٠ عام على تأسيس الدولة السعودية.
@@ -40,7 +56,8 @@ STRATEGIC_PLANNING_SYSTEM_PROMPT = """أنت وكيل التخطيط الاست
 - طلبات المقارنة والدراسات والتجارب الدولية -> وكيل المقارنة المعيارية
 - طلبات المؤشرات والقياس والأداء -> وكيل مؤشرات الأداء
 - طلبات المراجعة والنقد والتقييم -> وكيل المراجعة
-- طلبات العروض التقديمية والشرائح -> وكيل إعداد المحتوى"""
+- طلبات العروض التقديمية والشرائح -> وكيل إعداد المحتوى
+- طلبات المخرج المتكامل للقيادة -> سير عمل كامل (المقارنة والمؤشرات بالتوازي، ثم المراجعة، ثم الشرائح)"""
 
 
 class StrategicPlanningAgent(BaseAgent):
@@ -58,65 +75,52 @@ class StrategicPlanningAgent(BaseAgent):
         self._kpi_agent = None
         self._critique_agent = None
         self._content_prep_agent = None
-
-        self._last_response: Optional[AgentResponse] = None
-        self._last_agent: Optional[str] = None
+        self._router = IntentRouter(
+            STRATEGIC_INTENTS, INTENT_KEYWORDS, INTENT_CONFIDENCE_THRESHOLD,
+            fallback=self._route_with_model, resolve_agent=self._agent_name_for_intent
+        )
 
     @property
     def benchmarking_agent(self):
-        if self._benchmarking_agent is None:
-            from .benchmarking import BenchmarkingAgent
-            self._benchmarking_agent = BenchmarkingAgent()
-        return self._benchmarking_agent
+        from .benchmarking import BenchmarkingAgent
+        return self._lazy("_benchmarking_agent", BenchmarkingAgent)
 
     @property
     def kpi_agent(self):
-        if self._kpi_agent is None:
-            from .kpi import KPIAgent
-            self._kpi_agent = KPIAgent()
-        return self._kpi_agent
+        from .kpi import KPIAgent
+        return self._lazy("_kpi_agent", KPIAgent)
 
     @property
     def critique_agent(self):
-        if self._critique_agent is None:
-            from .critique import CritiqueAgent
-            self._critique_agent = CritiqueAgent()
-        return self._critique_agent
+        from .critique import CritiqueAgent
+        return self._lazy("_critique_agent", CritiqueAgent)
 
     @property
     def content_prep_agent(self):
-        if self._content_prep_agent is None:
-            from .content_prep import ContentPrepAgent
-            self._content_prep_agent = ContentPrepAgent()
-        return self._content_prep_agent
+        from .content_prep import ContentPrepAgent
+        return self._lazy("_content_prep_agent", ContentPrepAgent)
 
     def get_system_prompt(self) -> str:
         return STRATEGIC_PLANNING_SYSTEM_PROMPT
 
-    def _classify_intent(self, message: str) -> Tuple[str, float]:
-        """Classify user intent based on keywords."""
-        message_lower = message.lower()
-
-        intent_keywords = {
-            "benchmarking": ["مقارنة", "معايير", "دراسة حالة", "تجارب دولية", "أفضل الممارسات", "مقارن", "benchmark", "تحليل مقارن", "سانت بطرسبرغ", "روما", "برشلونة", "تجارب عالمية"],
-            "kpi": ["مؤشرات", "قياس", "أداء", "KPI", "تقييم", "مؤشر", "قياسات", "متابعة", "رصد", "مقاييس"],
-            "critique": ["مراجعة", "نقد", "تحسين", "تقييم", "تحليل نقدي", "راجع", "قيم", "حلل", "ملاحظات", "تعليقات"],
-            "slide": ["عرض", "شريحة", "تقديم", "عرض تقديمي", "شرائح", "بوربوينت", "تلخيص", "للعرض", "slide", "presentation", "convert", "format", "powerpoint"]
-        }
-
-        scores = {}
-        for intent, keywords in intent_keywords.items():
-            score = sum(1 for kw in keywords if kw in message_lower)
-            if score > 0:
-                scores[intent] = score
+    def _route_with_model(self, message: str, labels: List[str]) -> Optional[str]:
+        """Cheap routing call used only when the local classifier is unsure."""
+        return ask_model_for_intent(
+            self._call_model, message, labels, INTENT_DESCRIPTIONS, ROUTER_MODEL, ROUTER_MAX_TOKENS
+        )
 
-        if not scores:
-            return ("general", 0.5)
+    def _agent_name_for_intent(self, intent: str) -> str:
+        agent = self._get_agent_for_intent(intent)
+        return agent.name if agent else ""
 
-        best_intent = max(scores, key=scores.get)
-        confidence = min(scores[best_intent] / 3, 1.0)
+    def _route(self, message: str) -> RoutingDecision:
+        """Routing decision (cached per request text and follow-up state), model fallback below the threshold."""
+        return self._router.route(message, state=self.session.last_agent or "")
 
-        return (best_intent, confidence)
+    def _classify_intent(self, message: str) -> Tuple[str, float]:
+        """Classify user intent (intent, confidence)."""
+        decision = self._route(message)
+        return (decision.intent, decision.confidence)
 
     def _get_agent_for_intent(self, intent: str) -> Optional[BaseAgent]:
         """Get the appropriate agent for an intent."""
@@ -130,13 +134,128 @@ class StrategicPlanningAgent(BaseAgent):
 
     def _should_use_critique(self, message: str) -> bool:
         """Check if the message is asking to review previous content."""
-        review_keywords = ["مراجعة", "راجع", "نقد", "تقييم", "review", "critique"]
-        return any(kw in message.lower() for kw in review_keywords) and self._last_response is not None
+        review_keywords = ["مراجعة", "راجع", "نقد", "تقييم", "دقق", "تدقيق", "review", "critique"]
+        return any(kw in message.lower() for kw in review_keywords) and self.session.last_response is not None
 
     def _should_format_slides(self, message: str) -> bool:
         """Check if the message is asking to format for slides."""
         slide_keywords = ["عرض تقديمي", "شرائح", "شريحة", "حوّل", "slide", "presentation"]
-        return any(kw in message.lower() for kw in slide_keywords) and self._last_response is not None
+        return any(kw in message.lower() for kw in slide_keywords) and self.session.last_response is not None
+
+    def _slide_edit_targets(self, message: str) -> List[int]:
+        """Slide numbers the message points at in the latest deck (empty if it names none)."""
+        if not self.session.last_deck:
+            return []
+        return parse_slide_targets(message, len(self.session.last_deck.get("slides", [])))
+
+    @staticmethod
+    def _wants_deliverable(message: str) -> bool:
+        """Whether the request asks for the whole deck workflow rather than a single agent."""
+        return bool(_DELIVERABLE_RE.search(normalize_arabic(message)))
+
+    @staticmethod
+    def _step_output(response: AgentResponse) -> AgentResponse:
+        """Agents report failures in metadata; raise so the node is neither cached nor piped downstream."""
+        if response.metadata.get("error"):
+            raise RuntimeError(response.metadata["error"])
+        return response
+
+    def _build_deliverable_workflow(self, context: Optional[Dict]) -> Workflow:
+        """Benchmarking and KPIs in parallel, then critique of both, then slides from all three."""
+
+        def research(inputs: Dict[str, Any], upstream: Dict[str, Any]) -> AgentResponse:
+            return self._step_output(self.benchmarking_agent.invoke(inputs["request"], context))
+
+        def kpis(inputs: Dict[str, Any], upstream: Dict[str, Any]) -> AgentResponse:
+            return self._step_output(self.kpi_agent.invoke(inputs["request"], context))
+
+        def critique(inputs: Dict[str, Any], upstream: Dict[str, Any]) -> AgentResponse:
+            combined = f"{upstream['benchmarking'].content}\n\n---\n\n{upstream['kpi'].content}"
+            return self._step_output(self.critique_agent.review(
+                content_to_review=combined,
+                source_agent=f"{self.benchmarking_agent.name}، {self.kpi_agent.name}",
+                original_request=inputs["request"]
+            ))
+
+        def slides(inputs: Dict[str, Any], upstream: Dict[str, Any]) -> AgentResponse:
+            content = (
+                f"{upstream['benchmarking'].content}\n\n---\n\n{upstream['kpi'].content}"
+                f"\n\n---\n\n## ملاحظات المراجعة (يجب أخذها في الاعتبار)\n{upstream['critique'].content}"
+            )
+            return self._step_output(self.content_prep_agent.format_for_slides(content=content))
+
+        return Workflow("leadership_deck", [
+            WorkflowStep("benchmarking", research, inputs=["request", "context", "benchmarks_version"], label=self.benchmarking_agent.name),
+            WorkflowStep("kpi", kpis, inputs=["request", "context", "kpis_version"], label=self.kpi_agent.name),
+            WorkflowStep("critique", critique, depends_on=["benchmarking", "kpi"], inputs=["request"], label=self.critique_agent.name),
+            WorkflowStep("slides", slides, depends_on=["benchmarking", "kpi", "critique"], label=self.content_prep_agent.name),
+        ])
+
+    def _run_deliverable(self, user_message: str, context: Optional[Dict]) -> AgentResponse:
+        """Produce the leadership deck in one turn through the workflow graph."""
+        self._log_thinking("طلب مخرج متكامل — تشغيل سير العمل: المقارنة والمؤشرات بالتوازي ← المراجعة ← الشرائح")
+        workflow = self._build_deliverable_workflow(context)
+        inputs = {
+            "request": user_message,
+            "context": {k: v for k, v in (context or {}).items() if not k.startswith("_")},
+            "benchmarks_version": self.benchmarking_agent.knowledge_base.benchmarks_version,
+            "kpis_version": self.kpi_agent.knowledge_base.kpis_version,
+        }
+        run: WorkflowRun = workflow.run(inputs, max_workers=MAX_CONCURRENT_CALLS)
+
+        input_tokens = output_tokens = 0
+        for sid in run.order:
+            result = run.results[sid]
+            if result.from_cache:
+                self._log_thinking(f"{result.label}: من الذاكرة المؤقتة (المدخلات لم تتغير)")
+            elif result.ok:
+                self._log_thinking(f"{result.label}: {result.seconds:.1f} ثانية")
+                input_tokens += result.output.metadata.get("input_tokens", 0)
+                output_tokens += result.output.metadata.get("output_tokens", 0)
+            else:
+                self._log_thinking(f"{result.label}: تعذر التنفيذ ({result.error})")
+        self._log_thinking(f"اكتمل سير العمل خلال {run.elapsed:.1f} ثانية — أعيد حساب {len(run.recomputed)} من {len(run.order)} خطوات")
+
+        sections = []
+        for sid, title in (("slides", "العرض التقديمي"), ("critique", "ملاحظات المراجعة"),
+                           ("benchmarking", "المقارنة المعيارية"), ("kpi", "مؤشرات الأداء")):
+            output = run.output(sid)
+            if output is not None:
+                sections.append(f"## {title}\n\n{output.content}")
+        if not sections:
+            sections.append("تعذر إعداد المخرج المتكامل. يرجى المحاولة مرة أخرى.")
+
+        thinking = self._get_thinking_trace()
+        for sid in run.order:
+            output = run.output(sid)
+            if output is not None and output.thinking and not run.results[sid].from_cache:
+                thinking += f"\n\n**{output.agent_name}:**\n{output.thinking}"
+
+        final = run.output("slides")
+        response = AgentResponse(
+            content="\n\n".join(sections),
+            thinking=thinking,
+            metadata={
+                "type": "workflow",
+                "workflow": run.name,
+                "steps": {
+                    sid: {"seconds": round(r.seconds, 2), "from_cache": r.from_cache, "error": r.error}
+                    for sid, r in run.results.items()
+                },
+                "recomputed": run.recomputed,
+                "elapsed_seconds": round(run.elapsed, 2),
+                "input_tokens": input_tokens,
+                "output_tokens": output_tokens
+            },
+            agent_name=final.agent_name if final else self.name,
+            agent_name_en=final.agent_name_en if final else self.name_en
+        )
+        if final is not None and final.metadata.get("slide_deck"):
+            response.metadata["slide_deck"] = final.metadata["slide_deck"]
+            self.session.last_deck = final.metadata["slide_deck"]
+        self.session.last_response = response
+        self.session.last_agent = response.agent_name
+        return response
 
     def invoke(
         self,
@@ -148,37 +267,60 @@ class StrategicPlanningAgent(BaseAgent):
         self._clear_thinking()
         self._log_thinking("تحليل الطلب الاستراتيجي...")
 
+        if self._wants_deliverable(user_message):
+            return self._run_deliverable(user_message, context)
+
         # Check for critique request
         if self._should_use_critique(user_message):
             self._log_thinking("الطلب يتعلق بمراجعة محتوى سابق")
             self._log_thinking(f"توجيه إلى: {self.critique_agent.name}")
 
             response = self.critique_agent.review(
-                content_to_review=self._last_response.content,
-                source_agent=self._last_agent,
-                original_request=user_message
+                content_to_review=self.session.last_response.content,
+                source_agent=self.session.last_agent,
+                original_request=user_message,
+                allow_style_only=True
             )
 
             combined_thinking = self._get_thinking_trace() + "\n\n" + response.thinking
             response.thinking = combined_thinking
             return response
 
+        # Check for an edit to specific slides of the latest deck
+        slide_targets = self._slide_edit_targets(user_message)
+        if slide_targets:
+            self._log_thinking(f"الطلب يخص شرائح محددة من العرض الأخير: {', '.join(map(str, slide_targets))}")
+            self._log_thinking(f"توجيه إلى: {self.content_prep_agent.name}")
+
+            response = self.content_prep_agent.revise_slides(self.session.last_deck, slide_targets, user_message)
+            if response.metadata.get("slide_deck"):
+                self.session.last_deck = response.metadata["slide_deck"]
+
+            combined_thinking = self._get_thinking_trace() + "\n\n" + response.thinking
+            response.thinking = combined_thinking
+            return response
+
         # Check for slide formatting
         if self._should_format_slides(user_message):
             self._log_thinking("الطلب يتعلق بتنسيق المحتوى للعرض التقديمي")
             self._log_thinking(f"توجيه إلى: {self.content_prep_agent.name}")
 
             response = self.content_prep_agent.format_for_slides(
-                content=self._last_response.content
+                content=self.session.last_response.content
             )
+            if response.metadata.get("slide_deck"):
+                self.session.last_deck = response.metadata["slide_deck"]
 
             combined_thinking = self._get_thinking_trace() + "\n\n" + response.thinking
             response.thinking = combined_thinking
             return response
 
         # Classify intent
-        intent, confidence = self._classify_intent(user_message)
-        self._log_thinking(f"تصنيف الطلب: {intent} (ثقة: {confidence:.0%})")
+        decision = self._route(user_message)
+        intent = decision.intent
+        self._log_thinking(f"تصنيف الطلب: {intent} (ثقة: {decision.confidence:.0%}، المصدر: {decision.source})")
+        if decision.cached:
+            self._log_thinking(f"قرار التوجيه من الذاكرة المؤقتة (نسبة الإصابة {routing_cache_stats()['hit_rate']:.0%})")
 
         # Get appropriate agent
         agent = self._get_agent_for_intent(intent)
@@ -187,8 +329,8 @@ class StrategicPlanningAgent(BaseAgent):
             self._log_thinking(f"توجيه إلى: {agent.name}")
             response = agent.invoke(user_message, context, conversation_history)
 
-            self._last_response = response
-            self._last_agent = agent.name
+            self.session.last_response = response
+            self.session.last_agent = agent.name
 
             combined_thinking = self._get_thinking_trace() + "\n\n" + response.thinking
             response.thinking = combined_thinking
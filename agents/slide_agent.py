@@ -8,6 +8,8 @@ This agent specializes in formatting content for presentations.
 from typing import Optional, Dict, List
 from .base_agent import BaseAgent, AgentResponse
 from prompts.slide_prompt import SLIDE_SYSTEM_PROMPT
+from utils.slides import SLIDE_DECK_TOOL, SLIDE_DECK_TOOL_NAME, deck_from_response, render_markdown
+from config import SLIDE_DECK_MAX_TOKENS
 
 
 class SlideAgent(BaseAgent):
@@ -66,6 +68,8 @@ class SlideAgent(BaseAgent):
 2. نقاط موجزة ومباشرة
 3. بيانات داعمة حيث أمكن
 4. ملاحظات للمقدم
+
+سجّل الشرائح عبر أداة build_slide_deck فقط دون أي تنسيق — التخطيط والتصدير يتمّان آلياً.
 """
 
         self._log_thinking(f"إعداد محتوى لـ {target_audience}")
@@ -98,17 +102,14 @@ class SlideAgent(BaseAgent):
         try:
             self._log_thinking("جارٍ تصميم هيكل الشرائح...")
 
-            response = self.client.messages.create(
-                model=self.model,
-                max_tokens=self.max_tokens,
-                temperature=self.temperature,
-                system=self.get_system_prompt(),
-                messages=messages
+            # The model fills the slide tool; layout and export are rendered locally
+            response = self._call_model(
+                messages,
+                max_tokens=SLIDE_DECK_MAX_TOKENS,
+                tools=[SLIDE_DECK_TOOL],
+                tool_choice={"type": "tool", "name": SLIDE_DECK_TOOL_NAME}
             )
 
-            response_text = response.content[0].text
-            self._log_thinking("تم إعداد محتوى العرض التقديمي بنجاح")
-
             metadata = {
                 "model": self.model,
                 "input_tokens": response.usage.input_tokens,
@@ -117,6 +118,15 @@ class SlideAgent(BaseAgent):
                 "format": "presentation_slides"
             }
 
+            deck = deck_from_response(response)
+            if deck:
+                response_text = render_markdown(deck)
+                metadata["slide_count"] = len(deck.slides)
+                metadata["slide_deck"] = deck.model_dump()
+            else:
+                response_text = "\n".join(b.text for b in response.content if getattr(b, "type", "") == "text")
+            self._log_thinking("تم إعداد محتوى العرض التقديمي بنجاح")
+
             return AgentResponse(
                 content=response_text,
                 thinking=self._get_thinking_trace(),
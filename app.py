@@ -528,6 +528,10 @@ def main():
     # Initialize session state
     initialize_session_state()
 
+    # Start warming the shared agents while the user logs in (once per process)
+    from views.workspace import get_warm_pool
+    get_warm_pool()
+
     # Page routing
     if not st.session_state.authenticated:
         st.markdown(HIDE_SIDEBAR_CSS, unsafe_allow_html=True)
@@ -17,6 +17,86 @@ MAX_TOKENS = 4096
 DEFAULT_TEMPERATURE = 0.7
 ANALYTICAL_TEMPERATURE = 0.3
 
+# Intent Routing Configuration
+ROUTER_MODEL = "claude-haiku-4-5"
+ROUTER_MAX_TOKENS = 16
+INTENT_CONFIDENCE_THRESHOLD = 0.55
+ROUTING_CACHE_SIZE = 512  # Routing decisions kept across sessions (quick actions and pasted requests repeat verbatim)
+
+# Short intent descriptions shown to the routing model
+INTENT_DESCRIPTIONS = {
+    "data_analysis": "تحليل بيانات الفعاليات وإحصائياتها وتوزيعها وجدولها الزمني",
+    "followup": "تحديد البيانات الناقصة وصياغة رسائل المتابعة للجهات",
+    "reporting": "إعداد التقارير والملخصات التنفيذية للجنة",
+    "quality_check": "فحص جودة البيانات واكتمالها وصحتها",
+    "benchmarking": "دراسة تجارب الاحتفاليات الدولية والمقارنة المعيارية",
+    "kpi": "اقتراح مؤشرات الأداء وأطر القياس",
+    "critique": "مراجعة المحتوى ونقده وتقييمه",
+    "slide": "تحويل المحتوى إلى شرائح عرض تقديمي",
+    "general": "تحية أو سؤال عام عن النظام لا يحتاج وكيلاً متخصصاً",
+}
+
+# Retrieval Configuration
+RETRIEVAL_TOP_K = 25
+RETRIEVAL_TOKEN_BUDGET = 2500
+RETRIEVER_CACHE_SIZE = 4  # Retrieval indexes kept, one per knowledge-base version
+STATS_CACHE_SIZE = 4  # Event statistics kept, one per knowledge-base version
+TIMELINE_CACHE_SIZE = 4  # Timeline analyses kept, one per knowledge-base version
+ENGINE_CACHE_SIZE = 4  # Quality rule engines kept, one per knowledge-base version
+STATS_PLANNER_CACHE_SIZE = 4  # Statistics query planners kept, one per knowledge-base version
+
+# KPI Ranking Configuration
+KPI_TOP_K = 8
+KPI_TOKEN_BUDGET = 1500
+KPI_RANKER_CACHE_SIZE = 4  # KPI library versions kept in the ranker cache
+
+# Concurrency Configuration
+MAX_CONCURRENT_CALLS = 8
+WORKFLOW_CACHE_SIZE = 64  # Workflow node outputs kept across runs
+
+# Follow-up Letters Configuration
+FOLLOWUP_MAX_LETTERS = 40
+FOLLOWUP_LETTER_MAX_TOKENS = 600
+FOLLOWUP_DEADLINE_DAYS = 7
+
+# Compound Request Configuration
+COMPOUND_MAX_AGENTS = 3
+SYNTHESIS_MAX_TOKENS = 700
+SYNTHESIS_INPUT_CHARS = 3000
+
+# Benchmark Comparison Configuration
+BENCHMARK_CASE_MAX_TOKENS = 800
+BENCHMARK_CASE_CACHE_SIZE = 32
+CUBE_CACHE_SIZE = 4  # Benchmark data versions kept in the metrics cube cache
+
+# Chunked Critique Configuration
+CRITIQUE_CHUNK_CHARS = 6000
+CRITIQUE_CHUNK_MAX_TOKENS = 700
+CRITIQUE_MAX_FINDINGS = 10
+REVIEW_CACHE_SIZE = 256  # Chunk reviews kept across requests; a re-review after editing one section reuses the rest
+
+# Committee Report Configuration
+REPORT_SECTION_MAX_TOKENS = 900
+REPORT_SECTION_CACHE_SIZE = 64
+
+# Knowledge Base Tools Configuration
+# When enabled, agents start from a short data overview and fetch details through tools
+KB_TOOLS_ENABLED = True
+KB_TOOL_MAX_ROUNDS = 5
+KB_TOOL_RESULT_TOKENS = 1500  # Longer tool results are truncated before they reach the model
+TOOL_CACHE_SIZE = 512  # Tool results shared across agents and sessions, keyed on the knowledge-base version
+
+# Slide Deck Configuration
+SLIDE_DECK_MAX_TOKENS = 3000
+SLIDE_SECTION_CHARS = 2500
+SLIDE_SECTION_MAX_TOKENS = 900
+SLIDE_CACHE_SIZE = 256  # Slides per source section kept across requests; an edited source reuses every unchanged section
+
+# Background Request Configuration
+JOB_WORKERS = 4  # Requests running at once across all sessions
+JOB_QUEUE_PER_SESSION = 3  # Unfinished requests one session may queue
+JOB_POLL_SECONDS = 1.0
+
 # UI Theme Colors
 THEME = {
     "primary": "#1a365d",
@@ -249,11 +329,11 @@ INTENT_KEYWORDS = {
     "followup": [
         "متابعة", "رسالة", "بريد", "تواصل", "ناقص",
         "مطلوب", "استكمال", "إرسال", "missing", "follow-up",
-        "follow up", "email", "gap"
+        "follow up", "email"
     ],
     "reporting": [
         "تقرير", "ملخص", "لجنة", "اجتماع", "تنفيذي",
-        "report", "committee", "executive", "briefing", "summary"
+        "report", "committee", "executive", "briefing", "summary", "prepare"
     ],
     "slide": [
         "عرض", "شريحة", "تقديم", "ملخص", "عرض تقديمي",
@@ -262,6 +342,6 @@ INTENT_KEYWORDS = {
     ],
     "quality_check": [
         "جودة", "فحص", "تحقق", "اكتمال", "صحة",
-        "quality", "check", "validate", "verify", "complete", "accuracy"
+        "quality", "check", "validate", "verify", "complete", "incomplete", "accuracy"
     ]
 }
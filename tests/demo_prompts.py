@@ -31,6 +31,7 @@ PROJECT1_PROMPTS = {
 
 Note: The committee meeting is on September 1st, and we need all data complete by then.""",
             "expected_agents": ["Coordination (Agent)", "Data Analysis (Agent)", "Quality Assurance (Agent)"],
+            "intent": "data_analysis",
             "expected_output_contains": ["total events", "distribution", "missing", "incomplete"]
         },
         {
@@ -46,6 +47,7 @@ The emails should:
 - Reference the September 1st committee deadline
 - Request response within 2 weeks""",
             "expected_agents": ["Coordination (Agent)", "Follow-up & Communication (Agent)"],
+            "intent": "followup",
             "expected_output_contains": ["Dear", "missing information", "September", "deadline"]
         },
         {
@@ -72,6 +74,7 @@ The emails should:
 
 Format this as a professional briefing document suitable for senior leadership.""",
             "expected_agents": ["Coordination (Agent)", "Reporting (Agent)", "Quality Assurance (Agent)"],
+            "intent": "reporting",
             "expected_output_contains": ["Executive Summary", "Status", "Risks", "Recommendations"]
         }
     ]
@@ -115,6 +118,7 @@ PROJECT2_PROMPTS = {
 
 Start with the St. Petersburg 300th Anniversary (2003) as the primary case study. This was a significant city anniversary that combined heritage celebration with urban regeneration and international diplomatic positioning.""",
             "expected_agents": ["Strategic Planning (Agent)"],
+            "intent": "benchmarking",
             "expected_output_contains": ["research brief", "Benchmarking", "dimensions", "St. Petersburg"]
         },
         {
@@ -123,6 +127,7 @@ Start with the St. Petersburg 300th Anniversary (2003) as the primary case study
             "description": "Benchmarking Agent receives brief and acknowledges",
             "prompt": "[SYSTEM: This is the handoff to Benchmarking Agent after orchestrator creates research brief]",
             "expected_agents": ["Benchmarking (Agent)"],
+            "intent": "benchmarking",
             "expected_output_contains": ["received", "research", "St. Petersburg", "analysis"],
             "note": "At this point in the live demo, presenter explains: 'The agent is now conducting deep research. I've pre-run this to save time. Let me show you the results...'"
         },
@@ -188,6 +193,7 @@ Required: 3-4 slides covering:
 2. Programming model and geographic reach/activation intensity
 3. Lessons learned for our national celebration""",
             "expected_agents": ["Strategic Planning (Agent)", "Content Preparation (Agent)"],
+            "intent": "slide",
             "expected_output_contains": ["Slide 1", "Slide 2", "Slide 3", "action title", "lessons"]
         },
         {
@@ -203,12 +209,40 @@ Required: 3-4 slides covering:
 
 Evaluate against consulting presentation standards: action titles, single message per slide, supporting evidence, strategic relevance.""",
             "expected_agents": ["Critique & Review (Agent)"],
+            "intent": "critique",
             "expected_output_contains": ["Strengths", "Improvement", "Recommendations", "Assessment"]
         }
     ]
 }
 
 
+# =============================================================================
+# LOCAL STATISTICS LOOKUPS
+# =============================================================================
+# Project 1 requests the coordinator should answer from the knowledge base
+# without a model call ("local"), and look-alikes carrying a constraint the
+# local planner cannot apply, which must go to the model ("model").
+
+STATS_QUERY_CASES = {
+    "local": [
+        "كم عدد الفعاليات في الرياض؟",
+        "توزيع الفعاليات حسب التصنيف",
+        "اعرض فعاليات جدة في مارس",
+        "كم فعالية من الفئة الأولى في العلا 2025",
+        "كم عدد الفعاليات حسب الجهة المسؤولة",
+        "How many events are in Jeddah?",
+        "list marquee events in Riyadh",
+    ],
+    "model": [
+        "كم نسبة الاكتمال في الرياض؟",
+        "عدد الفعاليات التي لم تحدد لها ميزانية",
+        "show me the timeline",
+        "list the top organizations",
+        "اعرض الفعاليات المتعارضة في الرياض",
+    ],
+}
+
+
 # =============================================================================
 # ALL PROMPTS COLLECTION
 # =============================================================================
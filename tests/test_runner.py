@@ -9,6 +9,8 @@ Usage:
     python tests/test_runner.py --project project2
     python tests/test_runner.py --all
     python tests/test_runner.py --project project2 --step P2_STEP3
+    python tests/test_runner.py --check-stats
+    python tests/test_runner.py --check-routing
 """
 
 import os
@@ -25,7 +27,7 @@ sys.path.insert(0, str(Path(__file__).parent.parent))
 from dotenv import load_dotenv
 load_dotenv()
 
-from tests.demo_prompts import ALL_DEMO_PROMPTS, get_project_prompts
+from tests.demo_prompts import ALL_DEMO_PROMPTS, STATS_QUERY_CASES, get_project_prompts
 
 # Configuration
 MODEL = "claude-sonnet-4-20250514"
@@ -50,6 +52,10 @@ class DemoTestRunner:
         self.orchestrator = None
         self._initialize_orchestrator()
 
+        # Follow-up state carried from one step to the next, as in one chat session
+        from agents import SessionState
+        self.session = SessionState()
+
     def _initialize_orchestrator(self):
         """Initialize the appropriate orchestrator for the project."""
         if self.project_key == "project1":
@@ -91,7 +97,9 @@ class DemoTestRunner:
 
         # Execute through orchestrator
         try:
-            response = self.orchestrator.invoke(step_config["prompt"])
+            from agents import execution_context
+            with execution_context(self.session):
+                response = self.orchestrator.invoke(step_config["prompt"])
 
             # Build agent chain from response
             agent_chain_entry = {
@@ -237,6 +245,42 @@ class DemoTestRunner:
         return "\n".join(lines)
 
 
+def check_stats_queries() -> bool:
+    """Check which requests the local statistics planner answers; no API calls."""
+    from utils.knowledge_base import get_shared_knowledge_base
+    from utils.stats_query import get_stats_planner
+
+    planner = get_stats_planner(get_shared_knowledge_base())
+    ok = True
+    for expected, prompts in STATS_QUERY_CASES.items():
+        for prompt in prompts:
+            actual = "local" if planner.plan(prompt) is not None else "model"
+            status = "OK  " if actual == expected else "FAIL"
+            ok = ok and actual == expected
+            print(f"[{status}] expected {expected:5} got {actual:5} | {prompt}")
+    return ok
+
+
+def check_routing() -> bool:
+    """Check each demo prompt's routed intent against its label and print its dispatch plan."""
+    from agents import execution_context
+    from agents.project1 import CoordinatorAgent
+    from agents.project2 import StrategicPlanningAgent
+
+    orchestrators = {"project1": CoordinatorAgent(), "project2": StrategicPlanningAgent()}
+    ok = True
+    for project_key, project in ALL_DEMO_PROMPTS.items():
+        orchestrator = orchestrators[project_key]
+        for step in project["steps"]:
+            with execution_context():
+                decision = orchestrator._route(step["prompt"])
+            plan = orchestrator._plan_dispatch(step["prompt"], decision.intent) if hasattr(orchestrator, "_plan_dispatch") else [decision.intent]
+            status = "OK  " if decision.intent == step["intent"] else "FAIL"
+            ok = ok and decision.intent == step["intent"]
+            print(f"[{status}] {step['step_id']}: expected {step['intent']} got {decision.intent} ({decision.confidence:.2f}) | plan {plan}")
+    return ok
+
+
 def main():
     parser = argparse.ArgumentParser(description="Run demo tests for MS Portfolio AI")
     parser.add_argument(
@@ -262,8 +306,25 @@ def main():
         help="Don't save summary to text file"
     )
 
+    parser.add_argument(
+        "--check-stats",
+        action="store_true",
+        help="Only check which requests the local statistics planner answers"
+    )
+
+    parser.add_argument(
+        "--check-routing",
+        action="store_true",
+        help="Only check the routed intent and dispatch plan of every demo prompt"
+    )
+
     args = parser.parse_args()
 
+    if args.check_stats:
+        sys.exit(0 if check_stats_queries() else 1)
+    if args.check_routing:
+        sys.exit(0 if check_routing() else 1)
+
     # Determine projects to test
     if args.project == "all":
         projects_to_test = ["project1", "project2"]
@@ -4,5 +4,14 @@ Utilities for MS Portfolio AI Agent Demo
 """
 
 from .knowledge_base import KnowledgeBase
+from .event_retrieval import EventRetriever, extract_query_entities
+from .event_analytics import EventStats, get_event_stats
+from .stats_query import StatsQueryPlanner, get_stats_planner
+from .quality_rules import QualityRuleEngine, QUALITY_RULES, get_rule_engine
+from .timeline import TimelineReport, get_timeline
+from .event_diff import EventDiff, format_diff
+from .kpi_ranking import KPIRanker, get_kpi_ranker
 
-__all__ = ["KnowledgeBase"]
+__all__ = ["KnowledgeBase", "EventRetriever", "extract_query_entities", "EventStats", "get_event_stats",
+           "StatsQueryPlanner", "get_stats_planner", "QualityRuleEngine", "QUALITY_RULES", "get_rule_engine",
+           "TimelineReport", "get_timeline", "EventDiff", "format_diff", "KPIRanker", "get_kpi_ranker"]
@@ -0,0 +1,214 @@
+"""
+مكعب مؤشرات التجارب الدولية — قيم رقمية موحدة ونسب وترتيب محسوبة محلياً
+"""
+
+import re
+from typing import Dict, List, Optional, Tuple
+from pydantic import BaseModel, Field
+
+from config import CUBE_CACHE_SIZE
+from .cache import LRUCache
+from .text import normalize_arabic
+
+
+# Scale words (normalized) -> multiplier
+SCALE_WORDS = {
+    "الف": 1e3, "الاف": 1e3, "thousand": 1e3, "k": 1e3,
+    "مليون": 1e6, "ملايين": 1e6, "million": 1e6, "m": 1e6,
+    "مليار": 1e9, "مليارات": 1e9, "billion": 1e9, "bn": 1e9, "b": 1e9,
+}
+
+# Currency words (normalized) -> ISO code
+CURRENCY_WORDS = {
+    "دولار": "USD", "usd": "USD", "$": "USD",
+    "يورو": "EUR", "eur": "EUR", "€": "EUR",
+    "ريال": "SAR", "sar": "SAR",
+    "روبل": "RUB", "rub": "RUB",
+}
+
+# Fixed conversion to USD; approximate, only used to put cases on one scale
+USD_RATES = {"USD": 1.0, "EUR": 1.08, "SAR": 0.2667, "RUB": 0.011}
+
+# key_metrics fields: label and kind (count, currency or percent)
+METRIC_DEFINITIONS = {
+    "total_events": ("إجمالي الفعاليات", "count"),
+    "marquee_events": ("الفعاليات الكبرى", "count"),
+    "international_guests": ("الضيوف الدوليون", "count"),
+    "heads_of_state": ("رؤساء الدول", "count"),
+    "media_coverage_countries": ("دول التغطية الإعلامية", "count"),
+    "total_visitors": ("إجمالي الزوار", "count"),
+    "economic_impact_usd": ("الأثر الاقتصادي (دولار)", "currency"),
+    "tourism_increase_percent": ("نمو السياحة", "percent"),
+    "infrastructure_investment_usd": ("الاستثمار في البنية التحتية (دولار)", "currency"),
+    "jobs_created": ("الوظائف المستحدثة", "count"),
+}
+
+# Derived ratios: key -> (label, numerator, denominator, kind)
+DERIVED_METRICS = {
+    "impact_per_visitor": ("الأثر الاقتصادي لكل زائر (دولار)", "economic_impact_usd", "total_visitors", "currency"),
+    "impact_per_event": ("الأثر الاقتصادي لكل فعالية (دولار)", "economic_impact_usd", "total_events", "currency"),
+    "impact_to_investment": ("الأثر الاقتصادي مقابل كل دولار بنية تحتية", "economic_impact_usd", "infrastructure_investment_usd", "ratio"),
+    "visitors_per_day": ("الزوار يومياً", "total_visitors", "duration_days", "count"),
+    "visitors_per_event": ("الزوار لكل فعالية", "total_visitors", "total_events", "count"),
+    "international_share": ("نسبة الضيوف الدوليين من الزوار", "international_guests", "total_visitors", "share"),
+    "marquee_share": ("نسبة الفعاليات الكبرى", "marquee_events", "total_events", "share"),
+    "jobs_per_million_usd": ("وظائف لكل مليون دولار أثر", "jobs_created", "economic_impact_usd", "per_million"),
+}
+
+_NUMBER_RE = re.compile(r"-?\d+(?:[.,]\d+)*")
+
+
+def _parse_number(raw: str) -> Optional[float]:
+    """Number with thousands/decimal separators in either convention ("1,500,000", "1.500.000", "1.234,56")."""
+    if "," in raw and "." in raw:
+        # The later separator is the decimal point
+        thousands = "." if raw.rfind(",") > raw.rfind(".") else ","
+        raw = raw.replace(thousands, "").replace(",", ".")
+    elif "," in raw:
+        # "1,500,000" groups thousands; a lone comma is a decimal separator
+        raw = raw.replace(",", "") if raw.count(",") > 1 or re.search(r",\d{3}\b", raw) else raw.replace(",", ".")
+    elif raw.count(".") > 1:
+        raw = raw.replace(".", "")
+    try:
+        return float(raw)
+    except ValueError:
+        return None
+
+
+def parse_metric_value(value) -> Tuple[Optional[float], Optional[str]]:
+    """Parse "2.5 مليار دولار", "5.2 مليون", "40%" or a number into (value, currency)."""
+    if value is None or isinstance(value, bool):
+        return None, None
+    if isinstance(value, (int, float)):
+        return float(value), None
+
+    text = normalize_arabic(str(value))
+    match = _NUMBER_RE.search(text)
+    if not match:
+        return None, None
+    number = _parse_number(match.group(0))
+    if number is None:
+        return None, None
+
+    tokens = re.findall(r"[^\W\d_]+|[$€]", text[match.end():])
+    currency = None
+    for token in tokens:
+        if token in SCALE_WORDS:
+            number *= SCALE_WORDS[token]
+        elif token in CURRENCY_WORDS:
+            currency = CURRENCY_WORDS[token]
+    if currency is None and ("$" in text or "€" in text):
+        currency = "USD" if "$" in text else "EUR"
+    return number, currency
+
+
+def format_number(value: Optional[float], kind: str = "count") -> str:
+    """Compact Arabic rendering of a normalized value."""
+    if value is None:
+        return "—"
+    if kind in ("percent", "share"):
+        return f"{value:.1f}%"
+    if kind == "ratio":
+        return f"{value:.2f}"
+    for scale, word in ((1e9, "مليار"), (1e6, "مليون")):
+        if abs(value) >= scale:
+            return f"{value / scale:.2f}".rstrip("0").rstrip(".") + f" {word}"
+    if abs(value) >= 100 or float(value).is_integer():
+        return f"{value:,.0f}"
+    return f"{value:.1f}"
+
+
+class BenchmarkMetricsCube(BaseModel):
+    """Benchmark × metric matrix of normalized values (currency in USD) plus derived ratios."""
+    version: str = ""
+    cases: Dict[str, str] = Field(default_factory=dict, description="Benchmark id -> display name")
+    values: Dict[str, Dict[str, Optional[float]]] = Field(default_factory=dict, description="Metric -> id -> value")
+    derived: Dict[str, Dict[str, Optional[float]]] = Field(default_factory=dict)
+    unparsed: List[str] = Field(default_factory=list, description="id.metric entries that could not be parsed")
+
+    def ranks(self, metric: str, case_ids: Optional[List[str]] = None) -> Dict[str, int]:
+        """Dense rank per case for a raw or derived metric (1 = highest), optionally among some cases."""
+        column = self.values.get(metric) or self.derived.get(metric) or {}
+        if case_ids is not None:
+            column = {cid: v for cid, v in column.items() if cid in case_ids}
+        ordered = sorted({v for v in column.values() if v is not None}, reverse=True)
+        return {cid: ordered.index(v) + 1 for cid, v in column.items() if v is not None}
+
+
+def build_metrics_cube(benchmarks: List[Dict], version: str = "") -> BenchmarkMetricsCube:
+    """Parse key_metrics of every case into the cube and compute the derived ratios."""
+    cube = BenchmarkMetricsCube(version=version)
+    for benchmark in benchmarks:
+        cid = benchmark.get("id", "")
+        cube.cases[cid] = benchmark.get("name", cid)
+        metrics = dict(benchmark.get("key_metrics", {}))
+        metrics["duration_days"] = benchmark.get("duration_days")
+
+        for metric, raw in metrics.items():
+            number, currency = parse_metric_value(raw)
+            if number is None:
+                if raw not in (None, ""):
+                    cube.unparsed.append(f"{cid}.{metric}")
+            elif METRIC_DEFINITIONS.get(metric, ("", ""))[1] == "currency":
+                number *= USD_RATES.get(currency or "USD", 1.0)
+            cube.values.setdefault(metric, {})[cid] = number
+
+    for key, (_, numerator, denominator, kind) in DERIVED_METRICS.items():
+        column = {}
+        for cid in cube.cases:
+            top = cube.values.get(numerator, {}).get(cid)
+            bottom = cube.values.get(denominator, {}).get(cid)
+            if top is None or not bottom:
+                column[cid] = None
+                continue
+            ratio = top / bottom
+            if kind == "share":
+                ratio *= 100
+            elif kind == "per_million":
+                ratio *= 1e6
+            column[cid] = ratio
+        cube.derived[key] = column
+    return cube
+
+
+def format_metrics_tables(cube: BenchmarkMetricsCube, case_ids: Optional[List[str]] = None) -> str:
+    """Markdown tables of normalized metrics and derived ratios, each value with its rank."""
+    ids = [cid for cid in (case_ids or list(cube.cases)) if cid in cube.cases]
+    if not ids:
+        return ""
+    header = "| المؤشر | " + " | ".join(cube.cases[cid] for cid in ids) + " |\n"
+    divider = "|" + "---|" * (len(ids) + 1) + "\n"
+
+    def rows(definitions: Dict, column_source: Dict) -> str:
+        text = ""
+        for metric, definition in definitions.items():
+            label, kind = definition[0], definition[-1]
+            column = column_source.get(metric, {})
+            if not any(column.get(cid) is not None for cid in ids):
+                continue
+            ranks = cube.ranks(metric, ids) if len(ids) > 1 else {}
+            cells = []
+            for cid in ids:
+                cell = format_number(column.get(cid), kind)
+                if cid in ranks and column.get(cid) is not None:
+                    cell += f" (#{ranks[cid]})"
+                cells.append(cell)
+            text += f"| {label} | " + " | ".join(cells) + " |\n"
+        return text
+
+    text = "**المؤشرات الموحدة** (العملات بالدولار، والترتيب بين قوسين):\n\n" + header + divider
+    text += rows(METRIC_DEFINITIONS, cube.values)
+    text += "\n**نسب محسوبة:**\n\n" + header + divider
+    text += rows(DERIVED_METRICS, cube.derived)
+    return text
+
+
+_cube_cache = LRUCache(CUBE_CACHE_SIZE)
+
+
+def get_metrics_cube(knowledge_base) -> BenchmarkMetricsCube:
+    """Return the metrics cube for a knowledge base, built once per benchmarks version."""
+    return _cube_cache.get_or_compute(
+        knowledge_base.benchmarks_version,
+        lambda: build_metrics_cube(knowledge_base.get_all_benchmarks(), knowledge_base.benchmarks_version)
+    )
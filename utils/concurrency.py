@@ -0,0 +1,48 @@
+"""
+تشغيل المهام المتزامنة بحد أقصى للتوازي — يُستخدم لتوزيع استدعاءات النموذج
+"""
+
+import contextvars
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Iterable, List, Optional
+from pydantic import BaseModel
+
+
+class TaskResult(BaseModel):
+    """Outcome of one concurrent task; exactly one of value/error is meaningful."""
+    value: Any = None
+    error: Optional[str] = None
+    seconds: float = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+def _timed(func: Callable, item: Any) -> TaskResult:
+    start = time.perf_counter()
+    try:
+        return TaskResult(value=func(item), seconds=time.perf_counter() - start)
+    except Exception as e:
+        return TaskResult(error=str(e), seconds=time.perf_counter() - start)
+
+
+def map_concurrently(func: Callable[[Any], Any], items: Iterable, max_workers: int) -> List[TaskResult]:
+    """
+    Apply func to every item on a bounded thread pool.
+
+    Results keep the input order. A failing item yields a TaskResult with the
+    error instead of cancelling the others. Each task runs in a copy of the
+    caller's context, so context variables (the request's execution context)
+    carry over to the worker threads.
+    """
+    items = list(items)
+    if not items:
+        return []
+    if len(items) == 1 or max_workers <= 1:
+        return [_timed(func, item) for item in items]
+
+    contexts = [contextvars.copy_context() for _ in items]
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(items))) as pool:
+        return list(pool.map(lambda context, item: context.run(_timed, func, item), contexts, items))
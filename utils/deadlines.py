@@ -0,0 +1,103 @@
+"""
+استخراج المواعيد من طلب المستخدم — تاريخ صريح ومهلة رد بالأيام
+"""
+
+import re
+from datetime import date, timedelta
+from typing import Optional
+from pydantic import BaseModel, Field
+
+from .event_retrieval import MONTH_ALIASES
+from .stats_query import MONTH_NAMES
+from .text import normalize_arabic
+
+
+# Window units in days (normalized forms)
+WINDOW_UNITS = {
+    "day": 1, "days": 1, "يوم": 1, "ايام": 1,
+    "week": 7, "weeks": 7, "اسبوع": 7, "اسابيع": 7,
+    "month": 30, "months": 30, "شهر": 30, "اشهر": 30,
+}
+
+# Windows written as a single word or phrase (Arabic dual forms, "a week")
+WINDOW_WORDS = {
+    "يومين": 2, "اسبوع": 7, "اسبوعين": 14, "شهر": 30, "شهرين": 60,
+    "a day": 1, "a week": 7, "one week": 7, "two weeks": 14, "a month": 30, "one month": 30,
+}
+
+# A window only counts after one of these, so "3 months of data" is not a deadline
+_WINDOW_LEAD = r"(?:within|in the next|خلال|في غضون|غضون)\s+"
+
+_MONTHS = {normalize_arabic(alias): month for month, aliases in MONTH_ALIASES.items() for alias in aliases}
+_MONTH_ALT = "|".join(sorted((re.escape(a) for a in _MONTHS), key=len, reverse=True))
+_ORDINAL = r"(?:st|nd|rd|th)?"
+
+_ISO_RE = re.compile(r"\b(20\d\d)-(\d{1,2})-(\d{1,2})\b")
+_DMY_RE = re.compile(r"\b(\d{1,2})/(\d{1,2})/(20\d\d)\b")
+_MONTH_DAY_RE = re.compile(rf"(?<!\w)({_MONTH_ALT})\s+(\d{{1,2}}){_ORDINAL}(?:,?\s*(20\d\d))?(?!\w)")
+_DAY_MONTH_RE = re.compile(rf"(?<!\w)(\d{{1,2}}){_ORDINAL}\s+(?:of\s+|من\s+)?(?:شهر\s+)?(?:ب|ل|و)?({_MONTH_ALT})(?:\s+(20\d\d))?(?!\w)")
+_WINDOW_NUMBER_RE = re.compile(rf"{_WINDOW_LEAD}(\d{{1,3}})\s*({'|'.join(WINDOW_UNITS)})(?!\w)")
+_WINDOW_WORD_RE = re.compile(rf"{_WINDOW_LEAD}({'|'.join(sorted(WINDOW_WORDS, key=len, reverse=True))})(?!\w)")
+
+
+class RequestDeadline(BaseModel):
+    """Dates a request sets: an explicit calendar date and/or a response window."""
+    explicit_date: Optional[date] = Field(default=None, description="First explicit date in the request, e.g. a committee deadline")
+    window_days: Optional[int] = Field(default=None, description="Response window, e.g. 14 for 'within 2 weeks'")
+
+    def response_due(self, today: date, default_days: int) -> date:
+        """When a reply is due: the window if given (never after the explicit date), else the date, else the default."""
+        if self.window_days:
+            due = today + timedelta(days=self.window_days)
+            return min(due, self.explicit_date) if self.explicit_date else due
+        if self.explicit_date:
+            return self.explicit_date
+        return today + timedelta(days=default_days)
+
+    @property
+    def found(self) -> bool:
+        return self.explicit_date is not None or self.window_days is not None
+
+
+def _make_date(year: Optional[str], month: int, day: int, today: date) -> Optional[date]:
+    """A concrete date; without a year, the next occurrence on or after today."""
+    try:
+        if year:
+            return date(int(year), month, day)
+        candidate = date(today.year, month, day)
+        return candidate if candidate >= today else date(today.year + 1, month, day)
+    except ValueError:
+        return None
+
+
+def extract_deadline(message: str, today: Optional[date] = None) -> RequestDeadline:
+    """Explicit date and response window mentioned in a request; past dates are ignored."""
+    today = today or date.today()
+    text = normalize_arabic(message)
+
+    found = []
+    for match in _ISO_RE.finditer(text):
+        found.append((match.start(), _make_date(match.group(1), int(match.group(2)), int(match.group(3)), today)))
+    for match in _DMY_RE.finditer(text):
+        found.append((match.start(), _make_date(match.group(3), int(match.group(2)), int(match.group(1)), today)))
+    for match in _MONTH_DAY_RE.finditer(text):
+        found.append((match.start(), _make_date(match.group(3), _MONTHS[match.group(1)], int(match.group(2)), today)))
+    for match in _DAY_MONTH_RE.finditer(text):
+        found.append((match.start(), _make_date(match.group(3), _MONTHS[match.group(2)], int(match.group(1)), today)))
+    dates = [d for _, d in sorted(found, key=lambda item: item[0]) if d and d >= today]
+
+    window = None
+    number = _WINDOW_NUMBER_RE.search(text)
+    if number:
+        window = int(number.group(1)) * WINDOW_UNITS[number.group(2)]
+    else:
+        word = _WINDOW_WORD_RE.search(text)
+        if word:
+            window = WINDOW_WORDS[word.group(1)]
+
+    return RequestDeadline(explicit_date=dates[0] if dates else None, window_days=window or None)
+
+
+def format_date_ar(value: date) -> str:
+    """Arabic long date, e.g. "1 سبتمبر 2026"."""
+    return f"{value.day} {MONTH_NAMES[value.month]} {value.year}"
@@ -0,0 +1,184 @@
+"""
+محرك التحليلات المشترك لبيانات الفعاليات — لجنة الفعاليات
+"""
+
+import heapq
+from typing import Dict, List, Tuple
+from pydantic import BaseModel, Field
+
+from config import STATS_CACHE_SIZE
+from .cache import LRUCache
+
+
+UNSPECIFIED = "غير محدد"
+
+FIELD_LABELS = {
+    "name": "اسم الفعالية",
+    "responsible_org": "الجهة المسؤولة",
+    "description": "وصف الفعالية",
+    "start_date": "تاريخ البداية",
+    "end_date": "تاريخ النهاية",
+    "duration_days": "عدد الأيام",
+    "tier": "التصنيف",
+    "type": "النوع",
+    "city": "المدينة",
+    "subcategory": "الفئة الفرعية",
+    "funding": "التمويل",
+    "communication": "التواصل",
+    "inclusion_status": "حالة التضمين",
+}
+
+# Single definition of a complete event shared by all Project 1 agents
+REQUIRED_FIELDS = ["name", "responsible_org", "description", "start_date", "end_date", "tier", "type", "city"]
+OPTIONAL_FIELDS = ["duration_days", "subcategory", "funding", "communication"]
+
+# Share of required + optional fields an event must fill to count as well documented
+WELL_FILLED_THRESHOLD = 0.9
+
+
+class CityCompleteness(BaseModel):
+    """Completeness counters for one city."""
+    total: int = 0
+    complete: int = Field(default=0, description="Events with every required field filled")
+    well_filled: int = Field(default=0, description="Events above WELL_FILLED_THRESHOLD of all fields")
+    gaps: int = Field(default=0, description="Events missing at least one required field")
+
+    @property
+    def completion_rate(self) -> int:
+        return self.complete * 100 // self.total if self.total > 0 else 0
+
+    @property
+    def well_filled_rate(self) -> int:
+        return self.well_filled * 100 // self.total if self.total > 0 else 0
+
+
+class EventGap(BaseModel):
+    """An event missing one or more required fields."""
+    name: str
+    city: str
+    responsible_org: str
+    inclusion_status: str
+    missing_fields: List[str]
+
+    @property
+    def missing_labels(self) -> List[str]:
+        return [FIELD_LABELS.get(f, f) for f in self.missing_fields]
+
+
+class EventStats(BaseModel):
+    """All event aggregates computed in one pass over a KB version."""
+    version: str = ""
+    total: int = 0
+    complete: int = 0
+    by_city: Dict[str, int] = Field(default_factory=dict)
+    by_type: Dict[str, int] = Field(default_factory=dict)
+    by_tier: Dict[str, int] = Field(default_factory=dict)
+    by_org: Dict[str, int] = Field(default_factory=dict)
+    by_inclusion: Dict[str, int] = Field(default_factory=dict)
+    city_tier: Dict[str, Dict[str, int]] = Field(default_factory=dict)
+    city_type: Dict[str, Dict[str, int]] = Field(default_factory=dict)
+    city_inclusion: Dict[str, Dict[str, int]] = Field(default_factory=dict)
+    city_org: Dict[str, Dict[str, int]] = Field(default_factory=dict)
+    completeness: Dict[str, CityCompleteness] = Field(default_factory=dict)
+    gaps: List[EventGap] = Field(default_factory=list)
+
+    @property
+    def completion_rate(self) -> int:
+        return self.complete * 100 // self.total if self.total > 0 else 0
+
+    @property
+    def well_filled(self) -> int:
+        return sum(c.well_filled for c in self.completeness.values())
+
+    @staticmethod
+    def top(counts: Dict[str, int], n: int, skip_unspecified: bool = False) -> List[Tuple[str, int]]:
+        """Top-n (key, count) pairs by count using a heap instead of a full sort."""
+        items = counts.items()
+        if skip_unspecified:
+            items = [(k, v) for k, v in items if k and k != UNSPECIFIED]
+        return heapq.nlargest(n, items, key=lambda item: item[1])
+
+    def top_orgs(self, n: int, city: str = None) -> List[Tuple[str, int]]:
+        """Top-n responsible organizations, globally or within a city."""
+        counts = self.city_org.get(city, {}) if city else self.by_org
+        return self.top(counts, n, skip_unspecified=True)
+
+    def cities_by_size(self) -> List[str]:
+        """Cities ordered by event count, largest first."""
+        return [city for city, _ in self.top(self.by_city, len(self.by_city))]
+
+    def gaps_by_city(self) -> Dict[str, List[EventGap]]:
+        """Gaps grouped by city; every known city is present, possibly with an empty list."""
+        grouped: Dict[str, List[EventGap]] = {city: [] for city in self.by_city}
+        for gap in self.gaps:
+            grouped.setdefault(gap.city, []).append(gap)
+        return grouped
+
+    def gaps_by_org(self) -> Dict[str, List[EventGap]]:
+        """Gaps grouped by responsible organization."""
+        grouped: Dict[str, List[EventGap]] = {}
+        for gap in self.gaps:
+            grouped.setdefault(gap.responsible_org, []).append(gap)
+        return grouped
+
+
+def _bump(counter: Dict[str, int], key: str):
+    counter[key] = counter.get(key, 0) + 1
+
+
+def compute_event_stats(events: List[Dict], version: str = "") -> EventStats:
+    """Compute every Project 1 aggregate in a single pass over the events."""
+    stats = EventStats(version=version, total=len(events))
+    all_fields = len(REQUIRED_FIELDS) + len(OPTIONAL_FIELDS)
+
+    for event in events:
+        city = event.get("city", "") or UNSPECIFIED
+        event_type = event.get("type", "") or UNSPECIFIED
+        tier = event.get("tier", "") or UNSPECIFIED
+        org = event.get("responsible_org", "") or UNSPECIFIED
+        inclusion = event.get("inclusion_status", "") or UNSPECIFIED
+
+        _bump(stats.by_city, city)
+        _bump(stats.by_type, event_type)
+        _bump(stats.by_tier, tier)
+        _bump(stats.by_org, org)
+        _bump(stats.by_inclusion, inclusion)
+        _bump(stats.city_tier.setdefault(city, {}), tier)
+        _bump(stats.city_type.setdefault(city, {}), event_type)
+        _bump(stats.city_inclusion.setdefault(city, {}), inclusion)
+        _bump(stats.city_org.setdefault(city, {}), org)
+
+        missing_required = [f for f in REQUIRED_FIELDS if not event.get(f)]
+        missing_optional = sum(1 for f in OPTIONAL_FIELDS if not event.get(f))
+        filled_share = (all_fields - len(missing_required) - missing_optional) / all_fields
+
+        city_stats = stats.completeness.setdefault(city, CityCompleteness())
+        city_stats.total += 1
+        if filled_share >= WELL_FILLED_THRESHOLD:
+            city_stats.well_filled += 1
+
+        if missing_required:
+            city_stats.gaps += 1
+            stats.gaps.append(EventGap(
+                name=event.get("name", "") or "بدون اسم",
+                city=city,
+                responsible_org=org,
+                inclusion_status=inclusion,
+                missing_fields=missing_required,
+            ))
+        else:
+            city_stats.complete += 1
+            stats.complete += 1
+
+    return stats
+
+
+_stats_cache = LRUCache(STATS_CACHE_SIZE)
+
+
+def get_event_stats(knowledge_base) -> EventStats:
+    """Return the aggregates for a knowledge base, computed once per data version."""
+    return _stats_cache.get_or_compute(
+        knowledge_base.version,
+        lambda: compute_event_stats(knowledge_base.get_all_events(), knowledge_base.version)
+    )
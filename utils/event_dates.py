@@ -0,0 +1,31 @@
+"""
+تحليل تواريخ الفعاليات لنظام المحفظة الذكي
+"""
+
+from datetime import date, datetime
+from functools import lru_cache
+from typing import Optional
+
+
+# Formats observed in the city calendars, most common first
+DATE_FORMATS = (
+    "%A, %B %d, %Y",
+    "%d/%m/%Y",
+    "%Y-%m-%d",
+    "%B %d, %Y",
+    "%d-%m-%Y",
+)
+
+
+@lru_cache(maxsize=4096)
+def parse_event_date(value: str) -> Optional[date]:
+    """Parse a calendar date string, returning None when it is not a concrete date."""
+    value = (value or "").strip()
+    if not value:
+        return None
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, fmt).date()
+        except ValueError:
+            continue
+    return None
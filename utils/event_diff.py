@@ -0,0 +1,181 @@
+"""
+مقارنة نسخ بيانات الفعاليات — الإضافات والحذف والتعديلات بين لقطتين
+"""
+
+import hashlib
+import json
+from datetime import date
+from typing import Dict, List
+from pydantic import BaseModel, Field
+
+from .event_analytics import FIELD_LABELS
+from .event_dates import parse_event_date
+from .text import normalize_arabic
+
+
+def event_key_base(event: Dict) -> str:
+    """City + normalized name; the part of the key that survives edits to any other field."""
+    name = " ".join(normalize_arabic(event.get("name", "")).split())
+    return f"{event.get('city', '')}|{name}"
+
+
+def assign_event_keys(events: List[Dict]) -> List[str]:
+    """
+    Stable keys for a list of events, aligned with the input order.
+
+    Events sharing city and name (yearly editions) get an ordinal suffix by
+    start date, so each edition keeps its key when other fields change.
+    """
+    bases = [event_key_base(e) for e in events]
+    groups: Dict[str, List[int]] = {}
+    for idx, base in enumerate(bases):
+        groups.setdefault(base, []).append(idx)
+
+    keys = list(bases)
+    for base, indices in groups.items():
+        if len(indices) < 2:
+            continue
+        indices.sort(key=lambda i: (parse_event_date(events[i].get("start_date", "")) or date.max, i))
+        for ordinal, idx in enumerate(indices, 1):
+            keys[idx] = f"{base}#{ordinal}"
+    return keys
+
+
+def row_hash(event: Dict) -> str:
+    """Content hash of one event row."""
+    payload = json.dumps(event, ensure_ascii=False, sort_keys=True).encode("utf-8")
+    return hashlib.sha1(payload).hexdigest()[:16]
+
+
+def index_events(events: List[Dict]) -> Dict[str, Dict]:
+    """Key -> {"hash", "event"} mapping used both for snapshots and for diffing."""
+    return {
+        key: {"hash": row_hash(event), "event": event}
+        for key, event in zip(assign_event_keys(events), events)
+    }
+
+
+class FieldChange(BaseModel):
+    """Old and new value of one field."""
+    field: str
+    label: str
+    old: str
+    new: str
+
+
+class EventChange(BaseModel):
+    """An event present in both versions with different content."""
+    key: str
+    name: str
+    city: str
+    changes: List[FieldChange] = Field(default_factory=list)
+
+
+class EventDiff(BaseModel):
+    """Differences between two dataset versions."""
+    base_version: str = ""
+    base_label: str = ""
+    base_created_at: str = ""
+    current_version: str = ""
+    added: List[Dict] = Field(default_factory=list)
+    removed: List[Dict] = Field(default_factory=list)
+    modified: List[EventChange] = Field(default_factory=list)
+    unchanged: int = 0
+
+    @property
+    def is_empty(self) -> bool:
+        return not (self.added or self.removed or self.modified)
+
+    def changed_cities(self) -> List[str]:
+        """Cities with at least one added, removed or modified event."""
+        cities = {e.get("city", "") for e in self.added} | {e.get("city", "") for e in self.removed}
+        cities |= {c.city for c in self.modified}
+        return sorted(cities)
+
+    def counts_by_city(self) -> Dict[str, Dict[str, int]]:
+        counts: Dict[str, Dict[str, int]] = {}
+        for kind, cities in (
+            ("added", [e.get("city", "") for e in self.added]),
+            ("removed", [e.get("city", "") for e in self.removed]),
+            ("modified", [c.city for c in self.modified]),
+        ):
+            for city in cities:
+                bucket = counts.setdefault(city, {"added": 0, "removed": 0, "modified": 0})
+                bucket[kind] += 1
+        return counts
+
+
+def diff_indexes(base: Dict[str, Dict], current: Dict[str, Dict]) -> EventDiff:
+    """Compare two key -> {hash, event} indexes; field-level diffs only for rows whose hash changed."""
+    diff = EventDiff()
+    for key, entry in current.items():
+        old = base.get(key)
+        if old is None:
+            diff.added.append(entry["event"])
+        elif old["hash"] == entry["hash"]:
+            diff.unchanged += 1
+        else:
+            old_event, new_event = old["event"], entry["event"]
+            changes = [
+                FieldChange(
+                    field=field,
+                    label=FIELD_LABELS.get(field, field),
+                    old=old_event.get(field, ""),
+                    new=new_event.get(field, ""),
+                )
+                for field in sorted(set(old_event) | set(new_event))
+                if old_event.get(field, "") != new_event.get(field, "")
+            ]
+            diff.modified.append(EventChange(
+                key=key,
+                name=new_event.get("name", ""),
+                city=new_event.get("city", ""),
+                changes=changes,
+            ))
+
+    for key, entry in base.items():
+        if key not in current:
+            diff.removed.append(entry["event"])
+    return diff
+
+
+def _short(value: str, length: int = 60) -> str:
+    value = value or "—"
+    return value if len(value) <= length else value[:length] + "…"
+
+
+def format_diff(diff: EventDiff, limit: int = 10) -> str:
+    """Compact Arabic markdown of a diff for agent prompts."""
+    if not diff.base_version:
+        return "لا توجد نسخة سابقة محفوظة للمقارنة.\n"
+
+    header = f"مقارنة بالنسخة المحفوظة في {diff.base_created_at[:10]}"
+    if diff.base_label:
+        header += f" ({diff.base_label})"
+    if diff.is_empty:
+        return f"{header}: لا توجد تغييرات.\n"
+
+    text = f"{header}: أضيفت {len(diff.added)}، وحذفت {len(diff.removed)}، وعُدلت {len(diff.modified)}، ودون تغيير {diff.unchanged}.\n"
+
+    text += "\n| المدينة | مضافة | محذوفة | معدلة |\n|---------|-------|--------|-------|\n"
+    for city, counts in sorted(diff.counts_by_city().items()):
+        text += f"| {city} | {counts['added']} | {counts['removed']} | {counts['modified']} |\n"
+
+    for title, events in (("فعاليات مضافة", diff.added), ("فعاليات محذوفة", diff.removed)):
+        if events:
+            text += f"\n**{title}:**\n"
+            for event in events[:limit]:
+                text += f"- {event.get('name', '')} ({event.get('city', '')}, {event.get('tier', '')}, {event.get('start_date', '')})\n"
+            if len(events) > limit:
+                text += f"*و{len(events) - limit} أخرى.*\n"
+
+    if diff.modified:
+        text += "\n**فعاليات معدلة:**\n"
+        for change in diff.modified[:limit]:
+            fields = "؛ ".join(f"{c.label}: {_short(c.old)} ← {_short(c.new)}" for c in change.changes[:4])
+            text += f"- {change.name} ({change.city}): {fields}\n"
+        if len(diff.modified) > limit:
+            text += f"*و{len(diff.modified) - limit} أخرى.*\n"
+
+    return text
+
@@ -0,0 +1,308 @@
+"""
+استرجاع الفعاليات ذات الصلة بطلب المستخدم لنظام المحفظة الذكي
+"""
+
+import math
+import re
+from collections import Counter
+from typing import Dict, List, Optional, Set, Tuple
+
+from config import RETRIEVER_CACHE_SIZE
+from .cache import LRUCache
+from .event_dates import parse_event_date
+from .text import normalize_arabic, tokenize, estimate_tokens
+
+
+# Query aliases (normalized form is computed at import) for each canonical value
+CITY_ALIASES = {
+    "الرياض": ["الرياض", "رياض", "riyadh"],
+    "جدة": ["جدة", "جده", "jeddah", "jiddah", "jedda"],
+    "العلا": ["العلا", "alula", "al ula", "al-ula"],
+    "عسير": ["عسير", "أبها", "ابها", "asir", "aseer", "abha"],
+    "حاضرة الدمام": ["حاضرة الدمام", "الدمام", "دمام", "dammam"],
+}
+
+TIER_ALIASES = {
+    "Marquee": ["marquee", "ماركي", "الفعاليات الكبرى"],
+    "Tier 1": ["tier 1", "tier1", "tier one", "الفئة الأولى", "المستوى الأول", "الفئة 1"],
+    "Tier 2": ["tier 2", "tier2", "tier two", "الفئة الثانية", "المستوى الثاني", "الفئة 2"],
+    "Tier 3": ["tier 3", "tier3", "tier three", "الفئة الثالثة", "المستوى الثالث", "الفئة 3"],
+}
+
+TYPE_ALIASES = {
+    "أعمال": ["أعمال", "business"],
+    "ترفيه": ["ترفيه", "ترفيهية", "entertainment"],
+}
+
+INCLUSION_ALIASES = {
+    "تحسب بدون تضمين": ["تحسب بدون تضمين", "بدون تضمين", "counted without inclusion"],
+    "لن تضمن": ["لن تضمن", "غير مضمنة", "excluded", "not included"],
+    "تضمن": ["تضمن", "مضمنة", "included"],
+}
+
+MONTH_ALIASES = {
+    1: ["january", "jan", "يناير", "كانون الثاني"],
+    2: ["february", "feb", "فبراير", "شباط"],
+    3: ["march", "مارس", "آذار"],
+    4: ["april", "apr", "أبريل", "ابريل", "نيسان"],
+    5: ["مايو", "أيار"],
+    6: ["june", "jun", "يونيو", "حزيران"],
+    7: ["july", "jul", "يوليو", "تموز"],
+    8: ["august", "aug", "أغسطس", "اغسطس"],
+    9: ["september", "sep", "sept", "سبتمبر", "أيلول"],
+    10: ["october", "oct", "أكتوبر", "اكتوبر", "تشرين الأول"],
+    11: ["november", "nov", "نوفمبر", "تشرين الثاني"],
+    12: ["december", "dec", "ديسمبر", "كانون الأول"],
+}
+
+# Relative weight of each matching signal in the final score
+SIGNAL_WEIGHTS = {
+    "city": 3.0,
+    "org": 2.5,
+    "tier": 2.0,
+    "type": 1.0,
+    "inclusion": 1.0,
+    "date": 1.5,
+    "lexical": 2.0,
+}
+
+# Fields indexed for the lexical score and their repetition weight
+LEXICAL_FIELDS = {
+    "name": 3,
+    "responsible_org": 2,
+    "subcategory": 1,
+    "description": 1,
+}
+
+# Request vocabulary that says what to do rather than which events (stemmed, normalized)
+QUERY_STOPWORDS = frozenset({
+    "حلل", "تحليل", "بيانات", "فعاليات", "فعاليه", "اعرض", "قدم", "ملخص", "تقرير",
+    "احصاييات", "توزيع", "اجمالي", "شامل", "شاملا", "مدينه", "مدن", "جهه", "جهات",
+    "analyze", "analysis", "data", "event", "events", "summary", "report", "show",
+    "list", "total", "distribution", "provide", "need", "comprehensive",
+})
+
+_YEAR_RE = re.compile(r"\b(20\d\d)\b")
+
+
+def _compile_aliases(aliases: Dict) -> List[Tuple[re.Pattern, object]]:
+    """Compile an alias table into whole-phrase patterns, longest alias first."""
+    compiled = []
+    for canonical, names in aliases.items():
+        for name in names:
+            alias = normalize_arabic(name)
+            # Allow a single attached conjunction/preposition clitic before the phrase
+            pattern = re.compile(r"(?<!\w)(?:و|ب|ل|ف)?" + re.escape(alias) + r"(?!\w)")
+            compiled.append((len(alias), pattern, canonical))
+    compiled.sort(key=lambda item: item[0], reverse=True)
+    return [(pattern, canonical) for _, pattern, canonical in compiled]
+
+
+_CITY_PATTERNS = _compile_aliases(CITY_ALIASES)
+_TIER_PATTERNS = _compile_aliases(TIER_ALIASES)
+_TYPE_PATTERNS = _compile_aliases(TYPE_ALIASES)
+_INCLUSION_PATTERNS = _compile_aliases(INCLUSION_ALIASES)
+_MONTH_PATTERNS = _compile_aliases(MONTH_ALIASES)
+
+
+def _find_aliases(text: str, patterns: List[Tuple[re.Pattern, object]]) -> Set:
+    """Return canonical values whose alias appears as a whole phrase in normalized text."""
+    found = set()
+    for pattern, canonical in patterns:
+        if pattern.search(text):
+            found.add(canonical)
+            # Blank the match so shorter aliases ("تضمن") don't re-match inside longer ones
+            text = pattern.sub(" ", text)
+    return found
+
+
+def _org_needle(org: str) -> str:
+    """Normalized organization name without its leading article, so "للهيئة ..." still matches "الهيئة ..."."""
+    org_norm = normalize_arabic(org).strip()
+    return org_norm[2:] if org_norm.startswith("ال") else org_norm
+
+
+def extract_query_entities(query: str, known_orgs: Optional[List[str]] = None) -> Dict[str, Set]:
+    """Extract city, tier, type, inclusion, organization and date mentions from a request."""
+    text = normalize_arabic(query)
+    entities = {
+        "cities": _find_aliases(text, _CITY_PATTERNS),
+        "tiers": _find_aliases(text, _TIER_PATTERNS),
+        "types": _find_aliases(text, _TYPE_PATTERNS),
+        "inclusion": _find_aliases(text, _INCLUSION_PATTERNS),
+        "months": _find_aliases(text, _MONTH_PATTERNS),
+        "years": {int(y) for y in _YEAR_RE.findall(text)},
+        "orgs": set(),
+    }
+
+    for org in known_orgs or []:
+        needle = _org_needle(org)
+        if len(needle) >= 3 and needle in text:
+            entities["orgs"].add(org)
+
+    return entities
+
+
+def strip_query_entities(query: str, known_orgs: Optional[List[str]] = None) -> str:
+    """Normalized request text with every mention extract_query_entities recognizes blanked out."""
+    text = normalize_arabic(query)
+    for patterns in (_CITY_PATTERNS, _TIER_PATTERNS, _TYPE_PATTERNS, _INCLUSION_PATTERNS, _MONTH_PATTERNS):
+        for pattern, _ in patterns:
+            text = pattern.sub(" ", text)
+    text = _YEAR_RE.sub(" ", text)
+
+    for org in known_orgs or []:
+        needle = _org_needle(org)
+        if len(needle) >= 3:
+            # Take any attached clitic/article with it ("للهيئة", "والهيئة")
+            text = re.sub(r"(?<!\w)\w{0,3}" + re.escape(needle), " ", text)
+
+    return text
+
+
+def event_in_period(start, end, months: Set[int], years: Set[int]) -> bool:
+    """Check whether an event's date span touches any of the given months/years."""
+    if start is None:
+        return False
+    end = end if end and end >= start else start
+    if years and not any(start.year <= y <= end.year for y in years):
+        return False
+    if months:
+        span_months = (end.year - start.year) * 12 + end.month - start.month
+        covered = {((start.month - 1 + i) % 12) + 1 for i in range(min(span_months, 11) + 1)}
+        return bool(covered & months)
+    return bool(years)
+
+
+class EventRetriever:
+    """
+    مسترجع الفعاليات الأكثر صلة بطلب المستخدم ضمن ميزانية محددة من الرموز
+    """
+
+    def __init__(self, events: List[Dict]):
+        self.events = events
+        self.known_orgs = sorted({e.get("responsible_org", "") for e in events if e.get("responsible_org")})
+
+        self._dates: List[Tuple] = [
+            (parse_event_date(e.get("start_date", "")), parse_event_date(e.get("end_date", "")))
+            for e in events
+        ]
+
+        # TF-IDF inverted index: token -> [(event index, weight)]
+        doc_freq: Counter = Counter()
+        term_freqs: List[Counter] = []
+        for event in events:
+            tf: Counter = Counter()
+            for field, weight in LEXICAL_FIELDS.items():
+                for token in tokenize(event.get(field, ""), drop_stopwords=True):
+                    tf[token] += weight
+            term_freqs.append(tf)
+            doc_freq.update(tf.keys())
+
+        n_docs = max(len(events), 1)
+        self._idf = {token: math.log((n_docs + 1) / (df + 1)) + 1.0 for token, df in doc_freq.items()}
+        self._index: Dict[str, List[Tuple[int, float]]] = {}
+        for idx, tf in enumerate(term_freqs):
+            weights = {t: (1.0 + math.log(c)) * self._idf[t] for t, c in tf.items()}
+            norm = math.sqrt(sum(w * w for w in weights.values())) or 1.0
+            for token, weight in weights.items():
+                self._index.setdefault(token, []).append((idx, weight / norm))
+
+    def _lexical_scores(self, query: str) -> Dict[int, float]:
+        """Cosine similarity between the query and each event over the TF-IDF index."""
+        q_tf = Counter(
+            t for t in tokenize(query, drop_stopwords=True)
+            if t in self._idf and t not in QUERY_STOPWORDS
+        )
+        if not q_tf:
+            return {}
+        q_weights = {t: (1.0 + math.log(c)) * self._idf[t] for t, c in q_tf.items()}
+        q_norm = math.sqrt(sum(w * w for w in q_weights.values())) or 1.0
+
+        scores: Dict[int, float] = {}
+        for token, q_weight in q_weights.items():
+            for idx, d_weight in self._index.get(token, []):
+                scores[idx] = scores.get(idx, 0.0) + (q_weight / q_norm) * d_weight
+        return scores
+
+    def score(self, query: str) -> List[Tuple[float, int]]:
+        """Score all events against the query; returns (score, index) pairs with score > 0."""
+        entities = extract_query_entities(query, self.known_orgs)
+        lexical = self._lexical_scores(query)
+
+        scored = []
+        for idx, event in enumerate(self.events):
+            score = SIGNAL_WEIGHTS["lexical"] * lexical.get(idx, 0.0)
+            if entities["cities"] and event.get("city") in entities["cities"]:
+                score += SIGNAL_WEIGHTS["city"]
+            if entities["orgs"] and event.get("responsible_org") in entities["orgs"]:
+                score += SIGNAL_WEIGHTS["org"]
+            if entities["tiers"] and event.get("tier") in entities["tiers"]:
+                score += SIGNAL_WEIGHTS["tier"]
+            if entities["types"] and event.get("type") in entities["types"]:
+                score += SIGNAL_WEIGHTS["type"]
+            if entities["inclusion"] and event.get("inclusion_status") in entities["inclusion"]:
+                score += SIGNAL_WEIGHTS["inclusion"]
+            if (entities["months"] or entities["years"]) and event_in_period(*self._dates[idx], entities["months"], entities["years"]):
+                score += SIGNAL_WEIGHTS["date"]
+            if score > 0:
+                scored.append((score, idx))
+
+        scored.sort(key=lambda item: (-item[0], item[1]))
+        return scored
+
+    def _fallback_order(self) -> List[int]:
+        """Round-robin across cities so an unmatched query still gets a representative sample."""
+        by_city: Dict[str, List[int]] = {}
+        for idx, event in enumerate(self.events):
+            by_city.setdefault(event.get("city", ""), []).append(idx)
+        queues = sorted(by_city.values(), key=len, reverse=True)
+        order = []
+        for position in range(max((len(q) for q in queues), default=0)):
+            for queue in queues:
+                if position < len(queue):
+                    order.append(queue[position])
+        return order
+
+    def retrieve(
+        self,
+        query: str,
+        top_k: int = 25,
+        token_budget: int = 2500,
+        row_formatter=None
+    ) -> Tuple[List[Dict], bool]:
+        """
+        Return the top-k events for the query that fit within the token budget.
+
+        The second value is True when the rows were ranked by relevance and False
+        when nothing in the query matched and a representative sample was used.
+        """
+        ranked = [idx for _, idx in self.score(query)] if query else []
+        matched = bool(ranked)
+        if not matched:
+            ranked = self._fallback_order()
+
+        selected = []
+        used = 0
+        for idx in ranked:
+            if len(selected) >= top_k:
+                break
+            event = self.events[idx]
+            cost = estimate_tokens(row_formatter(event) if row_formatter else str(event))
+            if used + cost > token_budget:
+                break
+            selected.append(event)
+            used += cost
+
+        return selected, matched
+
+
+_retriever_cache = LRUCache(RETRIEVER_CACHE_SIZE)
+
+
+def get_event_retriever(knowledge_base) -> EventRetriever:
+    """Return the event retriever for a knowledge base, built once per data version."""
+    return _retriever_cache.get_or_compute(
+        knowledge_base.version,
+        lambda: EventRetriever(knowledge_base.get_all_events())
+    )
@@ -0,0 +1,224 @@
+"""
+مصنف نية الطلب المحلي — انحدار لوجستي على مقاطع الحروف مع ثقة معايرة
+"""
+
+import json
+import math
+import random
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .intent_matcher import get_intent_matcher
+from .text import light_stem, normalize_arabic
+
+
+DATA_DIR = Path(__file__).parent.parent / "data"
+EXAMPLES_PATH = DATA_DIR / "intent_examples.jsonl"
+MODEL_PATH = DATA_DIR / "intent_model.json"
+
+# Character n-gram range; padded words make prefixes/suffixes distinct features
+NGRAM_MIN = 2
+NGRAM_MAX = 4
+
+# Long prompts (pasted research results) are classified on their opening part
+MAX_CLASSIFY_CHARS = 1500
+
+# Weight of the keyword-matcher features relative to the unit-norm n-gram vector
+KEYWORD_FEATURE_WEIGHT = 2.0
+
+# Training schedule (plain SGD on the softmax loss with L2 decay)
+TRAIN_EPOCHS = 40
+LEARNING_RATE = 0.5
+L2_DECAY = 1e-3
+TRAIN_SEED = 0
+
+# Weights smaller than this are dropped from the serialized model
+PRUNE_BELOW = 0.05
+
+# Temperatures tried when calibrating confidence on held-out folds
+CALIBRATION_TEMPERATURES = (0.5, 0.7, 0.85, 1.0, 1.2, 1.5, 2.0, 3.0)
+CALIBRATION_FOLDS = 5
+
+
+def _softmax(scores: Dict[str, float], temperature: float = 1.0) -> Dict[str, float]:
+    top = max(scores.values())
+    exps = {label: math.exp((score - top) * temperature) for label, score in scores.items()}
+    total = sum(exps.values())
+    return {label: value / total for label, value in exps.items()}
+
+
+class IntentClassifier:
+    """
+    Softmax regression over character n-grams, light-stemmed words and keyword hits.
+
+    Keyword hits come from the IntentMatcher compiled over the keyword table
+    the model was trained with, which is serialized alongside the weights.
+    """
+
+    def __init__(self, keywords: Optional[Dict[str, List[str]]] = None):
+        self.keywords = keywords or {}
+        self.labels: List[str] = []
+        self.weights: Dict[str, Dict[str, float]] = {}
+        self.temperature = 1.0
+        self.cv_accuracy: Optional[float] = None
+
+    def features(self, text: str) -> Dict[str, float]:
+        """Sparse feature vector: unit-norm n-grams and word stems plus scaled keyword scores."""
+        features: Dict[str, float] = {}
+        for word in normalize_arabic(text[:MAX_CLASSIFY_CHARS]).split():
+            padded = f" {word} "
+            for n in range(NGRAM_MIN, NGRAM_MAX + 1):
+                for i in range(len(padded) - n + 1):
+                    features[padded[i:i + n]] = 1.0
+            features["w:" + light_stem(word)] = 1.0
+        if features:
+            norm = 1 / math.sqrt(len(features))
+            features = {name: norm for name in features}
+
+        if self.keywords:
+            for intent, score in get_intent_matcher(self.keywords).score(text).items():
+                features["k:" + intent] = KEYWORD_FEATURE_WEIGHT * min(score, 3) / 3
+        return features
+
+    def _scores(self, features: Dict[str, float], labels: Iterable[str]) -> Dict[str, float]:
+        return {
+            label: sum(self.weights[label].get(name, 0.0) * value for name, value in features.items())
+            for label in labels
+            if label in self.weights
+        }
+
+    def fit(self, samples: List[Tuple[str, str]]) -> "IntentClassifier":
+        """Train on (text, intent) pairs."""
+        self.labels = sorted({label for _, label in samples})
+        self.weights = {label: {} for label in self.labels}
+        data = [(self.features(text), label) for text, label in samples]
+        rng = random.Random(TRAIN_SEED)
+        decay = 1 - LEARNING_RATE * L2_DECAY
+
+        for _ in range(TRAIN_EPOCHS):
+            rng.shuffle(data)
+            for features, target in data:
+                proba = _softmax(self._scores(features, self.labels))
+                for label in self.labels:
+                    gradient = proba[label] - (1.0 if label == target else 0.0)
+                    weights = self.weights[label]
+                    for name, value in features.items():
+                        weights[name] = weights.get(name, 0.0) * decay - LEARNING_RATE * gradient * value
+        return self
+
+    def log_scores(self, text: str, labels: Optional[Iterable[str]] = None) -> Dict[str, float]:
+        """Uncalibrated score per label."""
+        return self._scores(self.features(text), labels if labels is not None else self.labels)
+
+    def predict_proba(self, text: str, labels: Optional[Iterable[str]] = None) -> Dict[str, float]:
+        """Calibrated probability per label, optionally renormalized over a subset of labels."""
+        scores = self.log_scores(text, labels)
+        return _softmax(scores, self.temperature) if scores else {}
+
+    def predict(self, text: str, labels: Optional[Iterable[str]] = None) -> Tuple[str, float]:
+        proba = self.predict_proba(text, labels)
+        if not proba:
+            return ("general", 0.0)
+        best = max(proba, key=proba.get)
+        return (best, proba[best])
+
+    def calibrate(self, samples: List[Tuple[str, str]], folds: int = CALIBRATION_FOLDS):
+        """Pick the temperature minimizing held-out log loss; records held-out accuracy."""
+        held_out: List[Tuple[Dict[str, float], str]] = []
+        for fold in range(folds):
+            train = [s for i, s in enumerate(samples) if i % folds != fold]
+            test = [s for i, s in enumerate(samples) if i % folds == fold]
+            model = IntentClassifier(self.keywords).fit(train)
+            held_out.extend((model.log_scores(text), label) for text, label in test)
+
+        def log_loss(temperature: float) -> float:
+            loss = 0.0
+            for scores, label in held_out:
+                loss -= math.log(max(_softmax(scores, temperature).get(label, 0.0), 1e-9))
+            return loss / len(held_out)
+
+        self.temperature = min(CALIBRATION_TEMPERATURES, key=log_loss)
+        correct = sum(1 for scores, label in held_out if max(scores, key=scores.get) == label)
+        self.cv_accuracy = round(correct / len(held_out), 3)
+
+    def to_dict(self) -> Dict:
+        return {
+            "labels": self.labels,
+            "keywords": self.keywords,
+            "temperature": self.temperature,
+            "cv_accuracy": self.cv_accuracy,
+            "weights": {
+                label: {name: round(w, 3) for name, w in weights.items() if abs(w) >= PRUNE_BELOW}
+                for label, weights in self.weights.items()
+            },
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "IntentClassifier":
+        model = cls(data.get("keywords"))
+        model.labels = data["labels"]
+        model.weights = data["weights"]
+        model.temperature = data["temperature"]
+        model.cv_accuracy = data.get("cv_accuracy")
+        return model
+
+    def save(self, path: Path = MODEL_PATH):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, separators=(",", ":"), sort_keys=True)
+
+    @classmethod
+    def load(cls, path: Path = MODEL_PATH) -> "IntentClassifier":
+        with open(path, "r", encoding="utf-8") as f:
+            return cls.from_dict(json.load(f))
+
+
+def load_training_samples() -> List[Tuple[str, str]]:
+    """Labeled demo prompts plus the labeled request log in data/."""
+    from tests.demo_prompts import ALL_DEMO_PROMPTS
+
+    samples = [
+        (step["prompt"], step["intent"])
+        for project in ALL_DEMO_PROMPTS.values()
+        for step in project["steps"]
+        if step.get("intent") and not step["prompt"].startswith("[SYSTEM")
+    ]
+    with open(EXAMPLES_PATH, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                row = json.loads(line)
+                samples.append((row["text"], row["intent"]))
+    return samples
+
+
+def train_intent_classifier(keywords: Dict[str, List[str]], path: Path = MODEL_PATH) -> IntentClassifier:
+    """Train, calibrate and serialize the classifier shipped with the app."""
+    samples = load_training_samples()
+    model = IntentClassifier(keywords)
+    model.calibrate(samples)
+    model.fit(samples)
+    model.save(path)
+    return model
+
+
+_classifier: Optional[IntentClassifier] = None
+_classifier_loaded = False
+
+
+def get_intent_classifier() -> Optional[IntentClassifier]:
+    """The serialized classifier, loaded once; None if the model file is missing or unreadable."""
+    global _classifier, _classifier_loaded
+    if not _classifier_loaded:
+        try:
+            _classifier = IntentClassifier.load()
+        except (OSError, ValueError, KeyError):
+            _classifier = None
+        _classifier_loaded = True
+    return _classifier
+
+
+if __name__ == "__main__":
+    from config import INTENT_KEYWORDS
+
+    trained = train_intent_classifier(INTENT_KEYWORDS)
+    print(f"labels: {', '.join(trained.labels)}")
+    print(f"temperature: {trained.temperature}, held-out accuracy: {trained.cv_accuracy}")
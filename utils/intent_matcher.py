@@ -0,0 +1,171 @@
+"""
+مطابقة نية الطلب — آلة Aho-Corasick مُجمّعة مرة واحدة فوق الكلمات المفتاحية
+"""
+
+from collections import deque
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .cache import LRUCache
+from .text import normalize_arabic
+
+
+# Attached clitics allowed before a keyword that still count as a whole-word hit
+_CLITIC_PREFIXES = frozenset({
+    "و", "ب", "ل", "ف", "ك", "ال", "وال", "بال", "فال", "كال", "لل", "وب", "ول", "وبال", "ولل",
+})
+
+# Inflection endings allowed after a keyword (normalized: ة -> ه)
+_INFLECTION_SUFFIXES = frozenset({
+    "ه", "ات", "ي", "يه", "ها", "هم", "ين", "ون", "ان", "s", "es", "ed", "ing",
+})
+
+# Bare three-letter verb roots: with the article or an ending they read as unrelated
+# nouns ("القيمة" is value, not evaluate), so they only hit alone or after a verb prefix
+_VERB_ROOTS = frozenset({"قيم", "حلل", "فحص", "نقد", "رصد"})
+
+# Imperative/present/future prefixes, alone or after a conjunction ("افحص", "سنقيم", "ونحلل")
+_VERB_PREFIXES = frozenset({
+    "و", "ف", "ا", "ي", "ت", "ن", "سي", "ست", "سن", "وا", "فا", "وي", "وت", "ون", "لي", "لن", "لت",
+})
+
+# Weight of a hit embedded inside a longer word; short keywords get none
+EMBEDDED_HIT_WEIGHT = 0.5
+EMBEDDED_MIN_LENGTH = 4
+
+
+def _is_word_char(ch: str) -> bool:
+    return ch.isalnum() or ch == "_"
+
+
+class IntentMatcher:
+    """
+    Scores every intent in one pass over the normalized message.
+
+    Keywords are compiled once into an Aho-Corasick automaton. A hit counts 1
+    when it is a whole word (allowing an attached clitic and an inflection
+    ending; a verb root only a verb prefix), EMBEDDED_HIT_WEIGHT when it sits
+    inside a longer word, and each keyword counts at most once, as the
+    substring counting it replaces did. Tied intents go to the one mentioned
+    first, since a request usually leads with its verb, then to the one with
+    the longer (more specific) keyword.
+    """
+
+    def __init__(self, keywords: Dict[str, List[str]]):
+        self.intents = list(keywords)
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        # Per state: (keyword id, keyword length) pairs ending here
+        self._out: List[List[Tuple[int, int]]] = [[]]
+        # Keyword id -> intents it counts towards
+        self._keyword_intents: List[List[str]] = []
+
+        ids: Dict[str, int] = {}
+        for intent, words in keywords.items():
+            for word in words:
+                pattern = normalize_arabic(word).strip()
+                if not pattern:
+                    continue
+                if pattern not in ids:
+                    ids[pattern] = len(self._keyword_intents)
+                    self._keyword_intents.append([])
+                    self._add(pattern, ids[pattern])
+                if intent not in self._keyword_intents[ids[pattern]]:
+                    self._keyword_intents[ids[pattern]].append(intent)
+        self._build_failure_links()
+
+    def _add(self, pattern: str, keyword_id: int):
+        state = 0
+        for ch in pattern:
+            nxt = self._goto[state].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[state][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            state = nxt
+        self._out[state].append((keyword_id, len(pattern)))
+
+    def _build_failure_links(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                fallback = self._fail[state]
+                while fallback and ch not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(ch, 0)
+                self._fail[nxt] = target if target != nxt else 0
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    @staticmethod
+    def _hit_weight(text: str, start: int, end: int) -> float:
+        """1 for a whole-word hit, EMBEDDED_HIT_WEIGHT or 0 for a hit inside a longer word."""
+        word_start = start
+        while word_start > 0 and _is_word_char(text[word_start - 1]):
+            word_start -= 1
+        word_end = end
+        while word_end < len(text) and _is_word_char(text[word_end]):
+            word_end += 1
+
+        prefix = text[word_start:start]
+        suffix = text[end:word_end]
+        if text[start:end] in _VERB_ROOTS:
+            if not suffix and (not prefix or prefix in _VERB_PREFIXES):
+                return 1.0
+            return 0.0
+        if (not prefix or prefix in _CLITIC_PREFIXES) and (not suffix or suffix in _INFLECTION_SUFFIXES):
+            return 1.0
+        return EMBEDDED_HIT_WEIGHT if end - start >= EMBEDDED_MIN_LENGTH else 0.0
+
+    def _scan(self, message: str, intents: Optional[Iterable[str]]) -> Tuple[Dict[str, float], Dict[str, Tuple[int, int]]]:
+        """Score per intent (only positive scores) and a tie-break rank: earliest hit, then longest keyword."""
+        text = normalize_arabic(message)
+        best: Dict[int, float] = {}
+        first: Dict[int, Tuple[int, int]] = {}
+        state = 0
+        for pos, ch in enumerate(text):
+            while state and ch not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(ch, 0)
+            for keyword_id, length in self._out[state]:
+                if best.get(keyword_id, 0.0) >= 1.0:
+                    continue
+                weight = self._hit_weight(text, pos + 1 - length, pos + 1)
+                if weight > best.get(keyword_id, 0.0):
+                    best[keyword_id] = weight
+                    first.setdefault(keyword_id, (-(pos + 1 - length), length))
+
+        allowed = set(intents) if intents is not None else None
+        scores: Dict[str, float] = {}
+        ranks: Dict[str, Tuple[int, int]] = {}
+        for keyword_id, weight in best.items():
+            if not weight:
+                continue
+            for intent in self._keyword_intents[keyword_id]:
+                if allowed is None or intent in allowed:
+                    scores[intent] = scores.get(intent, 0.0) + weight
+                    ranks[intent] = max(ranks.get(intent, first[keyword_id]), first[keyword_id])
+        return scores, ranks
+
+    def score(self, message: str, intents: Optional[Iterable[str]] = None) -> Dict[str, float]:
+        """Score per intent (only positive scores), optionally restricted to some intents."""
+        return self._scan(message, intents)[0]
+
+    def classify(self, message: str, intents: Optional[Iterable[str]] = None) -> Tuple[str, float]:
+        """Top intent and confidence (three whole-word hits = 1.0); "general" when nothing matches."""
+        scores, ranks = self._scan(message, intents)
+        if not scores:
+            return ("general", 0.5)
+        best_intent = max(scores, key=lambda intent: (scores[intent], ranks[intent]))
+        return (best_intent, min(scores[best_intent] / 3, 1.0))
+
+
+_matcher_cache = LRUCache(4)
+
+
+def get_intent_matcher(keywords: Dict[str, List[str]]) -> IntentMatcher:
+    """Return the compiled matcher for a keyword table, built once per distinct table."""
+    key = tuple((intent, tuple(words)) for intent, words in keywords.items())
+    return _matcher_cache.get_or_compute(key, lambda: IntentMatcher(keywords))
@@ -0,0 +1,133 @@
+"""
+موجّه الطلبات — المصنف المحلي أولاً، ثم استدعاء نموذج خفيف عند انخفاض الثقة
+"""
+
+import hashlib
+from typing import Callable, Dict, List, Optional, Sequence
+from pydantic import BaseModel, Field
+
+from config import ROUTING_CACHE_SIZE
+from .cache import LRUCache
+from .intent_classifier import get_intent_classifier
+from .intent_matcher import get_intent_matcher
+from .text import tokenize
+
+
+# Confidence attached to a route chosen by the model fallback
+MODEL_ROUTE_CONFIDENCE = 0.8
+
+ROUTING_PROMPT = """صنّف طلب المستخدم إلى فئة واحدة فقط من الفئات التالية:
+{labels}
+
+الطلب:
+{message}
+
+أجب باسم الفئة فقط كما هو مكتوب أعلاه، دون أي كلمة أخرى."""
+
+
+class RoutingDecision(BaseModel):
+    """Chosen intent for a request and how it was reached."""
+    intent: str
+    confidence: float
+    source: str = Field(description="classifier, model or keywords")
+    scores: Dict[str, float] = Field(default_factory=dict)
+    agent: str = Field(default="", description="Name of the agent the intent resolves to")
+    cached: bool = False
+
+
+def ask_model_for_intent(call_model: Callable, message: str, labels: List[str], descriptions: Dict[str, str],
+                         model: str, max_tokens: int) -> Optional[str]:
+    """One short routing call; returns the label the model named, or None."""
+    listing = "\n".join(f"- {label}: {descriptions.get(label, label)}" for label in labels)
+    response = call_model(
+        [{"role": "user", "content": ROUTING_PROMPT.format(labels=listing, message=message[:2000])}],
+        system="",
+        max_tokens=max_tokens,
+        temperature=0,
+        model=model
+    )
+    answer = response.content[0].text.strip().lower()
+    for label in sorted(labels, key=len, reverse=True):
+        if label in answer:
+            return label
+    return None
+
+
+_routing_cache = LRUCache(ROUTING_CACHE_SIZE)
+
+
+def routing_cache_key(labels: Sequence[str], message: str, state: str = "") -> tuple:
+    """Cache key: routable labels, follow-up state and a digest of the normalized request words."""
+    text = " ".join(tokenize(message, stem=False))
+    return (tuple(labels), state, hashlib.sha1(text.encode("utf-8")).hexdigest())
+
+
+def routing_cache_stats() -> Dict[str, Optional[float]]:
+    return _routing_cache.stats()
+
+
+class IntentRouter:
+    """
+    Routes a request to one of a fixed set of intents.
+
+    The local classifier answers when its calibrated confidence reaches the
+    threshold; below it the optional fallback (a cheap model call) decides.
+    Without a trained classifier the keyword matcher is used. Decisions are
+    cached on normalized text plus the caller's follow-up state.
+    """
+
+    def __init__(
+        self,
+        intents: Sequence[str],
+        keywords: Dict[str, List[str]],
+        threshold: float,
+        fallback: Optional[Callable[[str, List[str]], Optional[str]]] = None,
+        resolve_agent: Optional[Callable[[str], str]] = None
+    ):
+        self.labels = list(intents) + ["general"]
+        self.keywords = keywords
+        self.threshold = threshold
+        self.fallback = fallback
+        self.resolve_agent = resolve_agent
+
+    def route(self, message: str, state: str = "") -> RoutingDecision:
+        """Routing decision for a request; state distinguishes follow-ups that may route differently."""
+        key = routing_cache_key(self.labels, message, state)
+        cached = _routing_cache.get(key)
+        if cached is not None:
+            return cached.model_copy(update={"cached": True})
+
+        decision = self._decide(message)
+        if self.resolve_agent is not None:
+            decision.agent = self.resolve_agent(decision.intent)
+        # A fallback that failed leaves a below-threshold guess; let the next request retry
+        if decision.confidence >= self.threshold or decision.source != "classifier" or self.fallback is None:
+            _routing_cache.put(key, decision)
+        return decision
+
+    def _decide(self, message: str) -> RoutingDecision:
+        classifier = get_intent_classifier()
+        if classifier is None:
+            intent, confidence = get_intent_matcher(self.keywords).classify(message, self.labels[:-1])
+            return RoutingDecision(intent=intent, confidence=confidence, source="keywords")
+
+        proba = classifier.predict_proba(message, self.labels)
+        intent = max(proba, key=proba.get)
+        decision = RoutingDecision(
+            intent=intent,
+            confidence=proba[intent],
+            source="classifier",
+            scores={label: round(p, 3) for label, p in proba.items()}
+        )
+        if decision.confidence >= self.threshold or self.fallback is None:
+            return decision
+
+        try:
+            model_intent = self.fallback(message, self.labels)
+        except Exception:
+            model_intent = None
+        if model_intent in self.labels:
+            decision.intent = model_intent
+            decision.confidence = MODEL_ROUTE_CONFIDENCE
+            decision.source = "model"
+        return decision
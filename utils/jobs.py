@@ -0,0 +1,170 @@
+"""
+منفذ المهام الخلفية — تشغيل طلبات الوكلاء خارج خيط الواجهة مع جدول مهام لكل جلسة
+"""
+
+import contextvars
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Deque, Dict, List, Optional
+from pydantic import BaseModel, Field
+
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = "queued", "running", "done", "failed", "cancelled"
+FINISHED = (DONE, FAILED, CANCELLED)
+
+
+class QueueFullError(Exception):
+    """The session already has as many unfinished jobs as it may queue."""
+
+
+class Job(BaseModel):
+    """One background request and everything the UI needs to show it."""
+    id: str = Field(default_factory=lambda: uuid.uuid4().hex[:12])
+    session_id: str
+    label: str = ""
+    meta: Dict[str, Any] = Field(default_factory=dict, description="Caller data, e.g. which conversation the result belongs to")
+    status: str = QUEUED
+    progress: List[str] = Field(default_factory=list, description="Steps reported while running, newest last")
+    result: Any = None
+    error: Optional[str] = None
+    cancel_requested: bool = False
+    created_at: float = Field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED
+
+    @property
+    def elapsed(self) -> float:
+        if self.started_at is None:
+            return 0.0
+        return (self.finished_at or time.time()) - self.started_at
+
+
+class JobExecutor:
+    """
+    Runs jobs on a shared thread pool and keeps a job table per session.
+
+    A session's jobs run one at a time in submission order (a follow-up may
+    depend on the previous answer), and at most max_per_session may be
+    unfinished at once. Results stay in the table until the session takes
+    them, so they survive reruns and page switches. Cancelling a queued job
+    drops it; a running job sees cancel_requested and its result is discarded.
+    A job's on_done hook runs only when it finishes DONE, before the session's
+    next job starts, so that job sees whatever the hook committed.
+    """
+
+    def __init__(self, max_workers: int, max_per_session: int):
+        self.max_per_session = max_per_session
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="agent-job")
+        self._lock = threading.Lock()
+        self._jobs: Dict[str, Job] = {}
+        self._by_session: Dict[str, List[str]] = {}
+        self._queues: Dict[str, Deque[Job]] = {}
+        self._running: Dict[str, str] = {}
+        self._work: Dict[str, Callable[[Job], Any]] = {}
+        self._on_done: Dict[str, Callable[[Job], None]] = {}
+
+    def submit(
+        self,
+        session_id: str,
+        func: Callable[[Job], Any],
+        label: str = "",
+        meta: Optional[Dict] = None,
+        on_done: Optional[Callable[[Job], None]] = None
+    ) -> Job:
+        """Queue func(job) for the session; raises QueueFullError when the session's queue is full."""
+        with self._lock:
+            if len(self._active(session_id)) >= self.max_per_session:
+                raise QueueFullError(f"الحد الأقصى للطلبات قيد التنفيذ لكل جلسة هو {self.max_per_session}")
+            job = Job(session_id=session_id, label=label, meta=meta or {})
+            self._jobs[job.id] = job
+            self._by_session.setdefault(session_id, []).append(job.id)
+            self._queues.setdefault(session_id, deque()).append(job)
+            # The job runs in a copy of the submitter's context, like map_concurrently tasks
+            context = contextvars.copy_context()
+            self._work[job.id] = lambda j: context.run(func, j)
+            if on_done:
+                self._on_done[job.id] = on_done
+            self._dispatch(session_id)
+        return job
+
+    def _dispatch(self, session_id: str):
+        """Start the session's next queued job if none is running. Caller holds the lock."""
+        if session_id in self._running:
+            return
+        queue = self._queues.get(session_id)
+        while queue:
+            job = queue.popleft()
+            if job.status == QUEUED:
+                self._running[session_id] = job.id
+                self._pool.submit(self._run, job)
+                return
+
+    def _run(self, job: Job):
+        with self._lock:
+            work = self._work.pop(job.id, None)
+            if work is None:
+                # Cancelled between dispatch and start
+                self._on_done.pop(job.id, None)
+                self._running.pop(job.session_id, None)
+                self._dispatch(job.session_id)
+                return
+            job.status, job.started_at = RUNNING, time.time()
+        try:
+            result = work(job)
+            # Decided under the lock so a cancel cannot land between the status and the commit
+            with self._lock:
+                job.result, job.status = result, (CANCELLED if job.cancel_requested else DONE)
+                on_done = self._on_done.pop(job.id, None)
+                if on_done and job.status == DONE:
+                    on_done(job)
+        except Exception as e:
+            job.error, job.status = str(e), (CANCELLED if job.cancel_requested else FAILED)
+        finally:
+            job.finished_at = time.time()
+            with self._lock:
+                self._on_done.pop(job.id, None)
+                self._running.pop(job.session_id, None)
+                self._dispatch(job.session_id)
+
+    def cancel(self, job_id: str) -> bool:
+        """Cancel a queued or running job; False if it had already finished."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.finished:
+                return False
+            job.cancel_requested = True
+            if job.status == QUEUED:
+                job.status, job.finished_at = CANCELLED, time.time()
+                self._work.pop(job.id, None)
+                self._on_done.pop(job.id, None)
+            return True
+
+    def jobs(self, session_id: str) -> List[Job]:
+        """The session's jobs, oldest first."""
+        with self._lock:
+            return [self._jobs[job_id] for job_id in self._by_session.get(session_id, [])]
+
+    def active(self, session_id: str) -> List[Job]:
+        """Queued and running jobs of the session."""
+        with self._lock:
+            return self._active(session_id)
+
+    def _active(self, session_id: str) -> List[Job]:
+        return [self._jobs[j] for j in self._by_session.get(session_id, []) if not self._jobs[j].finished]
+
+    def take_finished(self, session_id: str) -> List[Job]:
+        """Remove and return the session's finished jobs, oldest first."""
+        with self._lock:
+            ids = self._by_session.get(session_id, [])
+            finished = [self._jobs[j] for j in ids if self._jobs[j].finished]
+            self._by_session[session_id] = [j for j in ids if not self._jobs[j].finished]
+            for job in finished:
+                del self._jobs[job.id]
+            return finished
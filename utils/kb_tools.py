@@ -0,0 +1,563 @@
+"""
+أدوات قاعدة المعرفة للنموذج — استعلامات محلية يستدعيها النموذج عند الحاجة بدلاً من ملخصات كاملة في كل طلب
+"""
+
+import json
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from pydantic import BaseModel, Field
+
+from config import TOOL_CACHE_SIZE
+from .cache import LRUCache
+from .event_analytics import FIELD_LABELS, UNSPECIFIED, get_event_stats
+from .event_dates import parse_event_date
+from .event_retrieval import event_in_period, extract_query_entities
+from .benchmark_metrics import DERIVED_METRICS, METRIC_DEFINITIONS, format_metrics_tables, get_metrics_cube
+from .kpi_ranking import get_kpi_ranker
+from .timeline import get_timeline
+from .text import CHARS_PER_TOKEN, estimate_tokens, normalize_arabic
+
+
+# Upper bound on rows a single list-style tool call returns
+MAX_TOOL_ROWS = 50
+
+_DIMENSION_ENUM = ["city", "tier", "type", "inclusion_status", "responsible_org"]
+
+# Event filters shared by the event tools
+_EVENT_FILTERS = {
+    "city": {"type": "string", "description": "المدينة (الرياض، جدة، العلا، عسير، حاضرة الدمام)"},
+    "tier": {"type": "string", "description": "التصنيف: Marquee أو Tier 1 أو Tier 2 أو Tier 3"},
+    "type": {"type": "string", "description": "النوع: أعمال أو ترفيه"},
+    "inclusion_status": {"type": "string", "description": "حالة التضمين: تضمن أو لن تضمن أو تحسب بدون تضمين"},
+    "organization": {"type": "string", "description": "جزء من اسم الجهة المسؤولة"},
+    "month": {"type": "integer", "minimum": 1, "maximum": 12, "description": "شهر تقع فيه الفعالية"},
+    "year": {"type": "integer", "description": "سنة تقع فيها الفعالية"},
+}
+
+KB_TOOLS = [
+    {
+        "name": "filter_events",
+        "description": "يعرض الفعاليات المطابقة لمرشحات اختيارية مع عددها الإجمالي.",
+        "input_schema": {
+            "type": "object",
+            "properties": dict(_EVENT_FILTERS, limit={"type": "integer", "description": f"عدد الصفوف المطلوبة (حتى {MAX_TOOL_ROWS})"}),
+        },
+    },
+    {
+        "name": "aggregate_events",
+        "description": "يعدّ الفعاليات حسب بُعد واحد أو بُعدين (جدول تقاطعي) بعد تطبيق المرشحات الاختيارية.",
+        "input_schema": {
+            "type": "object",
+            "properties": dict(
+                _EVENT_FILTERS,
+                group_by={"type": "string", "enum": _DIMENSION_ENUM},
+                then_by={"type": "string", "enum": _DIMENSION_ENUM, "description": "بُعد ثانٍ للجدول التقاطعي"},
+            ),
+            "required": ["group_by"],
+        },
+    },
+    {
+        "name": "event_timeline",
+        "description": "كثافة التقويم والتعارضات بين الفعاليات الكبرى والفجوات الزمنية، لمدينة أو لجميع المدن.",
+        "input_schema": {"type": "object", "properties": {"city": _EVENT_FILTERS["city"]}},
+    },
+    {
+        "name": "events_missing_info",
+        "description": "الفعاليات التي تنقصها حقول إلزامية، مع نسب الاكتمال لكل مدينة.",
+        "input_schema": {
+            "type": "object",
+            "properties": {
+                "city": _EVENT_FILTERS["city"],
+                "organization": _EVENT_FILTERS["organization"],
+                "limit": {"type": "integer", "description": f"عدد الفعاليات المطلوبة (حتى {MAX_TOOL_ROWS})"},
+            },
+        },
+    },
+    {
+        "name": "lookup_organization",
+        "description": "بيانات جهة (الدور والمسؤوليات إن وجدت) وعدد فعالياتها حسب المدينة والتصنيف والفعاليات الناقصة.",
+        "input_schema": {
+            "type": "object",
+            "properties": {"name": {"type": "string", "description": "اسم الجهة أو جزء منه"}},
+            "required": ["name"],
+        },
+    },
+    {
+        "name": "search_benchmarks",
+        "description": "يبحث في التجارب الدولية بالاسم أو الدولة أو الموضوع؛ دون استعلام يعرض جميع التجارب باختصار.",
+        "input_schema": {"type": "object", "properties": {"query": {"type": "string"}}},
+    },
+    {
+        "name": "get_benchmark",
+        "description": "تفاصيل تجربة دولية واحدة، مع إمكانية اختيار الأقسام المطلوبة فقط.",
+        "input_schema": {
+            "type": "object",
+            "properties": {
+                "benchmark": {"type": "string", "description": "معرّف التجربة أو اسمها"},
+                "sections": {
+                    "type": "array",
+                    "items": {"type": "string", "enum": [
+                        "overview", "metrics", "programming", "governance",
+                        "success_factors", "challenges", "lessons", "legacy",
+                    ]},
+                },
+            },
+            "required": ["benchmark"],
+        },
+    },
+    {
+        "name": "compare_benchmarks",
+        "description": "جداول المؤشرات الموحدة والنسب المحسوبة مع الترتيب لعدة تجارب (جميعها إن لم تُحدد).",
+        "input_schema": {
+            "type": "object",
+            "properties": {"benchmarks": {"type": "array", "items": {"type": "string"}, "description": "معرّفات أو أسماء"}},
+        },
+    },
+    {
+        "name": "search_kpis",
+        "description": "يبحث في مكتبة مؤشرات الأداء ويعيد الأكثر صلة مع التعريف وطريقة القياس والمستهدف.",
+        "input_schema": {
+            "type": "object",
+            "properties": {
+                "query": {"type": "string"},
+                "category": {"type": "string", "description": "اسم فئة لحصر البحث فيها"},
+                "limit": {"type": "integer"},
+            },
+            "required": ["query"],
+        },
+    },
+    {
+        "name": "list_kpi_categories",
+        "description": "فئات مكتبة المؤشرات مع وصفها وأسماء مؤشراتها.",
+        "input_schema": {"type": "object", "properties": {}},
+    },
+]
+
+EVENT_TOOLS = ["filter_events", "aggregate_events", "event_timeline", "events_missing_info", "lookup_organization"]
+BENCHMARK_TOOLS = ["search_benchmarks", "get_benchmark", "compare_benchmarks"]
+KPI_TOOLS = ["search_kpis", "list_kpi_categories"]
+
+# Appended to a request that starts from tool_overview instead of the full data
+TOOLS_INSTRUCTION = (
+    "التفاصيل غير مدرجة هنا: استخدم أدوات قاعدة المعرفة لجلب ما يحتاجه الطلب فقط "
+    "(يمكن طلب عدة أدوات في الرد نفسه)، واعتمد على نتائجها دون افتراض أي أرقام."
+)
+
+_ENTITY_KEYS = {"city": "cities", "tier": "tiers", "type": "types", "inclusion_status": "inclusion"}
+
+
+class ToolCall(BaseModel):
+    """One executed tool call."""
+    name: str
+    arguments: Dict[str, Any] = Field(default_factory=dict)
+    content: str = ""
+    is_error: bool = False
+    cached: bool = False
+    truncated: bool = False
+    seconds: float = 0.0
+
+
+class ToolStats(BaseModel):
+    """Accumulated latency of one tool since the process started."""
+    calls: int = 0
+    cached: int = 0
+    errors: int = 0
+    total_seconds: float = 0.0
+    max_seconds: float = 0.0
+
+    @property
+    def mean_ms(self) -> float:
+        return 1000 * self.total_seconds / self.calls if self.calls else 0.0
+
+
+class ToolLoopResult(BaseModel):
+    """Outcome of a model conversation with tool calls."""
+    text: str = ""
+    rounds: int = 0
+    calls: List[ToolCall] = Field(default_factory=list)
+    hit_limit: bool = Field(default=False, description="True when the model was stopped at the round limit")
+    input_tokens: int = 0
+    output_tokens: int = 0
+
+    @property
+    def tools_used(self) -> List[str]:
+        return list(dict.fromkeys(call.name for call in self.calls))
+
+    def as_metadata(self) -> Dict[str, Any]:
+        return {
+            "tool_calls": len(self.calls),
+            "tool_calls_cached": sum(1 for call in self.calls if call.cached),
+            "tool_rounds": self.rounds,
+            "tools_used": self.tools_used,
+            "tool_limit_reached": self.hit_limit,
+            "tool_seconds": round(sum(call.seconds for call in self.calls), 4),
+        }
+
+
+# ==================== Helpers ====================
+
+def _resolve(field: str, value: str) -> str:
+    """Canonical value for a filter given in any alias ("Riyadh" -> "الرياض")."""
+    found = extract_query_entities(value)[_ENTITY_KEYS[field]] if field in _ENTITY_KEYS else set()
+    return next(iter(found)) if len(found) == 1 else value.strip()
+
+
+def _filter_events(kb, args: Dict) -> List[Dict]:
+    filters = {f: _resolve(f, str(args[f])) for f in _ENTITY_KEYS if args.get(f)}
+    organization = normalize_arabic(str(args.get("organization", "")).strip())
+    months = {int(args["month"])} if args.get("month") else set()
+    years = {int(args["year"])} if args.get("year") else set()
+
+    matched = []
+    for event in kb.get_all_events():
+        if any(event.get(field) != value for field, value in filters.items()):
+            continue
+        if organization and organization not in normalize_arabic(event.get("responsible_org", "")):
+            continue
+        if (months or years) and not event_in_period(
+            parse_event_date(event.get("start_date", "")), parse_event_date(event.get("end_date", "")), months, years
+        ):
+            continue
+        matched.append(event)
+    return matched
+
+
+def _event_row(event: Dict) -> Dict:
+    return {
+        "name": event.get("name", ""),
+        "city": event.get("city", ""),
+        "organization": event.get("responsible_org", ""),
+        "tier": event.get("tier", ""),
+        "type": event.get("type", ""),
+        "start": event.get("start_date", ""),
+        "end": event.get("end_date", ""),
+        "inclusion": event.get("inclusion_status", ""),
+    }
+
+
+def _limit(args: Dict, default: int) -> int:
+    try:
+        return min(max(int(args.get("limit") or default), 1), MAX_TOOL_ROWS)
+    except (TypeError, ValueError):
+        return default
+
+
+def _find_benchmark(kb, reference: str) -> Optional[Dict]:
+    return kb.get_benchmark_by_id(reference) or kb.get_benchmark_by_name(reference)
+
+
+# ==================== Tool handlers ====================
+
+def _tool_filter_events(kb, args: Dict) -> Dict:
+    matched = _filter_events(kb, args)
+    limit = _limit(args, 20)
+    return {"matched": len(matched), "total": len(kb.get_all_events()),
+            "events": [_event_row(e) for e in matched[:limit]]}
+
+
+def _tool_aggregate_events(kb, args: Dict) -> Dict:
+    group_by, then_by = args["group_by"], args.get("then_by")
+    if group_by not in _DIMENSION_ENUM or (then_by and then_by not in _DIMENSION_ENUM):
+        raise ValueError(f"بُعد غير معروف؛ المتاح: {', '.join(_DIMENSION_ENUM)}")
+    matched = _filter_events(kb, args)
+    counts: Dict[str, Any] = {}
+    for event in matched:
+        key = event.get(group_by, "") or UNSPECIFIED
+        if then_by:
+            inner = counts.setdefault(key, {})
+            sub = event.get(then_by, "") or UNSPECIFIED
+            inner[sub] = inner.get(sub, 0) + 1
+        else:
+            counts[key] = counts.get(key, 0) + 1
+
+    def size(item):
+        return sum(item[1].values()) if isinstance(item[1], dict) else item[1]
+    ordered = sorted(counts.items(), key=size, reverse=True)
+    result = {"matched": len(matched), "group_by": group_by, "counts": dict(ordered[:MAX_TOOL_ROWS])}
+    if then_by:
+        result["then_by"] = then_by
+    if len(ordered) > MAX_TOOL_ROWS:
+        result["other_groups"] = len(ordered) - MAX_TOOL_ROWS
+    return result
+
+
+def _tool_event_timeline(kb, args: Dict) -> Dict:
+    timeline = get_timeline(kb)
+    city = _resolve("city", str(args["city"])) if args.get("city") else None
+    cities = {c: t for c, t in timeline.cities.items() if city is None or c == city}
+    return {
+        "cities": {
+            c: {
+                "dated_events": t.dated,
+                "overlapping_pairs": t.overlapping_pairs,
+                "busy_days": t.busy_days,
+                "peak": f"{t.peak_load} في {t.peak_day}" if t.peak_day else None,
+                "first_day": str(t.first_day) if t.first_day else None,
+                "last_day": str(t.last_day) if t.last_day else None,
+            }
+            for c, t in cities.items()
+        },
+        "clashes": [
+            {"city": c.city, "first": c.first, "second": c.second, "tiers": f"{c.first_tier} / {c.second_tier}",
+             "overlap": f"{c.overlap_start} — {c.overlap_end}", "days": c.overlap_days}
+            for c in timeline.clashes if c.city in cities
+        ],
+        "gaps": [
+            {"city": g.city, "from": str(g.start), "to": str(g.end), "days": g.days}
+            for g in timeline.gaps if g.city in cities
+        ][:10],
+        "undated_events": timeline.undated,
+    }
+
+
+def _tool_events_missing_info(kb, args: Dict) -> Dict:
+    stats = get_event_stats(kb)
+    city = _resolve("city", str(args["city"])) if args.get("city") else None
+    organization = normalize_arabic(str(args.get("organization", "")).strip())
+    gaps = [
+        g for g in stats.gaps
+        if (city is None or g.city == city) and (not organization or organization in normalize_arabic(g.responsible_org))
+    ]
+    limit = _limit(args, 20)
+    return {
+        "events_with_gaps": len(gaps),
+        "completion_by_city": {
+            c: {"events": comp.total, "complete_percent": comp.completion_rate, "with_gaps": comp.gaps}
+            for c, comp in stats.completeness.items() if city is None or c == city
+        },
+        "events": [
+            {"name": g.name, "city": g.city, "organization": g.responsible_org,
+             "missing": g.missing_labels, "inclusion": g.inclusion_status}
+            for g in gaps[:limit]
+        ],
+    }
+
+
+def _tool_lookup_organization(kb, args: Dict) -> Dict:
+    name = str(args["name"]).strip()
+    record = kb.get_organization_by_name(name)
+    events = _filter_events(kb, {"organization": name})
+    if record is None and not events:
+        raise ValueError(f"لا توجد جهة باسم «{name}»")
+
+    by_city: Dict[str, int] = {}
+    by_tier: Dict[str, int] = {}
+    for event in events:
+        by_city[event.get("city", "") or UNSPECIFIED] = by_city.get(event.get("city", "") or UNSPECIFIED, 0) + 1
+        by_tier[event.get("tier", "") or UNSPECIFIED] = by_tier.get(event.get("tier", "") or UNSPECIFIED, 0) + 1
+    needle = normalize_arabic(name)
+    gaps = [g for g in get_event_stats(kb).gaps if needle in normalize_arabic(g.responsible_org)]
+    return {
+        "organization": record,
+        "event_organizations": sorted({e.get("responsible_org", "") for e in events})[:10],
+        "events": len(events),
+        "by_city": by_city,
+        "by_tier": by_tier,
+        "events_with_gaps": len(gaps),
+    }
+
+
+def _tool_search_benchmarks(kb, args: Dict) -> Dict:
+    query = str(args.get("query", "")).strip()
+    benchmarks = kb.search_benchmarks(query) if query else kb.get_all_benchmarks()
+    return {
+        "results": [
+            {"id": b.get("id"), "name": b.get("name"), "name_en": b.get("name_en"), "country": b.get("country"),
+             "year": b.get("year"), "summary": b.get("overview", {}).get("summary", "")}
+            for b in benchmarks
+        ],
+        "available": [f"{b.get('id')}: {b.get('name')}" for b in kb.get_all_benchmarks()] if not benchmarks else [],
+    }
+
+
+_BENCHMARK_SECTIONS = {
+    "programming": "programming_model",
+    "governance": "governance",
+    "success_factors": "success_factors",
+    "challenges": "challenges_faced",
+    "lessons": "lessons_learned",
+    "legacy": "legacy",
+}
+
+
+def _tool_get_benchmark(kb, args: Dict) -> Dict:
+    benchmark = _find_benchmark(kb, str(args["benchmark"]))
+    if benchmark is None:
+        raise ValueError(f"لا توجد تجربة «{args['benchmark']}»؛ استخدم search_benchmarks لعرض المتاح")
+    sections = args.get("sections") or ["overview", "metrics", *_BENCHMARK_SECTIONS]
+
+    result = {"id": benchmark.get("id"), "name": benchmark.get("name"), "country": benchmark.get("country"),
+              "year": benchmark.get("year"), "duration_days": benchmark.get("duration_days")}
+    if "overview" in sections:
+        result["overview"] = benchmark.get("overview", {})
+    if "metrics" in sections:
+        cube = get_metrics_cube(kb)
+        case_id = benchmark.get("id", "")
+        metrics = {label: cube.values.get(key, {}).get(case_id) for key, (label, _) in METRIC_DEFINITIONS.items()}
+        metrics.update({label: cube.derived.get(key, {}).get(case_id) for key, (label, *_) in DERIVED_METRICS.items()})
+        result["metrics_usd"] = {label: value for label, value in metrics.items() if value is not None}
+    for section, key in _BENCHMARK_SECTIONS.items():
+        if section in sections and benchmark.get(key):
+            result[section] = benchmark[key]
+    return result
+
+
+def _tool_compare_benchmarks(kb, args: Dict) -> str:
+    ids = None
+    if args.get("benchmarks"):
+        found = [_find_benchmark(kb, str(ref)) for ref in args["benchmarks"]]
+        ids = [b.get("id") for b in found if b]
+        if not ids:
+            raise ValueError("لم يُعثر على أي من التجارب المطلوبة")
+    return format_metrics_tables(get_metrics_cube(kb), ids)
+
+
+def _tool_search_kpis(kb, args: Dict) -> Dict:
+    limit = _limit(args, 8)
+    ranker = get_kpi_ranker(kb)
+    category = str(args.get("category", "")).strip()
+    if category:
+        needle = normalize_arabic(category)
+        scores = {idx: score for score, idx in ranker.score(str(args["query"]))}
+        in_category = [idx for idx, k in enumerate(ranker.kpis) if needle in normalize_arabic(k.get("category_name", ""))]
+        kpis = [ranker.kpis[idx] for idx in sorted(in_category, key=lambda idx: -scores.get(idx, 0.0))]
+        matched = any(idx in scores for idx in in_category)
+    else:
+        kpis, matched = ranker.rank(str(args["query"]), top_k=limit, token_budget=10 ** 6)
+    fields = ("id", "name", "category_name", "definition", "measurement_method", "data_source",
+              "frequency", "target_example", "benchmark")
+    return {"matched": matched, "kpis": [{f: k.get(f) for f in fields if k.get(f)} for k in kpis[:limit]]}
+
+
+def _tool_list_kpi_categories(kb, args: Dict) -> Dict:
+    return {
+        "categories": [
+            {"name": c.get("name"), "name_en": c.get("name_en"), "description": c.get("description"),
+             "kpis": [k.get("name") for k in c.get("kpis", [])]}
+            for c in kb.get_all_kpi_categories()
+        ]
+    }
+
+
+TOOL_HANDLERS: Dict[str, Callable[[Any, Dict], Any]] = {
+    "filter_events": _tool_filter_events,
+    "aggregate_events": _tool_aggregate_events,
+    "event_timeline": _tool_event_timeline,
+    "events_missing_info": _tool_events_missing_info,
+    "lookup_organization": _tool_lookup_organization,
+    "search_benchmarks": _tool_search_benchmarks,
+    "get_benchmark": _tool_get_benchmark,
+    "compare_benchmarks": _tool_compare_benchmarks,
+    "search_kpis": _tool_search_kpis,
+    "list_kpi_categories": _tool_list_kpi_categories,
+}
+
+
+_tool_cache = LRUCache(TOOL_CACHE_SIZE)
+_tool_stats: Dict[str, ToolStats] = {}
+_stats_lock = threading.Lock()
+
+
+def _record(call: ToolCall):
+    with _stats_lock:
+        stats = _tool_stats.setdefault(call.name, ToolStats())
+        stats.calls += 1
+        stats.cached += call.cached
+        stats.errors += call.is_error
+        stats.total_seconds += call.seconds
+        stats.max_seconds = max(stats.max_seconds, call.seconds)
+
+
+def tool_latency_stats() -> Dict[str, Dict[str, float]]:
+    """Per-tool call counts and latency, plus the shared result cache's hit rate."""
+    with _stats_lock:
+        per_tool = {
+            name: {"calls": s.calls, "cached": s.cached, "errors": s.errors,
+                   "mean_ms": round(s.mean_ms, 2), "max_ms": round(1000 * s.max_seconds, 2)}
+            for name, s in _tool_stats.items()
+        }
+    return {"tools": per_tool, "cache": _tool_cache.stats()}
+
+
+def _truncate(content: str, max_tokens: Optional[int]) -> Tuple[str, bool]:
+    """Cut a result to the token budget, telling the model how much was left out."""
+    if not max_tokens or estimate_tokens(content) <= max_tokens:
+        return content, False
+    keep = max_tokens * CHARS_PER_TOKEN
+    note = f"\n… [اقتُطعت النتيجة: عُرض {keep:,} من {len(content):,} حرفاً — ضيّق المرشحات أو استخدم limit]"
+    return content[:keep] + note, True
+
+
+class KBToolExecutor:
+    """
+    منفّذ أدوات قاعدة المعرفة — يشغّل الاستدعاءات محلياً ويحفظ نتائجها
+
+    Results are cached process-wide on (tool, arguments, knowledge-base
+    version), so a lookup repeated in a later turn or another session costs
+    nothing until the data changes. Calls are safe to run concurrently.
+    """
+
+    def __init__(self, knowledge_base, tool_names: List[str], max_result_tokens: Optional[int] = None):
+        self.knowledge_base = knowledge_base
+        self.tools = [tool for tool in KB_TOOLS if tool["name"] in tool_names]
+        self._names = {tool["name"] for tool in self.tools}
+        self.max_result_tokens = max_result_tokens
+
+    @property
+    def data_version(self) -> Tuple[str, str, str]:
+        kb = self.knowledge_base
+        return kb.version, kb.benchmarks_version, kb.kpis_version
+
+    def execute(self, name: str, arguments: Dict) -> ToolCall:
+        """Run one tool call; failures are returned as error results for the model to see."""
+        call = self._execute(name, arguments)
+        _record(call)
+        return call
+
+    def _execute(self, name: str, arguments: Dict) -> ToolCall:
+        start = time.perf_counter()
+        if name not in self._names:
+            return ToolCall(name=name, arguments=arguments, content=f"أداة غير متاحة: {name}", is_error=True)
+
+        key = (name, json.dumps(arguments, ensure_ascii=False, sort_keys=True), self.data_version, self.max_result_tokens)
+        cached = _tool_cache.get(key)
+        if cached is not None:
+            content, truncated = cached
+            return ToolCall(name=name, arguments=arguments, content=content, cached=True, truncated=truncated,
+                            seconds=time.perf_counter() - start)
+
+        try:
+            result = TOOL_HANDLERS[name](self.knowledge_base, arguments)
+        except KeyError as e:
+            return ToolCall(name=name, arguments=arguments, content=f"معامل إلزامي مفقود: {e.args[0]}", is_error=True,
+                            seconds=time.perf_counter() - start)
+        except Exception as e:
+            return ToolCall(name=name, arguments=arguments, content=str(e), is_error=True,
+                            seconds=time.perf_counter() - start)
+
+        content = result if isinstance(result, str) else json.dumps(result, ensure_ascii=False, default=str)
+        content, truncated = _truncate(content, self.max_result_tokens)
+        _tool_cache.put(key, (content, truncated))
+        return ToolCall(name=name, arguments=arguments, content=content, truncated=truncated,
+                        seconds=time.perf_counter() - start)
+
+
+def tool_overview(knowledge_base, kinds: Tuple[str, ...] = ("events",)) -> str:
+    """A few lines that tell the model what data exists, so it knows what to ask the tools for."""
+    lines = []
+    if "events" in kinds:
+        stats = get_event_stats(knowledge_base)
+        lines.append(f"- الفعاليات: {stats.total} فعالية في {len(stats.by_city)} مدن "
+                     f"({'، '.join(f'{c} {n}' for c, n in stats.top(stats.by_city, len(stats.by_city)))})")
+        lines.append(f"- التصنيفات: {'، '.join(stats.by_tier)} — الأنواع: {'، '.join(stats.by_type)}"
+                     f" — حالات التضمين: {'، '.join(stats.by_inclusion)}")
+        lines.append(f"- فعاليات تنقصها حقول إلزامية: {len(stats.gaps)} — الحقول: {'، '.join(FIELD_LABELS.values())}")
+    if "benchmarks" in kinds:
+        cases = "، ".join(f"{b.get('id')}: {b.get('name')} ({b.get('year')})" for b in knowledge_base.get_all_benchmarks())
+        lines.append(f"- التجارب الدولية: {cases}")
+    if "kpis" in kinds:
+        categories = knowledge_base.get_all_kpi_categories()
+        lines.append(f"- مكتبة المؤشرات: {len(knowledge_base.get_all_kpis())} مؤشراً في {len(categories)} فئات "
+                     f"({'، '.join(c.get('name', '') for c in categories)})")
+    return "\n".join(lines)
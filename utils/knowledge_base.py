@@ -3,10 +3,17 @@
 """
 
 import csv
+import hashlib
 import json
+import threading
+from datetime import datetime
 from pathlib import Path
 from typing import List, Dict, Optional
 
+from .cache import LRUCache
+from .benchmark_metrics import format_metrics_tables, get_metrics_cube
+from .event_diff import EventDiff, index_events, diff_indexes
+
 
 # CSV files for the 5 target cities
 CITY_CSV_FILES = {
@@ -17,6 +24,44 @@ CITY_CSV_FILES = {
     "حاضرة الدمام": "dammam_events.csv",
 }
 
+# Saved dataset versions live here (git-ignored)
+SNAPSHOT_DIR_NAME = "snapshots"
+
+# CSV column header -> event field
+CSV_FIELD_MAP = {
+    "اسم الفعالية": "name",
+    "الجهة المسؤولة": "responsible_org",
+    "وصف الفعالية": "description",
+    "تاريخ البداية": "start_date",
+    "تاريخ النهاية": "end_date",
+    "عدد الأيام": "duration_days",
+    "التصنيف": "tier",
+    "النوع": "type",
+    "المدينة": "city",
+    "الفئة الفرعية": "subcategory",
+    "حالة الإضافة": "addition_status",
+    "التمويل": "funding",
+    "التواصل": "communication",
+    "فترة الإقامة": "stay_period",
+    "حالة التضمين": "inclusion_status",
+    "سبب الاستبعاد": "exclusion_reason",
+}
+
+
+def row_to_event(row: Dict, default_city: str = "") -> Optional[Dict]:
+    """Map a raw CSV row to an event dict; rows without an event name are skipped."""
+    event = {field: (row.get(header) or "").strip() for header, field in CSV_FIELD_MAP.items()}
+    if not event["name"]:
+        return None
+    if not event["city"]:
+        event["city"] = default_city
+    return event
+
+
+# Shared across instances, including knowledge bases built over other data directories
+_index_cache = LRUCache(4)
+_diff_cache = LRUCache(8)
+
 
 class KnowledgeBase:
     """
@@ -35,6 +80,10 @@ class KnowledgeBase:
         self._benchmarks_data: Dict = {}
         self._kpis_data: Dict = {}
         self._organizations_data: Dict = {}
+        self.version: str = ""
+        self.benchmarks_version: str = ""
+        self.kpis_version: str = ""
+        self._city_versions: Optional[Dict[str, str]] = None
 
         self._load_all_data()
 
@@ -43,18 +92,22 @@ class KnowledgeBase:
         try:
             # Load events from CSV files
             self._events_data = self._load_events_from_csv()
+            self.version = self._compute_version(self._events_data)
+            self._city_versions = None
 
             # Load benchmarks
             benchmarks_path = self.data_dir / "benchmarks.json"
             if benchmarks_path.exists():
                 with open(benchmarks_path, "r", encoding="utf-8") as f:
                     self._benchmarks_data = json.load(f)
+                self.benchmarks_version = self._compute_version(self.get_all_benchmarks())
 
             # Load KPIs
             kpis_path = self.data_dir / "kpi_library.json"
             if kpis_path.exists():
                 with open(kpis_path, "r", encoding="utf-8") as f:
                     self._kpis_data = json.load(f)
+                self.kpis_version = self._compute_version(self.get_all_kpis())
 
             # Load organizations
             orgs_path = self.data_dir / "organizations.json"
@@ -79,34 +132,99 @@ class KnowledgeBase:
                 with open(csv_path, "r", encoding="utf-8") as f:
                     reader = csv.DictReader(f)
                     for row in reader:
-                        event_name = (row.get("اسم الفعالية") or "").strip()
-                        if not event_name:
+                        event = row_to_event(row, default_city=city_name)
+                        if event is None:
                             continue
-
-                        event = {
-                            "name": event_name,
-                            "responsible_org": (row.get("الجهة المسؤولة") or "").strip(),
-                            "description": (row.get("وصف الفعالية") or "").strip(),
-                            "start_date": (row.get("تاريخ البداية") or "").strip(),
-                            "end_date": (row.get("تاريخ النهاية") or "").strip(),
-                            "duration_days": (row.get("عدد الأيام") or "").strip(),
-                            "tier": (row.get("التصنيف") or "").strip(),
-                            "type": (row.get("النوع") or "").strip(),
-                            "city": (row.get("المدينة") or city_name).strip(),
-                            "subcategory": (row.get("الفئة الفرعية") or "").strip(),
-                            "addition_status": (row.get("حالة الإضافة") or "").strip(),
-                            "funding": (row.get("التمويل") or "").strip(),
-                            "communication": (row.get("التواصل") or "").strip(),
-                            "stay_period": (row.get("فترة الإقامة") or "").strip(),
-                            "inclusion_status": (row.get("حالة التضمين") or "").strip(),
-                            "exclusion_reason": (row.get("سبب الاستبعاد") or "").strip(),
-                        }
                         all_events.append(event)
             except Exception as e:
                 print(f"Error loading {csv_filename}: {e}")
 
         return all_events
 
+    @staticmethod
+    def _compute_version(events: List[Dict]) -> str:
+        """Content hash of the events data, used as a cache key by derived analytics."""
+        digest = hashlib.sha1()
+        for event in events:
+            digest.update(json.dumps(event, ensure_ascii=False, sort_keys=True).encode("utf-8"))
+        return digest.hexdigest()[:16]
+
+    def get_city_version(self, city: str) -> str:
+        """Content hash of one city's events; unchanged cities keep their version across reloads."""
+        if self._city_versions is None:
+            by_city: Dict[str, List[Dict]] = {}
+            for event in self._events_data:
+                by_city.setdefault(event.get("city", ""), []).append(event)
+            self._city_versions = {c: self._compute_version(events) for c, events in by_city.items()}
+        return self._city_versions.get(city, "")
+
+    # ==================== Snapshots & Diffs ====================
+
+    @property
+    def snapshot_dir(self) -> Path:
+        return self.data_dir / SNAPSHOT_DIR_NAME
+
+    def get_event_index(self) -> Dict[str, Dict]:
+        """Stable event key -> {hash, event} for the current data, computed once per version."""
+        return _index_cache.get_or_compute(self.version, lambda: index_events(self._events_data))
+
+    def list_snapshots(self) -> List[Dict]:
+        """Saved snapshots, oldest first: {path, created_at, version}."""
+        if not self.snapshot_dir.exists():
+            return []
+        snapshots = []
+        for path in sorted(self.snapshot_dir.glob("*.json")):
+            stamp, _, version = path.stem.partition("_")
+            snapshots.append({"path": path, "created_at": stamp, "version": version})
+        return snapshots
+
+    def save_snapshot(self, label: str = "") -> Path:
+        """Write the current events (keyed and hashed) to a new snapshot file."""
+        self.snapshot_dir.mkdir(parents=True, exist_ok=True)
+        created_at = datetime.now()
+        path = self.snapshot_dir / f"{created_at:%Y%m%d-%H%M%S}_{self.version}.json"
+        payload = {
+            "version": self.version,
+            "created_at": created_at.isoformat(timespec="seconds"),
+            "label": label,
+            "rows": self.get_event_index(),
+        }
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(payload, f, ensure_ascii=False)
+        return path
+
+    def ensure_snapshot(self, label: str = "") -> Optional[Path]:
+        """Save a snapshot unless the current version is already saved; returns the new path if any."""
+        if any(s["version"] == self.version for s in self.list_snapshots()):
+            return None
+        return self.save_snapshot(label)
+
+    def diff_against_snapshot(self, path: Path) -> EventDiff:
+        """Added / removed / modified events between a saved snapshot and the current data."""
+        with open(path, "r", encoding="utf-8") as f:
+            snapshot = json.load(f)
+        diff = diff_indexes(snapshot.get("rows", {}), self.get_event_index())
+        diff.base_version = snapshot.get("version", "")
+        diff.base_label = snapshot.get("label", "")
+        diff.base_created_at = snapshot.get("created_at", "")
+        diff.current_version = self.version
+        return diff
+
+    def get_changes_since_previous(self) -> EventDiff:
+        """
+        Diff against the latest snapshot of a different dataset version.
+
+        Returns an empty diff without base_version when no earlier version was saved.
+        """
+        previous = [s for s in self.list_snapshots() if s["version"] != self.version]
+        if not previous:
+            return EventDiff(current_version=self.version)
+        base = previous[-1]
+        return _diff_cache.get_or_compute(
+            (base["version"], self.version),
+            lambda: self.diff_against_snapshot(base["path"])
+        )
+
     # ==================== Events Methods ====================
 
     def get_all_events(self) -> List[Dict]:
@@ -179,6 +297,10 @@ class KnowledgeBase:
                 return benchmark
         return None
 
+    def get_benchmark_version(self, benchmark: Dict) -> str:
+        """Content hash of one benchmark case; editing a case changes only its own version."""
+        return self._compute_version([benchmark])
+
     def get_benchmark_by_name(self, name: str) -> Optional[Dict]:
         name_lower = name.lower()
         for benchmark in self.get_all_benchmarks():
@@ -209,16 +331,9 @@ class KnowledgeBase:
 
     def get_all_benchmarks_summary(self) -> str:
         benchmarks = self.get_all_benchmarks()
-        summary_parts = []
-        for b in benchmarks:
-            metrics = b.get("key_metrics", {})
-            summary_parts.append(f"""
-### {b.get('name')} ({b.get('year')}) - {b.get('country')}
-- إجمالي الفعاليات: {metrics.get('total_events', 'غير متاح')}
-- الزوار: {metrics.get('total_visitors', 'غير متاح')}
-- الأثر الاقتصادي: {metrics.get('economic_impact_usd', 'غير متاح')}
-- نمو السياحة: {metrics.get('tourism_increase_percent', 'غير متاح')}%
-""")
+        summary_parts = [f"- {b.get('name')} ({b.get('year')}) - {b.get('country')}" for b in benchmarks]
+        summary_parts.append("")
+        summary_parts.append(format_metrics_tables(get_metrics_cube(self)))
         return "\n".join(summary_parts)
 
     # ==================== KPIs Methods ====================
@@ -321,3 +436,17 @@ class KnowledgeBase:
 {self.get_kpis_summary()}
 """
         return context
+
+
+_shared_knowledge_base: Optional[KnowledgeBase] = None
+_shared_lock = threading.Lock()
+
+
+def get_shared_knowledge_base() -> KnowledgeBase:
+    """The knowledge base over the bundled data, parsed once per process and read by every agent."""
+    global _shared_knowledge_base
+    if _shared_knowledge_base is None:
+        with _shared_lock:
+            if _shared_knowledge_base is None:
+                _shared_knowledge_base = KnowledgeBase()
+    return _shared_knowledge_base
@@ -0,0 +1,209 @@
+"""
+ترتيب مؤشرات الأداء حسب صلتها بطلب المستخدم ضمن ميزانية محددة من الرموز
+"""
+
+import math
+from collections import Counter
+from typing import Callable, Dict, List, Optional, Tuple
+
+from config import KPI_RANKER_CACHE_SIZE
+from .cache import LRUCache
+from .text import estimate_tokens, light_stem, tokenize
+
+
+# Fields indexed for the lexical score and their repetition weight (BM25F-style)
+KPI_FIELDS = {
+    "name": 3.0,
+    "category_name": 2.0,
+    "category_description": 1.0,
+    "definition": 1.5,
+    "measurement_method": 1.0,
+    "data_source": 0.5,
+}
+
+# BM25 parameters
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Credit for a query word that only shares a leading stem with an indexed word
+# ("الحاضرين" -> "حضور" does not match, "الاقتصادي" -> "اقتصاد" does)
+PREFIX_MATCH_WEIGHT = 0.5
+PREFIX_LENGTH = 4
+
+# Single-letter clitics tried when a query word is not indexed as written ("لرضا" -> "رضا")
+_CLITICS = ("و", "ب", "ل", "ف", "ك")
+
+# Extra score for every KPI of a category whose name the request matches closely
+CATEGORY_BOOST = 1.0
+CATEGORY_MATCH_SHARE = 0.5
+
+# Request vocabulary that says what to do rather than which KPIs (stemmed, normalized)
+KPI_QUERY_STOPWORDS = frozenset({
+    "موشرات", "موشر", "اداء", "kpi", "kpis",
+    "اقترح", "اقتراح", "قدم", "حدد", "تحديد", "اعرض", "صمم", "تصميم", "اطار",
+    "مناسبه", "مقترحه", "رييسيه", "احتفاليه", "احتفال", "فعاليات",
+    "suggest", "propose", "recommend", "design", "framework", "metrics", "indicators",
+})
+
+# Matched KPIs scoring below this share of the best match are left out (incidental word hits)
+RELATIVE_SCORE_FLOOR = 0.25
+
+
+def _prefix(token: str) -> Optional[str]:
+    return token[:PREFIX_LENGTH] if len(token) >= PREFIX_LENGTH + 1 else None
+
+
+class KPIRanker:
+    """
+    مرتّب مؤشرات الأداء — فهرس معجمي عربي (BM25 على الحقول) مع تعزيز الفئة
+
+    Built once per KPI library version; ranking a request costs one pass over
+    the query words and the postings they hit.
+    """
+
+    def __init__(self, kpis: List[Dict], categories: List[Dict], version: str = ""):
+        self.kpis = kpis
+        self.version = version
+        # Category description and English name are indexed with each of its KPIs
+        descriptions = {c.get("name", ""): f"{c.get('description', '')} {c.get('name_en', '')}" for c in categories}
+
+        # Weighted term frequencies per KPI over the indexed fields
+        term_freqs: List[Counter] = []
+        doc_freq: Counter = Counter()
+        for kpi in kpis:
+            fields = dict(kpi, category_description=descriptions.get(kpi.get("category_name", ""), ""))
+            tf: Counter = Counter()
+            for field, weight in KPI_FIELDS.items():
+                for token in tokenize(str(fields.get(field, "")), drop_stopwords=True):
+                    tf[token] += weight
+            term_freqs.append(tf)
+            doc_freq.update(tf.keys())
+
+        n_docs = max(len(kpis), 1)
+        lengths = [sum(tf.values()) for tf in term_freqs]
+        avg_length = (sum(lengths) / len(lengths)) if lengths else 1.0
+        self._idf = {t: math.log(1 + (n_docs - df + 0.5) / (df + 0.5)) for t, df in doc_freq.items()}
+
+        # Inverted index: token -> [(kpi index, BM25 term weight)]
+        self._index: Dict[str, List[Tuple[int, float]]] = {}
+        for idx, tf in enumerate(term_freqs):
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * lengths[idx] / avg_length)
+            for token, count in tf.items():
+                weight = self._idf[token] * count * (BM25_K1 + 1) / (count + norm)
+                self._index.setdefault(token, []).append((idx, weight))
+
+        # Leading-stem map for words the light stemmer leaves inflected
+        self._prefixes: Dict[str, List[str]] = {}
+        for token in self._index:
+            key = _prefix(token)
+            if key:
+                self._prefixes.setdefault(key, []).append(token)
+
+        # Category name vocabulary for the category boost
+        self._category_terms = {
+            c.get("name", ""): set(tokenize(c.get("name", ""), drop_stopwords=True)) - KPI_QUERY_STOPWORDS
+            for c in categories
+        }
+
+    def _query_terms(self, query: str) -> Dict[str, float]:
+        """Index terms the query hits, with exact words at full weight and leading-stem matches reduced."""
+        terms: Dict[str, float] = {}
+        for token in tokenize(query, drop_stopwords=True):
+            if token in KPI_QUERY_STOPWORDS:
+                continue
+            if token not in self._index and token.startswith(_CLITICS) and len(token) > 3:
+                token = light_stem(token[1:])
+            if token in self._index:
+                terms[token] = max(terms.get(token, 0.0), 1.0)
+                continue
+            for match in self._prefixes.get(_prefix(token) or "", []):
+                if match not in KPI_QUERY_STOPWORDS:
+                    terms[match] = max(terms.get(match, 0.0), PREFIX_MATCH_WEIGHT)
+        return terms
+
+    def matched_categories(self, query: str) -> List[str]:
+        """Categories whose name words the request mostly covers."""
+        terms = self._query_terms(query)
+        return [
+            name for name, words in self._category_terms.items()
+            if words and len(words & terms.keys()) / len(words) >= CATEGORY_MATCH_SHARE
+        ]
+
+    def score(self, query: str) -> List[Tuple[float, int]]:
+        """Score all KPIs against the query; returns (score, index) pairs with score > 0."""
+        terms = self._query_terms(query)
+        scores: Dict[int, float] = {}
+        for token, q_weight in terms.items():
+            for idx, weight in self._index.get(token, []):
+                scores[idx] = scores.get(idx, 0.0) + q_weight * weight
+
+        categories = set(self.matched_categories(query)) if terms else set()
+        if categories:
+            for idx, kpi in enumerate(self.kpis):
+                if kpi.get("category_name") in categories:
+                    scores[idx] = scores.get(idx, 0.0) + CATEGORY_BOOST
+
+        scored = [(score, idx) for idx, score in scores.items() if score > 0]
+        scored.sort(key=lambda item: (-item[0], item[1]))
+        return scored
+
+    def _fallback_order(self) -> List[int]:
+        """Round-robin across categories so an unmatched request still sees every category."""
+        by_category: Dict[str, List[int]] = {}
+        for idx, kpi in enumerate(self.kpis):
+            by_category.setdefault(kpi.get("category_name", ""), []).append(idx)
+        queues = list(by_category.values())
+        order = []
+        for position in range(max((len(q) for q in queues), default=0)):
+            for queue in queues:
+                if position < len(queue):
+                    order.append(queue[position])
+        return order
+
+    def rank(
+        self,
+        query: str,
+        top_k: int = 8,
+        token_budget: int = 1500,
+        row_formatter: Optional[Callable[[Dict], str]] = None
+    ) -> Tuple[List[Dict], bool]:
+        """
+        Return the top-k KPIs for the query that fit within the token budget.
+
+        The second value is True when the KPIs were ranked by relevance and False
+        when nothing in the query matched and one KPI per category was taken in turn.
+        """
+        scored = self.score(query) if query else []
+        ranked = [idx for score, idx in scored if score >= scored[0][0] * RELATIVE_SCORE_FLOOR]
+        matched = bool(ranked)
+        if not matched:
+            ranked = self._fallback_order()
+
+        selected = []
+        used = 0
+        for idx in ranked:
+            if len(selected) >= top_k:
+                break
+            kpi = self.kpis[idx]
+            cost = estimate_tokens(row_formatter(kpi) if row_formatter else str(kpi))
+            if used + cost > token_budget:
+                break
+            selected.append(kpi)
+            used += cost
+
+        return selected, matched
+
+
+_ranker_cache = LRUCache(KPI_RANKER_CACHE_SIZE)
+
+
+def get_kpi_ranker(knowledge_base) -> KPIRanker:
+    """Return the KPI ranker for a knowledge base, built once per KPI library version."""
+    return _ranker_cache.get_or_compute(
+        knowledge_base.kpis_version,
+        lambda: KPIRanker(
+            knowledge_base.get_all_kpis(),
+            knowledge_base.get_all_kpi_categories(),
+            knowledge_base.kpis_version
+        )
+    )
@@ -0,0 +1,285 @@
+"""
+محرك قواعد فحص الجودة لبيانات الفعاليات — لجنة الفعاليات
+"""
+
+import time
+from typing import Callable, Dict, List, Optional
+from pydantic import BaseModel, Field
+
+from config import ENGINE_CACHE_SIZE
+from .cache import LRUCache
+from .event_analytics import FIELD_LABELS, REQUIRED_FIELDS, UNSPECIFIED
+from .event_dates import parse_event_date
+from .text import normalize_arabic
+
+
+SEVERITY_HIGH = "عالية"
+SEVERITY_MEDIUM = "متوسطة"
+SEVERITY_LOW = "منخفضة"
+
+# Declarative rule set; compiled once into validators by compile_rules()
+QUALITY_RULES = [
+    {"id": "required_fields", "kind": "required", "fields": REQUIRED_FIELDS,
+     "label": "حقول مطلوبة ناقصة", "severity": SEVERITY_HIGH},
+    {"id": "start_date_format", "kind": "date", "field": "start_date",
+     "label": "تاريخ بداية غير قابل للقراءة", "severity": SEVERITY_HIGH},
+    {"id": "end_date_format", "kind": "date", "field": "end_date",
+     "label": "تاريخ نهاية غير قابل للقراءة", "severity": SEVERITY_HIGH},
+    {"id": "date_order", "kind": "date_order", "start": "start_date", "end": "end_date",
+     "label": "تاريخ النهاية يسبق تاريخ البداية", "severity": SEVERITY_HIGH},
+    {"id": "duration_span", "kind": "duration", "field": "duration_days", "start": "start_date", "end": "end_date",
+     "tolerance": 1, "label": "عدد الأيام لا يطابق الفترة بين التاريخين", "severity": SEVERITY_MEDIUM},
+    {"id": "tier_domain", "kind": "enum", "field": "tier", "allowed": ["Marquee", "Tier 1", "Tier 2", "Tier 3"],
+     "label": "تصنيف خارج القيم المعتمدة", "severity": SEVERITY_MEDIUM},
+    {"id": "type_domain", "kind": "enum", "field": "type", "allowed": ["أعمال", "ترفيه"],
+     "label": "نوع خارج القيم المعتمدة", "severity": SEVERITY_MEDIUM},
+    {"id": "inclusion_domain", "kind": "enum", "field": "inclusion_status",
+     "allowed": ["تضمن", "لن تضمن", "تحسب بدون تضمين"],
+     "label": "حالة تضمين خارج القيم المعتمدة", "severity": SEVERITY_MEDIUM},
+    {"id": "duplicate_event", "kind": "duplicate", "key": ["city", "name", "start_date"], "normalize": ["name"],
+     "label": "فعالية مكررة", "severity": SEVERITY_MEDIUM},
+]
+
+
+class QualityIssue(BaseModel):
+    """A single rule violation on one event."""
+    rule_id: str
+    event: str
+    city: str
+    responsible_org: str = ""
+    type: str
+    details: str
+    severity: str
+
+
+class RuleStats(BaseModel):
+    """Per-rule counters for one validation run."""
+    rule_id: str
+    label: str
+    issues: int = 0
+    seconds: float = 0.0
+
+
+class ValidationReport(BaseModel):
+    """Result of validating a batch of events."""
+    checked: int = 0
+    seconds: float = 0.0
+    issues: List[QualityIssue] = Field(default_factory=list)
+    rule_stats: List[RuleStats] = Field(default_factory=list)
+
+    def issues_by_city(self) -> Dict[str, int]:
+        counts: Dict[str, int] = {}
+        for issue in self.issues:
+            counts[issue.city] = counts.get(issue.city, 0) + 1
+        return counts
+
+
+# A compiled check takes (event, state) and returns issue details or None
+Check = Callable[[Dict, Dict], Optional[str]]
+
+
+class CompiledRule:
+    """A rule definition bound to a fast validator function."""
+
+    def __init__(self, rule: Dict, check: Check):
+        self.id = rule["id"]
+        self.label = rule["label"]
+        self.severity = rule["severity"]
+        self.check = check
+
+
+def _compile_required(rule: Dict) -> Check:
+    fields = tuple(rule["fields"])
+    labels = {f: FIELD_LABELS.get(f, f) for f in fields}
+
+    def check(event: Dict, state: Dict) -> Optional[str]:
+        missing = [labels[f] for f in fields if not event.get(f)]
+        return ", ".join(missing) if missing else None
+    return check
+
+
+def _compile_date(rule: Dict) -> Check:
+    field = rule["field"]
+
+    def check(event: Dict, state: Dict) -> Optional[str]:
+        value = event.get(field)
+        if value and parse_event_date(value) is None:
+            return f"{FIELD_LABELS.get(field, field)}: {value}"
+        return None
+    return check
+
+
+def _compile_date_order(rule: Dict) -> Check:
+    start_field, end_field = rule["start"], rule["end"]
+
+    def check(event: Dict, state: Dict) -> Optional[str]:
+        start = parse_event_date(event.get(start_field, ""))
+        end = parse_event_date(event.get(end_field, ""))
+        if start and end and end < start:
+            return f"{event.get(start_field)} ← {event.get(end_field)}"
+        return None
+    return check
+
+
+def _compile_duration(rule: Dict) -> Check:
+    field, start_field, end_field = rule["field"], rule["start"], rule["end"]
+    tolerance = rule.get("tolerance", 0)
+
+    def check(event: Dict, state: Dict) -> Optional[str]:
+        value = (event.get(field) or "").strip()
+        if not value.isdigit():
+            return None
+        start = parse_event_date(event.get(start_field, ""))
+        end = parse_event_date(event.get(end_field, ""))
+        if not start or not end or end < start:
+            return None
+        span = (end - start).days + 1
+        if abs(int(value) - span) > tolerance:
+            return f"المسجل {value} يوم — الفترة {span} يوم"
+        return None
+    return check
+
+
+def _compile_enum(rule: Dict) -> Check:
+    field = rule["field"]
+    allowed = frozenset(rule["allowed"])
+
+    def check(event: Dict, state: Dict) -> Optional[str]:
+        value = event.get(field)
+        if value and value not in allowed:
+            return f"{FIELD_LABELS.get(field, field)}: {value}"
+        return None
+    return check
+
+
+def _compile_duplicate(rule: Dict) -> Check:
+    # Free-text fields get full Arabic normalization; coded fields only whitespace folding
+    normalized = set(rule.get("normalize", []))
+    key_fields = tuple((f, f in normalized) for f in rule["key"])
+    # Rows are only compared when at least one free-text key field is present
+    text_positions = [i for i, (_, fold) in enumerate(key_fields) if fold] or list(range(len(key_fields)))
+    state_key = f"seen:{rule['id']}"
+
+    def check(event: Dict, state: Dict) -> Optional[str]:
+        key = tuple(
+            " ".join((normalize_arabic(event.get(f, "")) if fold else event.get(f, "")).split())
+            for f, fold in key_fields
+        )
+        if not any(key[i] for i in text_positions):
+            return None
+        seen = state.setdefault(state_key, {})
+        if key in seen:
+            return f"مطابقة للسجل رقم {seen[key] + 1}"
+        seen[key] = state.get("offset", 0) + state.get("position", 0)
+        return None
+    return check
+
+
+RULE_COMPILERS = {
+    "required": _compile_required,
+    "date": _compile_date,
+    "date_order": _compile_date_order,
+    "duration": _compile_duration,
+    "enum": _compile_enum,
+    "duplicate": _compile_duplicate,
+}
+
+
+def compile_rules(rules: List[Dict]) -> List[CompiledRule]:
+    """Compile declarative rule definitions into validators."""
+    compiled = []
+    for rule in rules:
+        compiler = RULE_COMPILERS.get(rule["kind"])
+        if compiler is None:
+            raise ValueError(f"Unknown quality rule kind: {rule['kind']}")
+        compiled.append(CompiledRule(rule, compiler(rule)))
+    return compiled
+
+
+class QualityRuleEngine:
+    """
+    محرك قواعد الجودة — يتحقق من دفعة كاملة أو من صفوف جديدة تضاف إلى دفعة سابقة
+    """
+
+    def __init__(self, rules: List[Dict] = None):
+        self.rules = compile_rules(rules if rules is not None else QUALITY_RULES)
+        self._state: Dict = {}
+        self._validated = 0
+        self.last_report: Optional[ValidationReport] = None
+
+    def _run(self, events: List[Dict], state: Dict, offset: int) -> ValidationReport:
+        """Apply every rule over the events, rule by rule, timing each one."""
+        report = ValidationReport(checked=len(events))
+        run_start = time.perf_counter()
+        state["offset"] = offset
+
+        for rule in self.rules:
+            rule_start = time.perf_counter()
+            check = rule.check
+            found = 0
+            for position, event in enumerate(events):
+                state["position"] = position
+                details = check(event, state)
+                if details is None:
+                    continue
+                found += 1
+                report.issues.append(QualityIssue(
+                    rule_id=rule.id,
+                    event=event.get("name", "") or "بدون اسم",
+                    city=event.get("city", "") or UNSPECIFIED,
+                    responsible_org=event.get("responsible_org", "") or UNSPECIFIED,
+                    type=rule.label,
+                    details=details,
+                    severity=rule.severity,
+                ))
+            report.rule_stats.append(RuleStats(
+                rule_id=rule.id,
+                label=rule.label,
+                issues=found,
+                seconds=time.perf_counter() - rule_start,
+            ))
+
+        report.seconds = time.perf_counter() - run_start
+        return report
+
+    def validate(self, events: List[Dict]) -> ValidationReport:
+        """Validate a full batch, replacing any previous batch state."""
+        self._state = {}
+        self._validated = len(events)
+        self.last_report = self._run(events, self._state, offset=0)
+        return self.last_report
+
+    def validate_incremental(self, new_events: List[Dict], commit: bool = False) -> ValidationReport:
+        """
+        Validate newly received rows against the last full batch.
+
+        Cross-row rules (duplicates) see the earlier batch. With commit=False the
+        engine state is left untouched so the same upload can be re-checked.
+        """
+        state = self._state if commit else {k: (dict(v) if isinstance(v, dict) else v) for k, v in self._state.items()}
+        report = self._run(new_events, state, offset=self._validated)
+        if commit:
+            self._validated += len(new_events)
+        return report
+
+
+_engine_cache = LRUCache(ENGINE_CACHE_SIZE)
+
+
+def _validated_engine(events: List[Dict]) -> QualityRuleEngine:
+    engine = QualityRuleEngine()
+    engine.validate(events)
+    return engine
+
+
+def get_rule_engine(knowledge_base) -> QualityRuleEngine:
+    """
+    Return an engine that has validated the knowledge base, once per data version.
+
+    The engine is shared: callers read last_report and may run
+    validate_incremental() without commit, which leaves the shared state intact.
+    """
+    return _engine_cache.get_or_compute(
+        knowledge_base.version,
+        lambda: _validated_engine(knowledge_base.get_all_events())
+    )
@@ -0,0 +1,353 @@
+"""
+مراجعة المستندات الطويلة على أجزاء — تقسيم حسب الأقسام ومراجعة متوازية ودمج الملاحظات في قائمة مرتبة
+"""
+
+import hashlib
+import json
+import re
+from typing import Callable, Dict, List, Optional, Tuple
+from pydantic import BaseModel, Field
+
+from config import REVIEW_CACHE_SIZE
+from .cache import LRUCache
+from .concurrency import map_concurrently
+from .text import tokenize
+
+
+# Findings whose point words overlap at least this much are treated as the same finding
+DUPLICATE_OVERLAP = 0.6
+
+# Sections shorter than this are packed with their neighbours rather than reviewed alone
+MIN_CHUNK_CHARS = 800
+
+SEVERITY_LABELS = {3: "عالية", 2: "متوسطة", 1: "منخفضة"}
+
+# Sections named next to a merged finding before the rest are summarized as a count
+MAX_SECTIONS_SHOWN = 3
+
+_HEADING_RE = re.compile(r"^\s{0,3}#{1,6}\s+(.+?)\s*#*\s*$")
+_SENTENCE_END_RE = re.compile(r"(?<=[.!؟?؛])\s+")
+
+CHUNK_REVIEW_PROMPT = """راجع الجزء التالي من مستند أطول ({position}). ركّز على هذا الجزء وحده ولا تفترض محتوى الأجزاء الأخرى.
+{focus}{request}
+**الجزء: {heading}**
+{text}
+
+---
+أعد كائن JSON فقط بالشكل التالي دون أي نص آخر:
+{{"rating": <تقييم الجزء من 1 إلى 5>,
+  "strengths": ["نقطة قوة في جملة واحدة", ...],
+  "issues": [{{"point": "المشكلة في جملة واحدة", "severity": <3 عالية أو 2 متوسطة أو 1 منخفضة>, "suggestion": "اقتراح محدد"}}, ...]}}
+اذكر نقطتين إلى ثلاث نقاط قوة، ومن مشكلة إلى أربع مشكلات، مرتبة حسب الأهمية."""
+
+
+class Chunk(BaseModel):
+    """A section-aligned slice of the document under review."""
+    index: int
+    heading: str
+    text: str
+    digest: str
+
+
+class Finding(BaseModel):
+    """One strength or issue; merged findings list every section that raised them."""
+    kind: str = Field(description="strength or issue")
+    point: str
+    severity: int = 1
+    suggestion: str = ""
+    sections: List[str] = Field(default_factory=list)
+    first_chunk: int = 0
+
+    @property
+    def mentions(self) -> int:
+        return len(self.sections)
+
+
+class ChunkReview(BaseModel):
+    """Parsed review of one chunk."""
+    chunk_index: int
+    heading: str
+    chars: int
+    rating: Optional[float] = None
+    findings: List[Finding] = Field(default_factory=list)
+    notes: str = Field(default="", description="Raw model text when it did not return valid JSON")
+    input_tokens: int = 0
+    output_tokens: int = 0
+    from_cache: bool = False
+    error: Optional[str] = None
+
+
+class ChunkedReview(BaseModel):
+    """Merged outcome of a chunked review."""
+    chunks: List[ChunkReview] = Field(default_factory=list)
+    strengths: List[Finding] = Field(default_factory=list)
+    issues: List[Finding] = Field(default_factory=list)
+    rating: Optional[float] = None
+
+    @property
+    def cached_count(self) -> int:
+        return sum(1 for c in self.chunks if c.from_cache)
+
+    @property
+    def failed(self) -> List[ChunkReview]:
+        return [c for c in self.chunks if c.error]
+
+
+def _digest(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:16]
+
+
+def _split_oversized(text: str, max_chars: int) -> List[str]:
+    """Split a long section on paragraphs, then sentences, then hard cuts."""
+    pieces: List[str] = []
+    for paragraph in re.split(r"\n\s*\n", text):
+        if len(paragraph) <= max_chars:
+            pieces.append(paragraph)
+            continue
+        for sentence in _SENTENCE_END_RE.split(paragraph):
+            pieces.extend(sentence[i:i + max_chars] for i in range(0, len(sentence), max_chars))
+
+    parts, current = [], ""
+    for piece in pieces:
+        if current and len(current) + len(piece) + 2 > max_chars:
+            parts.append(current)
+            current = ""
+        current = f"{current}\n\n{piece}" if current else piece
+    if current.strip():
+        parts.append(current)
+    return parts
+
+
+def chunk_document(text: str, max_chars: int) -> List[Chunk]:
+    """
+    Split a document into chunks of at most max_chars aligned to markdown headings.
+
+    Oversized sections are split on paragraphs; short neighbouring sections are
+    packed together so every chunk is worth a model call.
+    """
+    sections: List[Tuple[str, str]] = []
+    heading, lines = "", []
+    for line in text.splitlines():
+        match = _HEADING_RE.match(line)
+        if match and lines:
+            sections.append((heading, "\n".join(lines).strip()))
+            lines = []
+        if match:
+            heading = match.group(1)
+        lines.append(line)
+    if lines:
+        sections.append((heading, "\n".join(lines).strip()))
+
+    pieces: List[Tuple[str, str]] = []
+    for heading, body in sections:
+        if not body:
+            continue
+        if len(body) <= max_chars:
+            pieces.append((heading, body))
+        else:
+            parts = _split_oversized(body, max_chars)
+            pieces.extend((heading if i == 0 else f"{heading} (تابع)", part) for i, part in enumerate(parts))
+
+    chunks: List[Chunk] = []
+    current_heading, current = "", ""
+    for heading, body in pieces:
+        fits = len(current) + len(body) + 2 <= max_chars
+        if current and (not fits or len(current) >= MIN_CHUNK_CHARS):
+            chunks.append(Chunk(index=len(chunks), heading=current_heading, text=current, digest=_digest(current)))
+            current_heading, current = "", ""
+        if not current:
+            current_heading = heading
+        current = f"{current}\n\n{body}" if current else body
+    if current:
+        chunks.append(Chunk(index=len(chunks), heading=current_heading, text=current, digest=_digest(current)))
+
+    for chunk in chunks:
+        if not chunk.heading:
+            chunk.heading = f"الجزء {chunk.index + 1}"
+    return chunks
+
+
+def _parse_review(text: str) -> Tuple[Optional[float], List[Finding], str]:
+    """Rating and findings from the model's JSON; the raw text is kept as notes if it is not JSON."""
+    start, end = text.find("{"), text.rfind("}")
+    try:
+        data = json.loads(text[start:end + 1]) if start != -1 else None
+    except ValueError:
+        data = None
+    if not isinstance(data, dict):
+        return None, [], text.strip()
+
+    try:
+        rating = float(data.get("rating")) if data.get("rating") is not None else None
+    except (TypeError, ValueError):
+        rating = None
+
+    findings = [Finding(kind="strength", point=str(s).strip()) for s in data.get("strengths", []) if str(s).strip()]
+    for issue in data.get("issues", []):
+        if isinstance(issue, str):
+            issue = {"point": issue}
+        if not isinstance(issue, dict) or not str(issue.get("point", "")).strip():
+            continue
+        try:
+            severity = min(max(int(issue.get("severity", 1)), 1), 3)
+        except (TypeError, ValueError):
+            severity = 1
+        findings.append(Finding(
+            kind="issue",
+            point=str(issue["point"]).strip(),
+            severity=severity,
+            suggestion=str(issue.get("suggestion", "")).strip()
+        ))
+    return rating, findings, ""
+
+
+_review_cache = LRUCache(REVIEW_CACHE_SIZE)
+
+
+def review_chunks(
+    call_model: Callable,
+    chunks: List[Chunk],
+    request: str,
+    model: str,
+    max_tokens: int,
+    max_workers: int,
+    focus: str = ""
+) -> List[ChunkReview]:
+    """
+    Review every chunk concurrently; chunks already reviewed for the same request come from cache.
+
+    focus is an extra instruction for every chunk (e.g. what a local check already covered).
+    """
+    request_note = f"\n**الطلب الأصلي:** {request}\n" if request else ""
+    request_key = _digest(f"{request or ''}|{focus}")
+
+    def review(chunk: Chunk) -> ChunkReview:
+        key = (chunk.digest, request_key, model)
+        cached = _review_cache.get(key)
+        if cached is not None:
+            # Same text may sit at another position now; re-anchor the findings to it
+            findings = [f.model_copy(update={"sections": [chunk.heading], "first_chunk": chunk.index}) for f in cached.findings]
+            return cached.model_copy(update={
+                "chunk_index": chunk.index, "heading": chunk.heading, "findings": findings, "from_cache": True
+            })
+
+        prompt = CHUNK_REVIEW_PROMPT.format(
+            position=f"الجزء {chunk.index + 1} من {len(chunks)}",
+            focus=f"{focus}\n" if focus else "",
+            request=request_note,
+            heading=chunk.heading,
+            text=chunk.text
+        )
+        response = call_model([{"role": "user", "content": prompt}], max_tokens=max_tokens, model=model)
+        rating, findings, notes = _parse_review(response.content[0].text)
+        for finding in findings:
+            finding.sections = [chunk.heading]
+            finding.first_chunk = chunk.index
+        result = ChunkReview(
+            chunk_index=chunk.index,
+            heading=chunk.heading,
+            chars=len(chunk.text),
+            rating=rating,
+            findings=findings,
+            notes=notes,
+            input_tokens=response.usage.input_tokens,
+            output_tokens=response.usage.output_tokens
+        )
+        _review_cache.put(key, result)
+        return result
+
+    reviews = []
+    for chunk, result in zip(chunks, map_concurrently(review, chunks, max_workers)):
+        if result.ok:
+            reviews.append(result.value)
+        else:
+            reviews.append(ChunkReview(chunk_index=chunk.index, heading=chunk.heading,
+                                       chars=len(chunk.text), error=result.error))
+    return reviews
+
+
+def _same_point(a: set, b: set) -> bool:
+    return bool(a and b) and len(a & b) / len(a | b) >= DUPLICATE_OVERLAP
+
+
+def merge_findings(reviews: List[ChunkReview], max_items: int) -> ChunkedReview:
+    """Deduplicate findings across chunks and rank them; the rating is length-weighted over chunks."""
+    merged: Dict[str, List[Tuple[set, Finding]]] = {"strength": [], "issue": []}
+    for review in reviews:
+        for finding in review.findings:
+            words = set(tokenize(finding.point, drop_stopwords=True))
+            for other_words, other in merged[finding.kind]:
+                if _same_point(words, other_words):
+                    other.severity = max(other.severity, finding.severity)
+                    other.sections.extend(s for s in finding.sections if s not in other.sections)
+                    other.suggestion = other.suggestion or finding.suggestion
+                    break
+            else:
+                merged[finding.kind].append((words, finding.model_copy(deep=True)))
+
+    issues = sorted((f for _, f in merged["issue"]), key=lambda f: (-f.severity, -f.mentions, f.first_chunk))
+    strengths = sorted((f for _, f in merged["strength"]), key=lambda f: (-f.mentions, f.first_chunk))
+
+    rated = [(r.rating, r.chars) for r in reviews if r.rating is not None]
+    total = sum(chars for _, chars in rated)
+    rating = round(sum(rating * chars for rating, chars in rated) / total, 1) if total else None
+
+    return ChunkedReview(chunks=reviews, strengths=strengths[:max_items], issues=issues[:max_items], rating=rating)
+
+
+def run_chunked_review(
+    call_model: Callable,
+    content: str,
+    request: str,
+    model: str,
+    max_chars: int,
+    max_tokens: int,
+    max_workers: int,
+    max_items: int,
+    focus: str = ""
+) -> ChunkedReview:
+    """Chunk, review concurrently and merge; the whole document is covered regardless of length."""
+    chunks = chunk_document(content, max_chars)
+    return merge_findings(review_chunks(call_model, chunks, request, model, max_tokens, max_workers, focus), max_items)
+
+
+def _sections_label(sections: List[str]) -> str:
+    shown = "، ".join(sections[:MAX_SECTIONS_SHOWN])
+    if len(sections) > MAX_SECTIONS_SHOWN:
+        shown += f" و{len(sections) - MAX_SECTIONS_SHOWN} أجزاء أخرى"
+    return shown
+
+
+def format_chunked_review(review: ChunkedReview) -> str:
+    """Markdown rendering: overall rating, ranked issues, strengths and a per-section table."""
+    text = f"## المراجعة (عدد الأجزاء المراجعة بالتوازي: {len(review.chunks)})\n\n"
+    if review.rating is not None:
+        text += f"**التقييم العام:** {review.rating} من 5 (متوسط تقييمات الأجزاء مرجحاً بطولها)\n\n"
+
+    if review.issues:
+        text += "### مجالات التحسين (مرتبة حسب الأولوية)\n\n"
+        for i, issue in enumerate(review.issues, 1):
+            text += f"{i}. **[{SEVERITY_LABELS.get(issue.severity, '')}]** {issue.point} — *{_sections_label(issue.sections)}*\n"
+            if issue.suggestion:
+                text += f"   - المقترح: {issue.suggestion}\n"
+        text += "\n"
+
+    if review.strengths:
+        text += "### نقاط القوة\n\n"
+        for strength in review.strengths:
+            text += f"- {strength.point} — *{_sections_label(strength.sections)}*\n"
+        text += "\n"
+
+    text += "### تقييم الأجزاء\n\n| الجزء | التقييم | ملاحظات |\n|-------|---------|---------|\n"
+    for chunk in review.chunks:
+        if chunk.error:
+            text += f"| {chunk.heading} | — | تعذرت المراجعة |\n"
+            continue
+        issues = sum(1 for f in chunk.findings if f.kind == "issue")
+        rating = f"{chunk.rating:g}" if chunk.rating is not None else "—"
+        text += f"| {chunk.heading} | {rating} | {issues} ملاحظة |\n"
+
+    notes = [c for c in review.chunks if c.notes]
+    for chunk in notes:
+        text += f"\n**ملاحظات على {chunk.heading}:**\n{chunk.notes}\n"
+    return text
@@ -0,0 +1,241 @@
+"""
+شرائح العرض كمخرجات مستقلة — كل شريحة مرتبطة ببصمة القسم المصدر، ويُعاد توليد ما تغيّر مصدره أو ما طلبه المستخدم فقط
+"""
+
+import hashlib
+import json
+import re
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+from pydantic import BaseModel, Field
+
+from config import SLIDE_CACHE_SIZE
+from .cache import LRUCache
+from .concurrency import map_concurrently
+from .review_chunks import Chunk, chunk_document
+from .slides import SLIDE_DECK_TOOL, SLIDE_DECK_TOOL_NAME, Slide, SlideDeck, deck_from_response
+from .text import normalize_arabic
+
+
+_SLIDE_TOOL_CHOICE = {"type": "tool", "name": SLIDE_DECK_TOOL_NAME}
+
+SECTION_SLIDES_PROMPT = """حوّل القسم التالي من مستند أطول ({position}) إلى {count} ضمن عرض تقديمي واحد.
+ركّز على هذا القسم وحده ولا تكرر محتوى الأقسام الأخرى.
+
+**الجمهور المستهدف:** {audience}
+
+**القسم: {heading}**
+{text}
+
+---
+سجّل الشرائح عبر أداة build_slide_deck فقط؛ عنوان العرض هو عنوان القسم، والتخطيط يُطبّق آلياً."""
+
+REVISE_SLIDE_PROMPT = """عدّل الشريحة التالية وفق طلب المستخدم، وأبقِ ما لم يُطلب تغييره كما هو.
+
+**طلب التعديل:** {instruction}
+
+**الشريحة الحالية ({position}):**
+{slide}
+{source}
+---
+سجّل الشريحة المعدلة عبر أداة build_slide_deck — شريحة واحدة فقط."""
+
+# Ordinal slide references (normalized); -1 is the last slide
+_ORDINALS = {
+    "الاولي": 1, "الثانيه": 2, "الثالثه": 3, "الرابعه": 4, "الخامسه": 5,
+    "السادسه": 6, "السابعه": 7, "الثامنه": 8, "التاسعه": 9, "العاشره": 10,
+    "الاخيره": -1, "last": -1,
+}
+_TARGET_NOUN_RE = re.compile(r"(?:ال)?(?:شريحه|شرايح|شريحتين|شريحتان)|slides?")
+_TARGET_TOKEN_RE = re.compile(r"\w+|[-–،,]")
+_RANGE_WORDS = frozenset({"-", "–", "الي", "حتي", "to"})
+_LIST_WORDS = frozenset({"،", ",", "و", "رقم", "رقمي", "من", "and", "number"})
+
+
+class DeckBuild(BaseModel):
+    """A deck assembled from per-section slides, with what was regenerated and what was reused."""
+    deck: SlideDeck
+    sections: int = 0
+    regenerated: List[int] = Field(default_factory=list, description="1-based numbers of slides produced by the model this time")
+    reused: int = 0
+    failed: List[str] = Field(default_factory=list, description="Headings of sections that could not be converted")
+    input_tokens: int = 0
+    output_tokens: int = 0
+    seconds: float = 0.0
+
+
+def _digest(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:16]
+
+
+def _count_label(count: Optional[int]) -> str:
+    if not count:
+        return "شريحة أو شريحتين"
+    return "شريحة واحدة" if count == 1 else ("شريحتين" if count == 2 else f"{count} شرائح")
+
+
+def _section_targets(chunks: List[Chunk], num_slides: Optional[int]) -> List[Optional[int]]:
+    """Slides per section when a total is requested, in proportion to section length."""
+    if not num_slides:
+        return [None] * len(chunks)
+    total = sum(len(c.text) for c in chunks) or 1
+    return [max(1, round(num_slides * len(c.text) / total)) for c in chunks]
+
+
+def deck_title(content: str, audience: str) -> str:
+    """The source's level-1 heading, or a generic title for the audience."""
+    for line in content.splitlines():
+        if line.startswith("# "):
+            return line[2:].strip()
+    return f"عرض تقديمي — {audience}"
+
+
+_slide_cache = LRUCache(SLIDE_CACHE_SIZE)
+_source_cache = LRUCache(SLIDE_CACHE_SIZE)
+
+
+def build_deck(
+    call_model: Callable,
+    content: str,
+    audience: str,
+    model: str,
+    section_chars: int,
+    max_tokens: int,
+    max_workers: int,
+    num_slides: Optional[int] = None
+) -> DeckBuild:
+    """
+    Convert content to slides section by section; sections converted before come from cache.
+
+    Every slide records the digest of the section it came from, so a later edit
+    to the source only regenerates the slides of the sections it touched.
+    """
+    start = time.perf_counter()
+    chunks = chunk_document(content, section_chars)
+    targets = _section_targets(chunks, num_slides)
+    audience_key = _digest(audience)
+
+    def convert(item: Tuple[Chunk, Optional[int]]) -> Tuple[List[Slide], bool, int, int]:
+        chunk, count = item
+        _source_cache.put(chunk.digest, chunk.text)
+        key = (chunk.digest, audience_key, count, model)
+        cached = _slide_cache.get(key)
+        if cached is not None:
+            return cached, True, 0, 0
+
+        prompt = SECTION_SLIDES_PROMPT.format(
+            position=f"القسم {chunk.index + 1} من {len(chunks)}",
+            count=_count_label(count),
+            audience=audience,
+            heading=chunk.heading,
+            text=chunk.text
+        )
+        response = call_model(
+            [{"role": "user", "content": prompt}],
+            max_tokens=max_tokens,
+            model=model,
+            tools=[SLIDE_DECK_TOOL],
+            tool_choice=_SLIDE_TOOL_CHOICE
+        )
+        section_deck = deck_from_response(response)
+        if section_deck is None or not section_deck.slides:
+            raise ValueError("لم يُرجع النموذج شرائح لهذا القسم")
+        slides = [s.model_copy(update={"source": chunk.digest}) for s in section_deck.slides]
+        _slide_cache.put(key, slides)
+        return slides, False, response.usage.input_tokens, response.usage.output_tokens
+
+    build = DeckBuild(deck=SlideDeck(title=deck_title(content, audience), subtitle=audience), sections=len(chunks))
+    for chunk, result in zip(chunks, map_concurrently(convert, list(zip(chunks, targets)), max_workers)):
+        if not result.ok:
+            build.failed.append(chunk.heading)
+            continue
+        slides, from_cache, input_tokens, output_tokens = result.value
+        first = len(build.deck.slides) + 1
+        build.deck.slides.extend(slides)
+        if from_cache:
+            build.reused += len(slides)
+        else:
+            build.regenerated.extend(range(first, first + len(slides)))
+        build.input_tokens += input_tokens
+        build.output_tokens += output_tokens
+    build.seconds = time.perf_counter() - start
+    return build
+
+
+def parse_slide_targets(text: str, slide_count: int) -> List[int]:
+    """
+    1-based slide numbers a request points at: "الشريحة ٣", "الشرائح 2 و5",
+    "الشريحة الثالثة", "الشرائح 2-4", "الشريحة الأخيرة".
+    """
+    tokens = _TARGET_TOKEN_RE.findall(normalize_arabic(text))
+    targets: List[int] = []
+    for position, token in enumerate(tokens):
+        if not _TARGET_NOUN_RE.fullmatch(token):
+            continue
+        pending_range = False
+        for word in tokens[position + 1:]:
+            # "و3" / "والثالثه": a conjunction attached to the next reference
+            if word.startswith("و") and (word[1:].isdigit() or word[1:] in _ORDINALS):
+                word = word[1:]
+            if word.isdigit() or word in _ORDINALS:
+                number = int(word) if word.isdigit() else _ORDINALS[word]
+                number = slide_count if number == -1 else number
+                if pending_range and targets:
+                    targets.extend(range(targets[-1] + 1, number + 1))
+                else:
+                    targets.append(number)
+                pending_range = False
+            elif word in _RANGE_WORDS:
+                pending_range = True
+            elif word not in _LIST_WORDS:
+                break
+    return sorted({n for n in targets if 1 <= n <= slide_count})
+
+
+def revise_slides(
+    call_model: Callable,
+    deck: SlideDeck,
+    targets: List[int],
+    instruction: str,
+    model: str,
+    max_tokens: int,
+    max_workers: int
+) -> DeckBuild:
+    """Regenerate only the targeted slides (concurrently) and keep every other slide as it is."""
+    start = time.perf_counter()
+
+    def revise(number: int) -> Tuple[Slide, int, int]:
+        slide = deck.slides[number - 1]
+        source = _source_cache.get(slide.source) if slide.source else None
+        prompt = REVISE_SLIDE_PROMPT.format(
+            instruction=instruction,
+            position=f"الشريحة {number} من {len(deck.slides)}",
+            slide=json.dumps(slide.model_dump(exclude={"source"}), ensure_ascii=False, indent=1),
+            source=f"\n**المحتوى المصدر للشريحة:**\n{source}\n" if source else ""
+        )
+        response = call_model(
+            [{"role": "user", "content": prompt}],
+            max_tokens=max_tokens,
+            model=model,
+            tools=[SLIDE_DECK_TOOL],
+            tool_choice=_SLIDE_TOOL_CHOICE
+        )
+        revised = deck_from_response(response)
+        if revised is None or not revised.slides:
+            raise ValueError("لم يُرجع النموذج الشريحة المعدلة")
+        return (revised.slides[0].model_copy(update={"source": slide.source}),
+                response.usage.input_tokens, response.usage.output_tokens)
+
+    build = DeckBuild(deck=deck.model_copy(deep=True))
+    for number, result in zip(targets, map_concurrently(revise, targets, max_workers)):
+        if not result.ok:
+            build.failed.append(f"الشريحة {number}")
+            continue
+        slide, input_tokens, output_tokens = result.value
+        build.deck.slides[number - 1] = slide
+        build.regenerated.append(number)
+        build.input_tokens += input_tokens
+        build.output_tokens += output_tokens
+    build.reused = len(deck.slides) - len(build.regenerated)
+    build.seconds = time.perf_counter() - start
+    return build
@@ -0,0 +1,316 @@
+"""
+العروض التقديمية المنظمة — شرائح بصيغة JSON من النموذج وعرضها محلياً بصيغة Markdown وملف PowerPoint
+"""
+
+import io
+import zipfile
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+from xml.sax.saxutils import escape
+from pydantic import BaseModel, Field, ValidationError
+
+
+SLIDE_DECK_TOOL_NAME = "build_slide_deck"
+
+# Tool the model fills instead of writing the deck layout itself
+SLIDE_DECK_TOOL = {
+    "name": SLIDE_DECK_TOOL_NAME,
+    "description": "يسجل محتوى العرض التقديمي شريحةً شريحة؛ التنسيق والتخطيط يُطبّقان آلياً.",
+    "input_schema": {
+        "type": "object",
+        "properties": {
+            "title": {"type": "string", "description": "عنوان العرض"},
+            "subtitle": {"type": "string", "description": "سطر فرعي قصير (الجهة أو المناسبة)"},
+            "slides": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "title": {"type": "string", "description": "عنوان تنفيذي — جملة كاملة تلخص الرسالة"},
+                        "key_message": {"type": "string", "description": "الرسالة الرئيسية في جملة واحدة"},
+                        "bullets": {"type": "array", "items": {"type": "string"}, "description": "٤-٦ نقاط مدعومة بالبيانات"},
+                        "notes": {"type": "string", "description": "ملاحظة للمقدم"},
+                    },
+                    "required": ["title", "bullets"],
+                },
+            },
+        },
+        "required": ["title", "slides"],
+    },
+}
+
+# Slide geometry (EMU) for a 16:9 deck
+SLIDE_WIDTH = 12192000
+SLIDE_HEIGHT = 6858000
+MARGIN = 457200
+
+DEFAULT_TITLE_COLOR = "1A365D"
+DEFAULT_ACCENT_COLOR = "D69E2E"
+FONT = "Arial"
+
+
+class Slide(BaseModel):
+    """One slide as structured content."""
+    title: str
+    key_message: str = ""
+    bullets: List[str] = Field(default_factory=list)
+    notes: str = ""
+    source: str = Field(default="", description="Digest of the source section the slide was made from")
+
+
+class SlideDeck(BaseModel):
+    """A deck the model filled through the slide tool; renderable without another model call."""
+    title: str
+    subtitle: str = ""
+    slides: List[Slide] = Field(default_factory=list)
+
+
+def deck_from_response(response) -> Optional[SlideDeck]:
+    """The deck from the slide tool call in a model response, or None if the model did not call it."""
+    for block in getattr(response, "content", []) or []:
+        if getattr(block, "type", "") == "tool_use" and getattr(block, "name", "") == SLIDE_DECK_TOOL_NAME:
+            try:
+                return SlideDeck.model_validate(block.input)
+            except ValidationError:
+                return None
+    return None
+
+
+def render_markdown(deck: SlideDeck) -> str:
+    """Deck in the house markdown slide template."""
+    parts = [f"# {deck.title}"]
+    if deck.subtitle:
+        parts[0] += f"\n\n*{deck.subtitle}*"
+    for number, slide in enumerate(deck.slides, 1):
+        text = f"## الشريحة {number}: {slide.title}\n\n"
+        if slide.key_message:
+            text += f"**{slide.key_message}**\n\n"
+        text += "\n".join(f"- {bullet}" for bullet in slide.bullets)
+        text += "\n\n---"
+        if slide.notes:
+            text += f"\n*ملاحظة للمقدم: {slide.notes}*"
+        parts.append(text)
+    return "\n\n".join(parts) + "\n"
+
+
+# ==================== PowerPoint (Office Open XML) ====================
+
+_NS = (
+    'xmlns:a="http://schemas.openxmlformats.org/drawingml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships" '
+    'xmlns:p="http://schemas.openxmlformats.org/presentationml/2006/main"'
+)
+_XML_HEAD = '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+_REL = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+_PML = "application/vnd.openxmlformats-officedocument.presentationml"
+
+_GROUP_PROPS = (
+    '<p:nvGrpSpPr><p:cNvPr id="1" name=""/><p:cNvGrpSpPr/><p:nvPr/></p:nvGrpSpPr>'
+    '<p:grpSpPr><a:xfrm><a:off x="0" y="0"/><a:ext cx="0" cy="0"/>'
+    '<a:chOff x="0" y="0"/><a:chExt cx="0" cy="0"/></a:xfrm></p:grpSpPr>'
+)
+_CLR_MAP = (
+    'bg1="lt1" tx1="dk1" bg2="lt2" tx2="dk2" accent1="accent1" accent2="accent2" accent3="accent3" '
+    'accent4="accent4" accent5="accent5" accent6="accent6" hlink="hlink" folHlink="folHlink"'
+)
+
+
+def _theme_xml() -> str:
+    colors = {
+        "dk1": "000000", "lt1": "FFFFFF", "dk2": DEFAULT_TITLE_COLOR, "lt2": "F0F2F6",
+        "accent1": DEFAULT_TITLE_COLOR, "accent2": DEFAULT_ACCENT_COLOR, "accent3": "2F855A",
+        "accent4": "C53030", "accent5": "4A5568", "accent6": "805AD5", "hlink": "2B6CB0", "folHlink": "6B46C1",
+    }
+    scheme = "".join(f'<a:{name}><a:srgbClr val="{value}"/></a:{name}>' for name, value in colors.items())
+    font = f'<a:latin typeface="{FONT}"/><a:ea typeface=""/><a:cs typeface="{FONT}"/>'
+    fill = '<a:solidFill><a:schemeClr val="phClr"/></a:solidFill>'
+    line = '<a:ln w="9525"><a:solidFill><a:schemeClr val="phClr"/></a:solidFill></a:ln>'
+    effect = '<a:effectStyle><a:effectLst/></a:effectStyle>'
+    return (
+        f'{_XML_HEAD}<a:theme xmlns:a="http://schemas.openxmlformats.org/drawingml/2006/main" name="Portfolio">'
+        f'<a:themeElements><a:clrScheme name="Portfolio">{scheme}</a:clrScheme>'
+        f'<a:fontScheme name="Portfolio"><a:majorFont>{font}</a:majorFont><a:minorFont>{font}</a:minorFont></a:fontScheme>'
+        f'<a:fmtScheme name="Portfolio"><a:fillStyleLst>{fill * 3}</a:fillStyleLst>'
+        f'<a:lnStyleLst>{line * 3}</a:lnStyleLst><a:effectStyleLst>{effect * 3}</a:effectStyleLst>'
+        f'<a:bgFillStyleLst>{fill * 3}</a:bgFillStyleLst></a:fmtScheme></a:themeElements></a:theme>'
+    )
+
+
+def _rels(*relations) -> str:
+    body = "".join(f'<Relationship Id="{rid}" Type="{rtype}" Target="{target}"/>' for rid, rtype, target in relations)
+    return f'{_XML_HEAD}<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">{body}</Relationships>'
+
+
+def _build_template_parts() -> Dict[str, str]:
+    """Parts identical in every deck: master, layout, notes master and themes."""
+    theme = _theme_xml()
+    return {
+        "_rels/.rels": _rels(
+            ("rId1", f"{_REL}/officeDocument", "ppt/presentation.xml"),
+            ("rId2", "http://schemas.openxmlformats.org/package/2006/relationships/metadata/core-properties", "docProps/core.xml"),
+            ("rId3", f"{_REL}/extended-properties", "docProps/app.xml"),
+        ),
+        "ppt/slideMasters/slideMaster1.xml": (
+            f'{_XML_HEAD}<p:sldMaster {_NS}><p:cSld><p:bg><p:bgRef idx="1001"><a:schemeClr val="bg1"/></p:bgRef></p:bg>'
+            f'<p:spTree>{_GROUP_PROPS}</p:spTree></p:cSld><p:clrMap {_CLR_MAP}/>'
+            '<p:sldLayoutIdLst><p:sldLayoutId id="2147483649" r:id="rId1"/></p:sldLayoutIdLst></p:sldMaster>'
+        ),
+        "ppt/slideMasters/_rels/slideMaster1.xml.rels": _rels(
+            ("rId1", f"{_REL}/slideLayout", "../slideLayouts/slideLayout1.xml"),
+            ("rId2", f"{_REL}/theme", "../theme/theme1.xml"),
+        ),
+        "ppt/slideLayouts/slideLayout1.xml": (
+            f'{_XML_HEAD}<p:sldLayout {_NS} type="blank" preserve="1"><p:cSld name="Blank">'
+            f'<p:spTree>{_GROUP_PROPS}</p:spTree></p:cSld><p:clrMapOvr><a:masterClrMapping/></p:clrMapOvr></p:sldLayout>'
+        ),
+        "ppt/slideLayouts/_rels/slideLayout1.xml.rels": _rels(
+            ("rId1", f"{_REL}/slideMaster", "../slideMasters/slideMaster1.xml"),
+        ),
+        "ppt/notesMasters/notesMaster1.xml": (
+            f'{_XML_HEAD}<p:notesMaster {_NS}><p:cSld><p:bg><p:bgRef idx="1001"><a:schemeClr val="bg1"/></p:bgRef></p:bg>'
+            f'<p:spTree>{_GROUP_PROPS}</p:spTree></p:cSld><p:clrMap {_CLR_MAP}/></p:notesMaster>'
+        ),
+        "ppt/notesMasters/_rels/notesMaster1.xml.rels": _rels(
+            ("rId1", f"{_REL}/theme", "../theme/theme2.xml"),
+        ),
+        "ppt/theme/theme1.xml": theme,
+        "ppt/theme/theme2.xml": theme,
+    }
+
+
+_template_parts: Optional[Dict[str, bytes]] = None
+
+
+def _get_template_parts() -> Dict[str, bytes]:
+    """Static parts, built and encoded once per process."""
+    global _template_parts
+    if _template_parts is None:
+        _template_parts = {name: xml.encode("utf-8") for name, xml in _build_template_parts().items()}
+    return _template_parts
+
+
+def _paragraph(text: str, size: int, color: str, bold: bool = False, bullet: bool = False) -> str:
+    bullet_props = (
+        f'<a:pPr marR="342900" indent="-285750" algn="r" rtl="1"><a:buFont typeface="{FONT}"/><a:buChar char="•"/></a:pPr>'
+        if bullet else '<a:pPr algn="r" rtl="1"><a:buNone/></a:pPr>'
+    )
+    weight = ' b="1"' if bold else ""
+    return (
+        f'<a:p>{bullet_props}<a:r><a:rPr lang="ar-SA" sz="{size}"{weight} dirty="0">'
+        f'<a:solidFill><a:srgbClr val="{color}"/></a:solidFill><a:latin typeface="{FONT}"/><a:cs typeface="{FONT}"/>'
+        f'</a:rPr><a:t>{escape(text)}</a:t></a:r></a:p>'
+    )
+
+
+def _text_box(shape_id: int, name: str, y: int, height: int, paragraphs: List[str]) -> str:
+    return (
+        f'<p:sp><p:nvSpPr><p:cNvPr id="{shape_id}" name="{name}"/><p:cNvSpPr txBox="1"/><p:nvPr/></p:nvSpPr>'
+        f'<p:spPr><a:xfrm><a:off x="{MARGIN}" y="{y}"/><a:ext cx="{SLIDE_WIDTH - 2 * MARGIN}" cy="{height}"/></a:xfrm>'
+        '<a:prstGeom prst="rect"><a:avLst/></a:prstGeom><a:noFill/></p:spPr>'
+        f'<p:txBody><a:bodyPr wrap="square" rtlCol="1"><a:normAutofit/></a:bodyPr><a:lstStyle/>{"".join(paragraphs)}</p:txBody></p:sp>'
+    )
+
+
+def _slide_xml(title: str, key_message: str, bullets: List[str], title_color: str, accent_color: str) -> str:
+    shapes = [_text_box(2, "Title", MARGIN, 1097280, [_paragraph(title, 2800, title_color, bold=True)])]
+    body_top = MARGIN + 1097280
+    if key_message:
+        shapes.append(_text_box(3, "Key Message", body_top, 640080, [_paragraph(key_message, 2000, accent_color, bold=True)]))
+        body_top += 640080
+    if bullets:
+        shapes.append(_text_box(
+            4, "Bullets", body_top, SLIDE_HEIGHT - body_top - MARGIN,
+            [_paragraph(bullet, 1800, "333333", bullet=True) for bullet in bullets]
+        ))
+    return (
+        f'{_XML_HEAD}<p:sld {_NS}><p:cSld><p:spTree>{_GROUP_PROPS}{"".join(shapes)}</p:spTree></p:cSld>'
+        '<p:clrMapOvr><a:masterClrMapping/></p:clrMapOvr></p:sld>'
+    )
+
+
+def _notes_xml(notes: str) -> str:
+    return (
+        f'{_XML_HEAD}<p:notes {_NS}><p:cSld><p:spTree>{_GROUP_PROPS}'
+        '<p:sp><p:nvSpPr><p:cNvPr id="2" name="Notes Placeholder"/><p:cNvSpPr><a:spLocks noGrp="1"/></p:cNvSpPr>'
+        '<p:nvPr><p:ph type="body" idx="1"/></p:nvPr></p:nvSpPr>'
+        '<p:spPr><a:xfrm><a:off x="685800" y="4343400"/><a:ext cx="5486400" cy="4114800"/></a:xfrm></p:spPr>'
+        f'<p:txBody><a:bodyPr/><a:lstStyle/>{_paragraph(notes, 1200, "000000")}</p:txBody></p:sp>'
+        '</p:spTree></p:cSld><p:clrMapOvr><a:masterClrMapping/></p:clrMapOvr></p:notes>'
+    )
+
+
+def render_pptx(deck: SlideDeck, title_color: str = DEFAULT_TITLE_COLOR, accent_color: str = DEFAULT_ACCENT_COLOR) -> bytes:
+    """Deck as a right-to-left .pptx file, built with zipfile and XML templates only."""
+    title_color, accent_color = title_color.lstrip("#").upper(), accent_color.lstrip("#").upper()
+    pages = [(deck.title, deck.subtitle, [], "")] + [(s.title, s.key_message, s.bullets, s.notes) for s in deck.slides]
+
+    parts: Dict[str, bytes] = dict(_get_template_parts())
+    overrides = [
+        ("/ppt/presentation.xml", f"{_PML}.presentation.main+xml"),
+        ("/ppt/slideMasters/slideMaster1.xml", f"{_PML}.slideMaster+xml"),
+        ("/ppt/slideLayouts/slideLayout1.xml", f"{_PML}.slideLayout+xml"),
+        ("/ppt/notesMasters/notesMaster1.xml", f"{_PML}.notesMaster+xml"),
+        ("/ppt/theme/theme1.xml", "application/vnd.openxmlformats-officedocument.theme+xml"),
+        ("/ppt/theme/theme2.xml", "application/vnd.openxmlformats-officedocument.theme+xml"),
+        ("/docProps/core.xml", "application/vnd.openxmlformats-package.core-properties+xml"),
+        ("/docProps/app.xml", "application/vnd.openxmlformats-officedocument.extended-properties+xml"),
+    ]
+    presentation_rels = [
+        ("rId1", f"{_REL}/slideMaster", "slideMasters/slideMaster1.xml"),
+        ("rId2", f"{_REL}/notesMaster", "notesMasters/notesMaster1.xml"),
+        ("rId3", f"{_REL}/theme", "theme/theme1.xml"),
+    ]
+    slide_ids = []
+
+    for number, (title, key_message, bullets, notes) in enumerate(pages, 1):
+        slide_rels = [("rId1", f"{_REL}/slideLayout", "../slideLayouts/slideLayout1.xml")]
+        parts[f"ppt/slides/slide{number}.xml"] = _slide_xml(title, key_message, bullets, title_color, accent_color).encode("utf-8")
+        overrides.append((f"/ppt/slides/slide{number}.xml", f"{_PML}.slide+xml"))
+        if notes:
+            slide_rels.append(("rId2", f"{_REL}/notesSlide", f"../notesSlides/notesSlide{number}.xml"))
+            parts[f"ppt/notesSlides/notesSlide{number}.xml"] = _notes_xml(notes).encode("utf-8")
+            parts[f"ppt/notesSlides/_rels/notesSlide{number}.xml.rels"] = _rels(
+                ("rId1", f"{_REL}/notesMaster", "../notesMasters/notesMaster1.xml"),
+                ("rId2", f"{_REL}/slide", f"../slides/slide{number}.xml"),
+            ).encode("utf-8")
+            overrides.append((f"/ppt/notesSlides/notesSlide{number}.xml", f"{_PML}.notesSlide+xml"))
+        parts[f"ppt/slides/_rels/slide{number}.xml.rels"] = _rels(*slide_rels).encode("utf-8")
+        presentation_rels.append((f"rId{number + 9}", f"{_REL}/slide", f"slides/slide{number}.xml"))
+        slide_ids.append(f'<p:sldId id="{number + 255}" r:id="rId{number + 9}"/>')
+
+    parts["ppt/presentation.xml"] = (
+        f'{_XML_HEAD}<p:presentation {_NS} rtl="1">'
+        '<p:sldMasterIdLst><p:sldMasterId id="2147483648" r:id="rId1"/></p:sldMasterIdLst>'
+        '<p:notesMasterIdLst><p:notesMasterId r:id="rId2"/></p:notesMasterIdLst>'
+        f'<p:sldIdLst>{"".join(slide_ids)}</p:sldIdLst>'
+        f'<p:sldSz cx="{SLIDE_WIDTH}" cy="{SLIDE_HEIGHT}"/><p:notesSz cx="6858000" cy="9144000"/></p:presentation>'
+    ).encode("utf-8")
+    parts["ppt/_rels/presentation.xml.rels"] = _rels(*presentation_rels).encode("utf-8")
+
+    created = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+    parts["docProps/core.xml"] = (
+        f'{_XML_HEAD}<cp:coreProperties xmlns:cp="http://schemas.openxmlformats.org/package/2006/metadata/core-properties" '
+        'xmlns:dc="http://purl.org/dc/elements/1.1/" xmlns:dcterms="http://purl.org/dc/terms/" '
+        'xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance">'
+        f'<dc:title>{escape(deck.title)}</dc:title>'
+        f'<dcterms:created xsi:type="dcterms:W3CDTF">{created}</dcterms:created></cp:coreProperties>'
+    ).encode("utf-8")
+    parts["docProps/app.xml"] = (
+        f'{_XML_HEAD}<Properties xmlns="http://schemas.openxmlformats.org/officeDocument/2006/extended-properties">'
+        f'<Application>Microsoft Office PowerPoint</Application><Slides>{len(pages)}</Slides></Properties>'
+    ).encode("utf-8")
+
+    content_types = (
+        f'{_XML_HEAD}<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        + "".join(f'<Override PartName="{name}" ContentType="{ctype}"/>' for name, ctype in overrides)
+        + "</Types>"
+    )
+
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("[Content_Types].xml", content_types)
+        for name, data in parts.items():
+            archive.writestr(name, data)
+    return buffer.getvalue()
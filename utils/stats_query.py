@@ -0,0 +1,223 @@
+"""
+مخطط الاستعلامات الإحصائية المحلي — إجابة أسئلة العدّ والتوزيع دون استدعاء النموذج
+"""
+
+import re
+from typing import Dict, List, Optional
+from pydantic import BaseModel, Field
+
+from config import STATS_PLANNER_CACHE_SIZE
+from .cache import LRUCache
+from .event_dates import parse_event_date
+from .event_retrieval import extract_query_entities, event_in_period, strip_query_entities
+from .event_analytics import UNSPECIFIED
+from .text import normalize_arabic, compile_phrase_pattern, tokenize
+
+
+# Maximum rows rendered for a local "list" answer
+LIST_LIMIT = 20
+
+# Requests longer than this are treated as narrative even if they contain a count phrase
+MAX_LOOKUP_LENGTH = 160
+
+DIMENSIONS = {
+    "city": "المدينة",
+    "tier": "التصنيف",
+    "type": "النوع",
+    "inclusion_status": "حالة التضمين",
+    "responsible_org": "الجهة المسؤولة",
+}
+
+MONTH_NAMES = {
+    1: "يناير", 2: "فبراير", 3: "مارس", 4: "أبريل", 5: "مايو", 6: "يونيو",
+    7: "يوليو", 8: "أغسطس", 9: "سبتمبر", 10: "أكتوبر", 11: "نوفمبر", 12: "ديسمبر",
+}
+
+# Phrases are matched on normalized text
+OPERATION_PHRASES = {
+    "count": ["كم عدد", "كم فعالية", "كم فعاليه", "كم", "عدد", "how many", "count", "number of"],
+    "distribution": ["توزيع", "التوزيع", "distribution", "breakdown", "split"],
+    "list": ["اعرض", "قائمة", "قايمه", "اذكر", "ما هي الفعاليات", "ما الفعاليات", "list", "show", "which events"],
+}
+
+GROUP_BY_PHRASES = {
+    "city": ["حسب المدينة", "حسب المدن", "لكل مدينة", "على المدن", "by city", "per city", "by cities"],
+    "tier": ["حسب التصنيف", "حسب الفئة", "لكل تصنيف", "by tier", "per tier", "by category"],
+    "type": ["حسب النوع", "لكل نوع", "by type", "per type"],
+    "inclusion_status": ["حسب حالة التضمين", "حالة التضمين", "حسب التضمين", "by inclusion", "inclusion status"],
+    "responsible_org": ["حسب الجهة", "حسب الجهات", "لكل جهة", "by organization", "by entity", "per entity", "by org"],
+}
+
+# Any of these means the user wants interpretation, not a lookup
+NARRATIVE_MARKERS = [
+    "حلل", "تحليل", "لماذا", "فسر", "وصي", "توصيات", "اقترح", "قيم", "رايك", "اسباب",
+    "تقرير", "رسالة", "رساله", "ملخص", "قارن", "مقارنة", "ناقص", "جودة", "جوده",
+    "analy", "why", "recommend", "insight", "explain", "assess", "suggest", "report",
+    "email", "letter", "summary", "compare", "missing", "quality",
+]
+
+# Words a lookup may contain besides its operation, grouping and filters; any other
+# content word is a constraint the planner cannot apply, so the request goes to the model
+LOOKUP_FILLER = [
+    "فعالية", "فعاليات", "هناك", "يوجد", "توجد", "لدينا", "عندنا", "مسجلة", "المسجلة",
+    "حاليا", "اجمالي", "الكلي", "كافة", "ضمن", "هي", "اعطني", "اريد", "ابغى",
+    "مدينة", "المدن", "تصنيف", "فئة", "نوع", "جهة", "جهات", "المسؤولة",
+    "events", "event", "are", "there", "do", "we", "have", "give", "want", "total",
+    "currently", "registered", "city", "cities", "tier", "type",
+]
+
+
+_OPERATION_RES = {op: compile_phrase_pattern(phrases) for op, phrases in OPERATION_PHRASES.items()}
+_GROUP_BY_RES = {dim: compile_phrase_pattern(phrases) for dim, phrases in GROUP_BY_PHRASES.items()}
+_NARRATIVE_RE = re.compile("|".join(re.escape(normalize_arabic(m)) for m in NARRATIVE_MARKERS))
+_FILLER_TOKENS = frozenset(tokenize(" ".join(LOOKUP_FILLER)))
+
+
+class StatsQuery(BaseModel):
+    """A structured lookup recognized from a user request."""
+    operation: str = Field(description="count | distribution | list")
+    group_by: Optional[str] = Field(default=None, description="Event field to group counts by")
+    filters: Dict[str, List[str]] = Field(default_factory=dict, description="Event field -> accepted values")
+    months: List[int] = Field(default_factory=list)
+    years: List[int] = Field(default_factory=list)
+
+
+class StatsQueryPlanner:
+    """
+    مخطط محلي يتعرف على أسئلة العدّ والتوزيع والقوائم ويجيب عنها مباشرة من قاعدة المعرفة
+    """
+
+    def __init__(self, events: List[Dict]):
+        self.events = events
+        self.known_orgs = sorted({e.get("responsible_org", "") for e in events if e.get("responsible_org")})
+        self._dates = [
+            (parse_event_date(e.get("start_date", "")), parse_event_date(e.get("end_date", "")))
+            for e in events
+        ]
+
+    def plan(self, message: str) -> Optional[StatsQuery]:
+        """Recognize a structured statistics question; None means it needs the model."""
+        if not message or len(message) > MAX_LOOKUP_LENGTH:
+            return None
+
+        text = normalize_arabic(message)
+        if _NARRATIVE_RE.search(text):
+            return None
+
+        operations = [op for op, pattern in _OPERATION_RES.items() if pattern.search(text)]
+        group_by = next((dim for dim, pattern in _GROUP_BY_RES.items() if pattern.search(text)), None)
+        if not operations and not group_by:
+            return None
+
+        if "list" in operations and "count" not in operations:
+            operation = "list"
+        elif "distribution" in operations or (group_by and "count" not in operations):
+            operation = "distribution"
+        else:
+            operation = "count"
+
+        if operation == "distribution" and not group_by:
+            group_by = "city"
+
+        if self._unexplained_tokens(message):
+            return None
+
+        entities = extract_query_entities(message, self.known_orgs)
+        filters = {}
+        for field, key in (("city", "cities"), ("tier", "tiers"), ("type", "types"),
+                           ("inclusion_status", "inclusion"), ("responsible_org", "orgs")):
+            if entities[key]:
+                filters[field] = sorted(entities[key])
+
+        return StatsQuery(
+            operation=operation,
+            group_by=group_by,
+            filters=filters,
+            months=sorted(entities["months"]),
+            years=sorted(entities["years"]),
+        )
+
+    def _unexplained_tokens(self, message: str) -> List[str]:
+        """Content words not used by a recognized operation, grouping or filter."""
+        rest = strip_query_entities(message, self.known_orgs)
+        for pattern in list(_OPERATION_RES.values()) + list(_GROUP_BY_RES.values()):
+            rest = pattern.sub(" ", rest)
+        return [t for t in tokenize(rest, drop_stopwords=True) if t not in _FILLER_TOKENS]
+
+    def _matching_events(self, query: StatsQuery) -> List[Dict]:
+        """Apply the query filters to the events."""
+        months, years = set(query.months), set(query.years)
+        matched = []
+        for idx, event in enumerate(self.events):
+            if any(event.get(field) not in values for field, values in query.filters.items()):
+                continue
+            if (months or years) and not event_in_period(*self._dates[idx], months, years):
+                continue
+            matched.append(event)
+        return matched
+
+    def _describe_filters(self, query: StatsQuery) -> str:
+        """Human-readable Arabic description of the applied filters."""
+        parts = []
+        for field, values in query.filters.items():
+            parts.append(f"{DIMENSIONS.get(field, field)}: {'، '.join(values)}")
+        if query.months:
+            parts.append(f"الشهر: {'، '.join(MONTH_NAMES[m] for m in query.months)}")
+        if query.years:
+            parts.append(f"السنة: {'، '.join(str(y) for y in query.years)}")
+        return " — ".join(parts) if parts else "جميع الفعاليات"
+
+    def execute(self, query: StatsQuery) -> str:
+        """Run the query against the events and render an Arabic markdown answer."""
+        matched = self._matching_events(query)
+        total = len(self.events)
+        scope = self._describe_filters(query)
+
+        output = f"### {scope}\n\n**العدد:** {len(matched)} فعالية من أصل {total}\n"
+
+        if query.operation == "list":
+            output += "\n| الاسم | المدينة | الجهة المسؤولة | التصنيف | تاريخ البداية | حالة التضمين |\n"
+            output += "|-------|---------|----------------|---------|---------------|-------------|\n"
+            for event in matched[:LIST_LIMIT]:
+                output += (
+                    f"| {event.get('name', '')} | {event.get('city', '')} | {event.get('responsible_org', '')} "
+                    f"| {event.get('tier', '')} | {event.get('start_date', '')} | {event.get('inclusion_status', '')} |\n"
+                )
+            if len(matched) > LIST_LIMIT:
+                output += f"\n*و{len(matched) - LIST_LIMIT} فعاليات أخرى مطابقة.*\n"
+            return output
+
+        group_by = query.group_by
+        if group_by is None and len(query.filters.get("city", [])) != 1 and matched:
+            group_by = "city"
+
+        if group_by:
+            counts: Dict[str, int] = {}
+            for event in matched:
+                key = event.get(group_by, "") or UNSPECIFIED
+                counts[key] = counts.get(key, 0) + 1
+            label = DIMENSIONS.get(group_by, group_by)
+            output += f"\n| {label} | العدد | النسبة |\n|------|-------|--------|\n"
+            for key, count in sorted(counts.items(), key=lambda x: x[1], reverse=True):
+                pct = count * 100 // len(matched) if matched else 0
+                output += f"| {key} | {count} | {pct}% |\n"
+
+        return output
+
+    def answer(self, message: str) -> Optional[str]:
+        """Plan and execute in one step; None when the request needs narrative."""
+        query = self.plan(message)
+        if query is None:
+            return None
+        return self.execute(query)
+
+
+_planner_cache = LRUCache(STATS_PLANNER_CACHE_SIZE)
+
+
+def get_stats_planner(knowledge_base) -> StatsQueryPlanner:
+    """Return the statistics planner for a knowledge base, built once per data version."""
+    return _planner_cache.get_or_compute(
+        knowledge_base.version,
+        lambda: StatsQueryPlanner(knowledge_base.get_all_events())
+    )
@@ -0,0 +1,325 @@
+"""
+فاحص الأسلوب المحلي — قواعد حتمية سريعة لمعايير الكتابة وإعداد الشرائح قبل المراجعة بالنموذج
+"""
+
+import re
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+from pydantic import BaseModel, Field
+
+from .text import compile_phrase_pattern, normalize_arabic
+
+
+SEVERITY_HIGH = "عالية"
+SEVERITY_MEDIUM = "متوسطة"
+SEVERITY_LOW = "منخفضة"
+
+# Declarative house-style rules (system prompts and PRESENTATION_GUIDELINES); compiled once by compile_style_rules()
+STYLE_RULES = [
+    {"id": "emoji", "kind": "emoji", "label": "رموز تعبيرية", "severity": SEVERITY_HIGH},
+    {"id": "banned_phrases", "kind": "phrases", "label": "عبارات غير مؤسسية", "severity": SEVERITY_HIGH,
+     "phrases": ["بالتأكيد", "سعيد بمساعدتك", "يسعدني", "بكل سرور", "بكل تأكيد", "لا تتردد", "أتمنى أن يكون هذا مفيداً"]},
+    {"id": "slide_bullets", "kind": "bullet_count", "label": "عدد النقاط خارج نطاق ٤-٦", "severity": SEVERITY_MEDIUM,
+     "min": 4, "max": 6, "deck_only": True},
+    {"id": "slide_title", "kind": "title", "label": "عنوان وصفي وليس رسالة تنفيذية", "severity": SEVERITY_LOW,
+     "min_words": 4, "deck_only": True},
+    {"id": "bullet_length", "kind": "bullet_length", "label": "نقطة أطول من جملتين", "severity": SEVERITY_LOW,
+     "max_sentences": 2},
+    {"id": "bullet_density", "kind": "bullet_density", "label": "نقاط متتابعة دون نص يربطها", "severity": SEVERITY_LOW,
+     "max_share": 0.85, "min_lines": 12},
+    {"id": "missing_numbers", "kind": "numbers", "label": "قسم بلا أرقام أو بيانات", "severity": SEVERITY_MEDIUM,
+     "min_chars": 200},
+    {"id": "long_sentences", "kind": "sentence_length", "label": "جملة طويلة", "severity": SEVERITY_LOW,
+     "max_words": 40},
+]
+
+_EMOJI_RE = re.compile("[\U0001F000-\U0001FAFF\u2600-\u27BF\u2B00-\u2BFF\uFE0F]")
+_HEADING_RE = re.compile(r"^\s{0,3}(#{1,3})\s+(.+?)\s*#*\s*$")
+_SEPARATOR_RE = re.compile(r"^\s*(-{3,}|\*{3,}|_{3,})\s*$")
+_BULLET_RE = re.compile(r"^\s*(?:[-*•▪◦]|[0-9٠-٩]+[.)\-])\s+")
+_DIGIT_RE = re.compile(r"[0-9٠-٩۰-۹]")
+_SENTENCE_RE = re.compile(r"[^.!؟?؛\n]+")
+_DECK_HEADING_RE = re.compile(r"شريحة|الشريحة|slide", re.IGNORECASE)
+
+
+class StyleFinding(BaseModel):
+    """A single style rule violation."""
+    rule_id: str
+    label: str
+    severity: str
+    location: str
+    details: str = ""
+
+
+class Section(BaseModel):
+    """A slide (in a deck) or a heading-delimited section of a document."""
+    index: int
+    title: str
+    level: int = 0
+    lines: List[str] = Field(default_factory=list)
+    start_line: int = 1
+
+    @property
+    def bullets(self) -> List[str]:
+        return [line for line in self.lines if _BULLET_RE.match(line)]
+
+    @property
+    def location(self) -> str:
+        return self.title or f"السطر {self.start_line}"
+
+
+class LintReport(BaseModel):
+    """Findings of one lint run."""
+    deck: bool = False
+    sections: int = 0
+    seconds: float = 0.0
+    findings: List[StyleFinding] = Field(default_factory=list)
+
+    def count_by_rule(self) -> Dict[str, int]:
+        counts: Dict[str, int] = {}
+        for finding in self.findings:
+            counts[finding.label] = counts.get(finding.label, 0) + 1
+        return counts
+
+
+def looks_like_deck(text: str) -> bool:
+    """Slide decks name their slides in headings or separate them with horizontal rules."""
+    headings = [m.group(2) for m in map(_HEADING_RE.match, text.splitlines()) if m]
+    separators = sum(1 for line in text.splitlines() if _SEPARATOR_RE.match(line))
+    return any(_DECK_HEADING_RE.search(h) for h in headings) or separators >= 3
+
+
+def split_sections(text: str, deck: bool) -> List[Section]:
+    """Sections start at level 1-3 headings; a deck without headings is split on horizontal rules."""
+    lines = text.splitlines()
+    use_headings = any(_HEADING_RE.match(line) for line in lines) or not deck
+    sections = [Section(index=0, title="")]
+    for number, line in enumerate(lines, 1):
+        heading = _HEADING_RE.match(line) if use_headings else None
+        if heading or (not use_headings and _SEPARATOR_RE.match(line)):
+            sections.append(Section(
+                index=len(sections),
+                title=heading.group(2) if heading else "",
+                level=len(heading.group(1)) if heading else 0,
+                start_line=number
+            ))
+            continue
+        if not _SEPARATOR_RE.match(line):
+            sections[-1].lines.append(line)
+    return [s for s in sections if s.title or any(l.strip() for l in s.lines)]
+
+
+def _is_note(line: str) -> bool:
+    """Italic-only lines are presenter notes in the house slide template."""
+    stripped = line.strip()
+    return len(stripped) > 2 and stripped[0] == stripped[-1] and stripped[0] in "*_"
+
+
+def _prose_lines(section: Section) -> List[str]:
+    return [l for l in section.lines if l.strip() and not l.lstrip().startswith("|") and not _is_note(l)]
+
+
+# A compiled check takes (text, sections, deck) and returns (location, details) pairs
+Check = Callable[[str, List[Section], bool], List[Tuple[str, str]]]
+
+
+class CompiledStyleRule:
+    """A style rule bound to its check function."""
+
+    def __init__(self, rule: Dict, check: Check):
+        self.id = rule["id"]
+        self.label = rule["label"]
+        self.severity = rule["severity"]
+        self.deck_only = rule.get("deck_only", False)
+        self.check = check
+
+
+def _compile_emoji(rule: Dict) -> Check:
+    def check(text: str, sections: List[Section], deck: bool) -> List[Tuple[str, str]]:
+        found = []
+        for section in sections:
+            symbols = "".join(sorted(set(_EMOJI_RE.findall(f"{section.title}\n" + "\n".join(section.lines))) - {"\uFE0F"}))
+            if symbols:
+                found.append((section.location, symbols))
+        return found
+    return check
+
+
+def _compile_phrases(rule: Dict) -> Check:
+    pattern = compile_phrase_pattern(rule["phrases"])
+    originals = {normalize_arabic(p): p for p in rule["phrases"]}
+
+    def check(text: str, sections: List[Section], deck: bool) -> List[Tuple[str, str]]:
+        found = []
+        for section in sections:
+            hits = sorted({
+                originals.get(hit) or originals.get(hit[1:], hit)
+                for hit in pattern.findall(normalize_arabic("\n".join(section.lines)))
+            })
+            if hits:
+                found.append((section.location, "، ".join(hits)))
+        return found
+    return check
+
+
+def _compile_bullet_count(rule: Dict) -> Check:
+    low, high = rule["min"], rule["max"]
+
+    def check(text: str, sections: List[Section], deck: bool) -> List[Tuple[str, str]]:
+        found = []
+        for section in sections:
+            count = len(section.bullets)
+            if count and not low <= count <= high:
+                found.append((section.location, f"{count} نقاط"))
+        return found
+    return check
+
+
+def _compile_title(rule: Dict) -> Check:
+    min_words = rule["min_words"]
+
+    def check(text: str, sections: List[Section], deck: bool) -> List[Tuple[str, str]]:
+        found = []
+        for section in sections:
+            # "الشريحة ٣: ..." prefixes are labels, not part of the message
+            title = re.sub(r"^.*?(شريحة|slide)\s*[\d٠-٩]*\s*[:：\-—]\s*", "", section.title, flags=re.IGNORECASE)
+            # The level-1 heading is the deck's own title
+            if section.title and section.level != 1 and len(title.split()) < min_words:
+                found.append((section.location, f"{len(title.split())} كلمات"))
+        return found
+    return check
+
+
+def _compile_bullet_length(rule: Dict) -> Check:
+    max_sentences = rule["max_sentences"]
+
+    def check(text: str, sections: List[Section], deck: bool) -> List[Tuple[str, str]]:
+        found = []
+        for section in sections:
+            long_bullets = [b for b in section.bullets if len([s for s in _SENTENCE_RE.findall(_BULLET_RE.sub("", b)) if len(s.split()) > 2]) > max_sentences]
+            if long_bullets:
+                found.append((section.location, f"{len(long_bullets)} نقطة"))
+        return found
+    return check
+
+
+def _compile_bullet_density(rule: Dict) -> Check:
+    max_share, min_lines = rule["max_share"], rule["min_lines"]
+
+    def check(text: str, sections: List[Section], deck: bool) -> List[Tuple[str, str]]:
+        if deck:
+            return []
+        lines = [l for s in sections for l in _prose_lines(s)]
+        bullets = sum(1 for l in lines if _BULLET_RE.match(l))
+        if len(lines) >= min_lines and bullets / len(lines) > max_share:
+            return [("المستند", f"{bullets} من {len(lines)} سطراً نقاط")]
+        return []
+    return check
+
+
+def _compile_numbers(rule: Dict) -> Check:
+    min_chars = rule["min_chars"]
+
+    def check(text: str, sections: List[Section], deck: bool) -> List[Tuple[str, str]]:
+        found = []
+        for section in sections:
+            body = "\n".join(l for l in section.lines if not _is_note(l))
+            # Decks are checked slide by slide; documents only where a section makes claims in bullets
+            if not deck and not section.bullets:
+                continue
+            if len(body.strip()) >= min_chars and not _DIGIT_RE.search(body):
+                found.append((section.location, f"{len(body.strip())} حرف دون رقم"))
+        return found
+    return check
+
+
+def _compile_sentence_length(rule: Dict) -> Check:
+    max_words = rule["max_words"]
+
+    def check(text: str, sections: List[Section], deck: bool) -> List[Tuple[str, str]]:
+        found = []
+        for section in sections:
+            lengths = [len(s.split()) for line in _prose_lines(section) for s in _SENTENCE_RE.findall(line)]
+            long_ones = [n for n in lengths if n > max_words]
+            if long_ones:
+                found.append((section.location, f"{len(long_ones)} جملة، أطولها {max(long_ones)} كلمة"))
+        return found
+    return check
+
+
+STYLE_RULE_COMPILERS = {
+    "emoji": _compile_emoji,
+    "phrases": _compile_phrases,
+    "bullet_count": _compile_bullet_count,
+    "title": _compile_title,
+    "bullet_length": _compile_bullet_length,
+    "bullet_density": _compile_bullet_density,
+    "numbers": _compile_numbers,
+    "sentence_length": _compile_sentence_length,
+}
+
+
+def compile_style_rules(rules: List[Dict]) -> List[CompiledStyleRule]:
+    """Compile declarative style rule definitions into checks."""
+    compiled = []
+    for rule in rules:
+        compiler = STYLE_RULE_COMPILERS.get(rule["kind"])
+        if compiler is None:
+            raise ValueError(f"Unknown style rule kind: {rule['kind']}")
+        compiled.append(CompiledStyleRule(rule, compiler(rule)))
+    return compiled
+
+
+_compiled_rules: Optional[List[CompiledStyleRule]] = None
+
+
+def lint_text(text: str, deck: Optional[bool] = None, rules: Optional[List[Dict]] = None) -> LintReport:
+    """Run the house-style rules over markdown text; deck is detected when not given."""
+    global _compiled_rules
+    if rules is not None:
+        compiled = compile_style_rules(rules)
+    else:
+        if _compiled_rules is None:
+            _compiled_rules = compile_style_rules(STYLE_RULES)
+        compiled = _compiled_rules
+
+    start = time.perf_counter()
+    deck = looks_like_deck(text) if deck is None else deck
+    sections = split_sections(text, deck)
+    report = LintReport(deck=deck, sections=len(sections))
+    for rule in compiled:
+        if rule.deck_only and not deck:
+            continue
+        for location, details in rule.check(text, sections, deck):
+            report.findings.append(StyleFinding(
+                rule_id=rule.id, label=rule.label, severity=rule.severity, location=location, details=details
+            ))
+    severity_order = {SEVERITY_HIGH: 0, SEVERITY_MEDIUM: 1, SEVERITY_LOW: 2}
+    report.findings.sort(key=lambda f: severity_order.get(f.severity, 3))
+    report.seconds = time.perf_counter() - start
+    return report
+
+
+def format_lint_report(report: LintReport, max_items: int = 15) -> str:
+    """Markdown list of findings, most severe first."""
+    kind = "العرض" if report.deck else "المستند"
+    if not report.findings:
+        return f"### الفحص الآلي للأسلوب\n\nلم تُرصد مخالفات لمعايير الأسلوب في {kind} ({report.sections} أقسام).\n"
+
+    text = f"### الفحص الآلي للأسلوب — {kind} (عدد الملاحظات: {len(report.findings)})\n\n"
+    text += "| الأولوية | القاعدة | الموضع | التفاصيل |\n|----------|---------|--------|----------|\n"
+    for finding in report.findings[:max_items]:
+        text += f"| {finding.severity} | {finding.label} | {finding.location} | {finding.details} |\n"
+    if len(report.findings) > max_items:
+        text += f"\n*و{len(report.findings) - max_items} ملاحظات أخرى.*\n"
+    return text
+
+
+def lint_summary_for_prompt(report: LintReport, max_items: int = 10) -> str:
+    """Compact findings list handed to the model so it does not spend its review on them."""
+    if not report.findings:
+        return "لم يرصد الفحص الآلي مخالفات لمعايير الأسلوب."
+    lines = [f"- [{f.severity}] {f.label} — {f.location}: {f.details}" for f in report.findings[:max_items]]
+    if len(report.findings) > max_items:
+        lines.append(f"- و{len(report.findings) - max_items} ملاحظات أخرى من النوع نفسه")
+    return "\n".join(lines)
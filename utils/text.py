@@ -0,0 +1,85 @@
+"""
+أدوات معالجة النصوص العربية لنظام المحفظة الذكي
+"""
+
+import math
+import re
+from typing import List
+
+
+_DIACRITICS_RE = re.compile(r"[\u0610-\u061A\u064B-\u065F\u0670\u06D6-\u06ED\u0640]")
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+# Letter-form unification; applied with guarded str.replace, which is several
+# times faster than str.translate with a dict table on short strings
+_LETTER_MAP = (
+    ("أ", "ا"), ("إ", "ا"), ("آ", "ا"), ("ٱ", "ا"),
+    ("ة", "ه"), ("ى", "ي"), ("ؤ", "و"), ("ئ", "ي"),
+)
+
+# Arabic-Indic and Extended Arabic-Indic digits -> ASCII (rare, so gated by a regex)
+_DIGIT_RE = re.compile(r"[\u0660-\u0669\u06F0-\u06F9]")
+_DIGIT_MAP = str.maketrans(
+    "\u0660\u0661\u0662\u0663\u0664\u0665\u0666\u0667\u0668\u0669"
+    "\u06F0\u06F1\u06F2\u06F3\u06F4\u06F5\u06F6\u06F7\u06F8\u06F9",
+    "01234567890123456789",
+)
+
+# Attached clitics stripped by light stemming (longest first)
+_PREFIXES = ("وبال", "وال", "بال", "فال", "كال", "لل", "ال")
+
+# Function words ignored by lexical scoring (already normalized)
+STOPWORDS = frozenset({
+    "في", "من", "الي", "علي", "عن", "مع", "هذا", "هذه", "ذلك", "تلك", "التي", "الذي",
+    "او", "ثم", "كل", "بين", "حسب", "عند", "كم", "ما", "ماذا", "هل", "لا", "لم", "لن",
+    "قد", "كان", "تم", "اي", "بعد", "قبل", "خلال", "حول", "عدد", "جميع", "لي", "لنا",
+    "the", "a", "an", "of", "in", "on", "for", "to", "and", "or", "is", "are", "by",
+    "with", "what", "which", "how", "many", "me", "please", "all", "any", "from", "that",
+})
+
+# Rough characters-per-token ratio for mixed Arabic/English prompts
+CHARS_PER_TOKEN = 3
+
+
+def normalize_arabic(text: str) -> str:
+    """Normalize Arabic text: strip diacritics/tatweel, unify letter forms and digits, lowercase."""
+    if not text:
+        return ""
+    text = _DIACRITICS_RE.sub("", text)
+    for source, target in _LETTER_MAP:
+        if source in text:
+            text = text.replace(source, target)
+    if _DIGIT_RE.search(text):
+        text = text.translate(_DIGIT_MAP)
+    return text.lower()
+
+
+def light_stem(token: str) -> str:
+    """Strip a leading definite-article clitic if enough of the word remains."""
+    for prefix in _PREFIXES:
+        if token.startswith(prefix) and len(token) - len(prefix) >= 2:
+            return token[len(prefix):]
+    return token
+
+
+def tokenize(text: str, stem: bool = True, drop_stopwords: bool = False) -> List[str]:
+    """Split normalized text into word tokens, optionally light-stemmed and stopword-filtered."""
+    tokens = _TOKEN_RE.findall(normalize_arabic(text))
+    if drop_stopwords:
+        tokens = [t for t in tokens if t not in STOPWORDS]
+    if stem:
+        tokens = [light_stem(t) for t in tokens]
+    return [t for t in tokens if len(t) > 1 or t.isdigit()]
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap upper-bound estimate of the model token count of a string."""
+    if not text:
+        return 0
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def compile_phrase_pattern(phrases: List[str]) -> "re.Pattern":
+    """Whole-phrase regex over normalized text, allowing one attached و/ب/ل/ف clitic; longest phrase first."""
+    alternatives = sorted((re.escape(normalize_arabic(p)) for p in phrases), key=len, reverse=True)
+    return re.compile(r"(?<!\w)(?:و|ب|ل|ف)?(?:" + "|".join(alternatives) + r")(?!\w)")
@@ -0,0 +1,254 @@
+"""
+محرك الجدول الزمني للفعاليات — التعارضات والفجوات وكثافة التقويم لكل مدينة
+"""
+
+import bisect
+import heapq
+from datetime import date, timedelta
+from typing import Dict, List, Optional, Tuple
+from pydantic import BaseModel, Field
+
+from config import TIMELINE_CACHE_SIZE
+from .cache import LRUCache
+from .event_dates import parse_event_date
+
+
+# Relative importance of a tier when ranking clashes
+TIER_WEIGHTS = {
+    "Marquee": 3.0,
+    "Tier 1": 2.0,
+    "Tier 2": 1.0,
+    "Tier 3": 0.5,
+}
+
+# Only overlaps between these tiers are reported as clashes
+CLASH_TIERS = frozenset({"Marquee", "Tier 1"})
+
+# Highest weight a clash partner can have; bounds the score an event can still reach
+_MAX_CLASH_WEIGHT = max(TIER_WEIGHTS.get(tier, 1.0) for tier in CLASH_TIERS)
+
+# Season-long events (exhibitions, year-round programs) fill occupancy but are not clashes
+CLASH_MAX_SPAN_DAYS = 60
+
+# Number of clashes kept in the report
+TOP_CLASHES = 10
+
+# Shortest run of empty days reported as a calendar gap
+MIN_GAP_DAYS = 14
+
+# City values that are placeholders rather than a location
+UNPLACED_CITIES = frozenset({"", "سيتم تحديده لاحقاً", "لم تحدد", "غير محدد"})
+
+
+class Clash(BaseModel):
+    """Two major events in the same city with overlapping dates."""
+    city: str
+    first: str
+    second: str
+    first_tier: str
+    second_tier: str
+    overlap_start: date
+    overlap_end: date
+    overlap_days: int
+    score: float = Field(description="Tier weight product × share of the shorter event that overlaps")
+
+
+class CalendarGap(BaseModel):
+    """A run of days with no event in a city."""
+    city: str
+    start: date
+    end: date
+    days: int
+
+
+class CityTimeline(BaseModel):
+    """Calendar density for one city."""
+    city: str
+    dated: int = 0
+    first_day: Optional[date] = None
+    last_day: Optional[date] = None
+    overlapping_pairs: int = 0
+    busy_days: int = Field(default=0, description="Days with two or more events running")
+    peak_day: Optional[date] = None
+    peak_load: int = 0
+    occupancy: List[int] = Field(default_factory=list, description="Events running per day from first_day")
+
+    def load_on(self, day: date) -> int:
+        """Number of events running in the city on a given day."""
+        if self.first_day is None or day < self.first_day or day > self.last_day:
+            return 0
+        return self.occupancy[(day - self.first_day).days]
+
+
+class TimelineReport(BaseModel):
+    """Timeline analysis of one KB version."""
+    version: str = ""
+    cities: Dict[str, CityTimeline] = Field(default_factory=dict)
+    clashes: List[Clash] = Field(default_factory=list)
+    gaps: List[CalendarGap] = Field(default_factory=list)
+    undated: int = 0
+    unplaced: int = 0
+
+    def longest_gap(self, city: str) -> Optional[CalendarGap]:
+        city_gaps = [g for g in self.gaps if g.city == city]
+        return max(city_gaps, key=lambda g: g.days) if city_gaps else None
+
+
+def _event_span(event: Dict) -> Optional[Tuple[date, date]]:
+    """Parsed (start, end) of an event; a missing or inverted end collapses to the start day."""
+    start = parse_event_date(event.get("start_date", ""))
+    if start is None:
+        return None
+    end = parse_event_date(event.get("end_date", ""))
+    if end is None or end < start:
+        end = start
+    return start, end
+
+
+def _sweep_city(city: str, spans: List[Tuple[date, date, Dict]], clash_heap: List, k: int) -> int:
+    """
+    Sweep the city's events in start order, tracking running events in end order.
+
+    Returns the number of overlapping pairs; major-tier clashes are pushed onto
+    clash_heap, which is kept at the k highest scores (ties go to the larger
+    overlap, then the earlier events). Running major events are kept sorted by
+    end date and scanned longest-running first, so the scan stops as soon as no
+    remaining partner could still enter a full heap.
+    """
+    spans.sort(key=lambda item: item[0])
+    active: List[date] = []
+    major_keys: List[Tuple[date, int]] = []
+    major: List[Tuple[date, int, date, Dict]] = []
+    pairs = 0
+
+    for seq, (start, end, event) in enumerate(spans):
+        while active and active[0] < start:
+            heapq.heappop(active)
+        pairs += len(active)
+        heapq.heappush(active, end)
+
+        # Ended majors are a prefix of the end-ordered list
+        expired = bisect.bisect_left(major_keys, (start, -1))
+        if expired:
+            del major_keys[:expired], major[:expired]
+
+        tier = event.get("tier", "")
+        length = (end - start).days + 1
+        if tier not in CLASH_TIERS or length > CLASH_MAX_SPAN_DAYS:
+            continue
+
+        weight = TIER_WEIGHTS.get(tier, 1.0)
+        best_score = weight * _MAX_CLASH_WEIGHT
+        for other_end, other_seq, other_start, other in reversed(major):
+            overlap_end = min(end, other_end)
+            overlap_days = (overlap_end - start).days + 1
+            # Overlap only shrinks from here on and the share of the shorter event is at most 1
+            if len(clash_heap) >= k and (best_score, overlap_days, -seq, 0) < clash_heap[0][:4]:
+                break
+            shorter = min(length, (other_end - other_start).days + 1)
+            score = weight * TIER_WEIGHTS.get(other.get("tier", ""), 1.0) * overlap_days / shorter
+            # (seq, other_seq, city) makes every pair key unique so payload dicts are never compared
+            entry = (score, overlap_days, -seq, -other_seq, city, other, event, start, overlap_end)
+            if len(clash_heap) < k:
+                heapq.heappush(clash_heap, entry)
+            elif entry[:5] > clash_heap[0][:5]:
+                heapq.heapreplace(clash_heap, entry)
+
+        key = (end, seq)
+        position = bisect.bisect_right(major_keys, key)
+        major_keys.insert(position, key)
+        major.insert(position, (end, seq, start, event))
+
+    return pairs
+
+
+def _occupancy(city: str, spans: List[Tuple[date, date, Dict]]) -> Tuple[CityTimeline, List[CalendarGap]]:
+    """Per-day occupancy from a difference array, plus the empty runs inside the city's span."""
+    first_day = min(start for start, _, _ in spans)
+    last_day = max(end for _, end, _ in spans)
+    n_days = (last_day - first_day).days + 1
+
+    diff = [0] * (n_days + 1)
+    for start, end, _ in spans:
+        diff[(start - first_day).days] += 1
+        diff[(end - first_day).days + 1] -= 1
+
+    occupancy = []
+    running = 0
+    for delta in diff[:n_days]:
+        running += delta
+        occupancy.append(running)
+
+    timeline = CityTimeline(city=city, dated=len(spans), first_day=first_day, last_day=last_day, occupancy=occupancy)
+    timeline.peak_load = max(occupancy)
+    timeline.peak_day = first_day + timedelta(days=occupancy.index(timeline.peak_load))
+    timeline.busy_days = sum(1 for load in occupancy if load >= 2)
+
+    gaps = []
+    run_start = None
+    for offset, load in enumerate(occupancy + [1]):
+        if load == 0 and run_start is None:
+            run_start = offset
+        elif load != 0 and run_start is not None:
+            if offset - run_start >= MIN_GAP_DAYS:
+                gaps.append(CalendarGap(
+                    city=city,
+                    start=first_day + timedelta(days=run_start),
+                    end=first_day + timedelta(days=offset - 1),
+                    days=offset - run_start,
+                ))
+            run_start = None
+
+    return timeline, gaps
+
+
+def analyze_timeline(events: List[Dict], version: str = "", top_k: int = TOP_CLASHES) -> TimelineReport:
+    """Find same-city overlaps, major-tier clashes, calendar gaps and daily occupancy."""
+    report = TimelineReport(version=version)
+    by_city: Dict[str, List[Tuple[date, date, Dict]]] = {}
+
+    for event in events:
+        span = _event_span(event)
+        if span is None:
+            report.undated += 1
+            continue
+        city = event.get("city", "")
+        if city in UNPLACED_CITIES:
+            report.unplaced += 1
+            continue
+        by_city.setdefault(city, []).append((span[0], span[1], event))
+
+    clash_heap: List = []
+    for city, spans in by_city.items():
+        pairs = _sweep_city(city, spans, clash_heap, top_k)
+        timeline, gaps = _occupancy(city, spans)
+        timeline.overlapping_pairs = pairs
+        report.cities[city] = timeline
+        report.gaps.extend(gaps)
+
+    for score, overlap_days, _, _, city, first, second, overlap_start, overlap_end in sorted(clash_heap, key=lambda e: e[:5], reverse=True):
+        report.clashes.append(Clash(
+            city=city,
+            first=first.get("name", ""),
+            second=second.get("name", ""),
+            first_tier=first.get("tier", ""),
+            second_tier=second.get("tier", ""),
+            overlap_start=overlap_start,
+            overlap_end=overlap_end,
+            overlap_days=overlap_days,
+            score=round(score, 2),
+        ))
+
+    report.gaps.sort(key=lambda g: g.days, reverse=True)
+    return report
+
+
+_timeline_cache = LRUCache(TIMELINE_CACHE_SIZE)
+
+
+def get_timeline(knowledge_base) -> TimelineReport:
+    """Return the timeline analysis for a knowledge base, computed once per data version."""
+    return _timeline_cache.get_or_compute(
+        knowledge_base.version,
+        lambda: analyze_timeline(knowledge_base.get_all_events(), knowledge_base.version)
+    )
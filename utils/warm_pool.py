@@ -0,0 +1,116 @@
+"""
+التهيئة المسبقة للوكلاء — تحميل الوحدات وقاعدة المعرفة والعميل وبناء المنسقين في الخلفية عند بدء التطبيق
+"""
+
+import importlib
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from pydantic import BaseModel, Field
+
+from .event_analytics import get_event_stats
+from .intent_classifier import get_intent_classifier
+from .knowledge_base import get_shared_knowledge_base
+
+
+# Modules whose import dominates the first request (the model SDK, agents, prompts). Agents are
+# imported by name on the warm-up thread so that importing this module stays cheap.
+WARM_MODULES = [
+    "agents.project1",
+    "agents.project2",
+    "utils.kb_tools",
+    "utils.slide_artifacts",
+    "utils.stats_query",
+]
+
+# Orchestrator per project and the lazily created members to build up front
+ORCHESTRATORS: Dict[str, Tuple[str, str, str, List[str]]] = {
+    "project1": ("agents.project1", "CoordinatorAgent", "وكلاء لجنة الفعاليات", [
+        "data_analysis_agent", "followup_agent", "reporting_agent", "quality_check_agent", "stats_planner",
+    ]),
+    "project2": ("agents.project2", "StrategicPlanningAgent", "وكلاء احتفالية ٣٠٠ عام", [
+        "benchmarking_agent", "kpi_agent", "critique_agent", "content_prep_agent",
+    ]),
+}
+
+
+class WarmupStep(BaseModel):
+    label: str
+    seconds: float = 0.0
+
+
+class WarmupStatus(BaseModel):
+    """Progress of the background warm-up, read by the sidebar."""
+    ready: bool = False
+    error: Optional[str] = None
+    steps: List[WarmupStep] = Field(default_factory=list)
+    seconds: float = 0.0
+
+
+def build_orchestrator(project_id: str) -> Any:
+    """A project's orchestrator with all of its sub-agents already created."""
+    module_name, class_name, _, members = ORCHESTRATORS[project_id]
+    orchestrator = getattr(importlib.import_module(module_name), class_name)()
+    for member in members:
+        getattr(orchestrator, member)
+    return orchestrator
+
+
+class WarmPool:
+    """
+    مجمّع الوكلاء الجاهزة — نسخة واحدة لكل مشروع تخدم جميع الجلسات
+
+    start() runs the warm-up on a daemon thread. orchestrator() waits for it
+    and hands out the prebuilt instance; if the warm-up failed, it builds the
+    orchestrator on the spot so the error surfaces with the request as before.
+    """
+
+    def __init__(self, project_ids: Optional[List[str]] = None):
+        self.project_ids = project_ids or list(ORCHESTRATORS)
+        self.status = WarmupStatus()
+        self._orchestrators: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> "WarmPool":
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._warm, name="agent-warm-pool", daemon=True)
+            self._thread.start()
+        return self
+
+    def _step(self, label: str, func: Callable[[], Any]) -> Any:
+        start = time.perf_counter()
+        value = func()
+        self.status.steps.append(WarmupStep(label=label, seconds=time.perf_counter() - start))
+        return value
+
+    def _warm(self):
+        start = time.perf_counter()
+        try:
+            self._step("تحميل وحدات الوكلاء", lambda: [importlib.import_module(m) for m in WARM_MODULES])
+            self._step("قاعدة المعرفة وإحصاءاتها", lambda: get_event_stats(get_shared_knowledge_base()))
+            self._step("مصنف النوايا", get_intent_classifier)
+            self._step("عميل النموذج", lambda: importlib.import_module("agents.base_agent").get_shared_client())
+            for project_id in self.project_ids:
+                label = ORCHESTRATORS[project_id][2]
+                orchestrator = self._step(label, lambda: build_orchestrator(project_id))
+                with self._lock:
+                    self._orchestrators.setdefault(project_id, orchestrator)
+        except Exception as e:
+            self.status.error = str(e)
+        finally:
+            self.status.seconds = time.perf_counter() - start
+            self.status.ready = self.status.error is None
+            self._done.set()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        return self._done.wait(timeout)
+
+    def orchestrator(self, project_id: str) -> Any:
+        """The shared orchestrator for a project, ready to use once the warm-up has finished."""
+        self.wait()
+        with self._lock:
+            if project_id not in self._orchestrators:
+                self._orchestrators[project_id] = build_orchestrator(project_id)
+            return self._orchestrators[project_id]
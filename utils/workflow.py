@@ -0,0 +1,187 @@
+"""
+منفذ سير العمل — رسم اعتماديات لخطوات الوكلاء مع التوازي والتخزين المؤقت لكل عقدة
+"""
+
+import contextvars
+import hashlib
+import json
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, List, Optional, Sequence
+from pydantic import BaseModel, Field
+
+from config import WORKFLOW_CACHE_SIZE
+from .cache import LRUCache
+
+
+class WorkflowStep:
+    """
+    One node of a workflow.
+
+    run receives the workflow inputs it declared and the outputs of the steps
+    it depends on, both keyed by name.
+    """
+
+    def __init__(
+        self,
+        step_id: str,
+        run: Callable[[Dict[str, Any], Dict[str, Any]], Any],
+        depends_on: Sequence[str] = (),
+        inputs: Sequence[str] = (),
+        label: str = ""
+    ):
+        self.step_id = step_id
+        self.run = run
+        self.depends_on = list(depends_on)
+        self.inputs = list(inputs)
+        self.label = label or step_id
+
+
+class StepResult(BaseModel):
+    """Outcome of one node in a workflow run."""
+    step_id: str
+    label: str
+    output: Any = None
+    input_hash: str = ""
+    seconds: float = 0.0
+    from_cache: bool = False
+    error: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+class WorkflowRun(BaseModel):
+    """All node results of a run, in topological order."""
+    name: str
+    results: Dict[str, StepResult] = Field(default_factory=dict)
+    order: List[str] = Field(default_factory=list)
+    elapsed: float = 0.0
+
+    @property
+    def recomputed(self) -> List[str]:
+        return [sid for sid in self.order if sid in self.results and not self.results[sid].from_cache and self.results[sid].ok]
+
+    def output(self, step_id: str) -> Any:
+        result = self.results.get(step_id)
+        return result.output if result and result.ok else None
+
+
+def output_digest(value: Any) -> str:
+    """Stable digest of a step output; agent responses are identified by their content."""
+    if hasattr(value, "content") and isinstance(value.content, str):
+        payload = value.content
+    elif isinstance(value, BaseModel):
+        payload = value.model_dump_json()
+    else:
+        payload = json.dumps(value, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()[:16]
+
+
+_step_cache = LRUCache(WORKFLOW_CACHE_SIZE)
+
+
+class Workflow:
+    """
+    A declarative dependency graph of steps.
+
+    Steps run as soon as their dependencies finish, so independent branches
+    overlap. Each node's result is cached on a hash of its declared inputs and
+    its dependencies' output digests; re-running after a change recomputes only
+    the nodes whose inputs moved. A failed node skips everything downstream.
+    """
+
+    def __init__(self, name: str, steps: List[WorkflowStep]):
+        self.name = name
+        self.steps = {step.step_id: step for step in steps}
+        self.order = self._topological_order()
+
+    def _topological_order(self) -> List[str]:
+        indegree = {sid: 0 for sid in self.steps}
+        for step in self.steps.values():
+            for dep in step.depends_on:
+                if dep not in self.steps:
+                    raise ValueError(f"Step '{step.step_id}' depends on unknown step '{dep}'")
+                indegree[step.step_id] += 1
+
+        ready = [sid for sid, degree in indegree.items() if degree == 0]
+        order = []
+        while ready:
+            sid = ready.pop(0)
+            order.append(sid)
+            for step in self.steps.values():
+                if sid in step.depends_on:
+                    indegree[step.step_id] -= 1
+                    if indegree[step.step_id] == 0:
+                        ready.append(step.step_id)
+        if len(order) != len(self.steps):
+            raise ValueError(f"Workflow '{self.name}' has a dependency cycle")
+        return order
+
+    def _input_hash(self, step: WorkflowStep, inputs: Dict[str, Any], digests: Dict[str, str]) -> str:
+        payload = {
+            "workflow": self.name,
+            "step": step.step_id,
+            "inputs": {name: inputs.get(name) for name in step.inputs},
+            "upstream": {dep: digests[dep] for dep in step.depends_on},
+        }
+        return hashlib.sha1(json.dumps(payload, ensure_ascii=False, sort_keys=True, default=str).encode("utf-8")).hexdigest()[:16]
+
+    def _execute(self, step: WorkflowStep, inputs: Dict[str, Any], upstream: Dict[str, Any], input_hash: str) -> StepResult:
+        start = time.perf_counter()
+        try:
+            output = step.run({name: inputs.get(name) for name in step.inputs}, upstream)
+        except Exception as e:
+            return StepResult(step_id=step.step_id, label=step.label, input_hash=input_hash,
+                              seconds=time.perf_counter() - start, error=str(e))
+        _step_cache.put(input_hash, output)
+        return StepResult(step_id=step.step_id, label=step.label, output=output, input_hash=input_hash,
+                          seconds=time.perf_counter() - start)
+
+    def run(self, inputs: Dict[str, Any], max_workers: int) -> WorkflowRun:
+        """Execute the graph; cached nodes resolve immediately, the rest run on a bounded pool."""
+        started = time.perf_counter()
+        run = WorkflowRun(name=self.name, order=self.order)
+        digests: Dict[str, str] = {}
+        pending = {sid: set(self.steps[sid].depends_on) for sid in self.order}
+        running = {}
+
+        def settle(result: StepResult):
+            run.results[result.step_id] = result
+            if result.ok:
+                digests[result.step_id] = output_digest(result.output)
+            for deps in pending.values():
+                deps.discard(result.step_id)
+
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+            while pending or running:
+                for sid in [sid for sid in self.order if sid in pending and not pending[sid]]:
+                    del pending[sid]
+                    step = self.steps[sid]
+                    failed = [dep for dep in step.depends_on if not run.results[dep].ok]
+                    if failed:
+                        settle(StepResult(step_id=sid, label=step.label, error=f"upstream failed: {', '.join(failed)}"))
+                        continue
+
+                    input_hash = self._input_hash(step, inputs, digests)
+                    sentinel = object()
+                    cached = _step_cache.get(input_hash, sentinel)
+                    if cached is not sentinel:
+                        settle(StepResult(step_id=sid, label=step.label, output=cached, input_hash=input_hash, from_cache=True))
+                        continue
+
+                    upstream = {dep: run.results[dep].output for dep in step.depends_on}
+                    # Steps run in a copy of the caller's context so request-scoped state carries over
+                    context = contextvars.copy_context()
+                    running[pool.submit(context.run, self._execute, step, inputs, upstream, input_hash)] = sid
+
+                if not running:
+                    continue
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    running.pop(future)
+                    settle(future.result())
+
+        run.elapsed = time.perf_counter() - started
+        return run
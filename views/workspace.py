@@ -4,9 +4,11 @@
 
 import csv
 import io
+import uuid
 import streamlit as st
-from config import THEME, PROJECT_1_CONFIG, PROJECT_2_CONFIG
+from config import THEME, PROJECT_1_CONFIG, PROJECT_2_CONFIG, JOB_WORKERS, JOB_QUEUE_PER_SESSION, JOB_POLL_SECONDS
 from components.settings_panel import render_settings_panel
+from utils.slides import SlideDeck, render_pptx
 
 
 # أسماء حالات الاستخدام
@@ -30,20 +32,35 @@ def get_current_project_config():
     return PROJECT_2_CONFIG
 
 
-def get_orchestrator():
-    """Get or create the orchestrator for the current project."""
-    project_id = st.session_state.get('selected_project', 'project1')
-    orchestrator_key = f"orchestrator_{project_id}"
+@st.cache_resource(show_spinner=False)
+def get_warm_pool():
+    """Process-wide pool of ready agents, warmed on a background thread when the app starts."""
+    from utils.warm_pool import WarmPool
+    return WarmPool().start()
+
+
+@st.cache_resource(show_spinner=False)
+def get_job_executor():
+    """Process-wide executor for agent requests; its job table outlives reruns and page switches."""
+    from utils.jobs import JobExecutor
+    return JobExecutor(JOB_WORKERS, JOB_QUEUE_PER_SESSION)
+
+
+def get_job_session_id() -> str:
+    """Key of this browser session in the job table."""
+    if "job_session_id" not in st.session_state:
+        st.session_state.job_session_id = uuid.uuid4().hex
+    return st.session_state.job_session_id
 
-    if orchestrator_key not in st.session_state:
-        if project_id == 'project1':
-            from agents.project1 import CoordinatorAgent
-            st.session_state[orchestrator_key] = CoordinatorAgent()
-        else:
-            from agents.project2 import StrategicPlanningAgent
-            st.session_state[orchestrator_key] = StrategicPlanningAgent()
 
-    return st.session_state[orchestrator_key]
+def get_agent_session():
+    """This session's follow-up state for the current project (last answer, last agent, last deck)."""
+    from agents import SessionState
+    project_id = st.session_state.get('selected_project', 'project1')
+    session_key = f"agent_session_{project_id}"
+    if session_key not in st.session_state:
+        st.session_state[session_key] = SessionState()
+    return st.session_state[session_key]
 
 
 def render_workspace_header():
@@ -169,12 +186,34 @@ def render_csv_upload():
                     st.error(f"خطأ في قراءة {file_name}: {str(e)}")
 
 
+@st.cache_data(show_spinner=False)
+def build_deck_file(deck_json: str) -> bytes:
+    """Render a slide deck to .pptx once per deck content."""
+    return render_pptx(SlideDeck.model_validate_json(deck_json), THEME["primary"], THEME["accent"])
+
+
+def render_slide_download(message: dict, index: int):
+    """Offer the structured deck of a message as a PowerPoint file."""
+    deck = (message.get("metadata") or {}).get("slide_deck")
+    if not deck:
+        return
+    st.download_button(
+        "تحميل العرض (PowerPoint)",
+        data=build_deck_file(SlideDeck.model_validate(deck).model_dump_json()),
+        file_name="presentation.pptx",
+        mime="application/vnd.openxmlformats-officedocument.presentationml.presentation",
+        key=f"deck_download_{index}"
+    )
+
+
 def render_chat_message(message: dict, index: int):
     """Render a single chat message."""
     role = message["role"]
 
     with st.chat_message(role):
         st.markdown(message["content"])
+        if role == "assistant":
+            render_slide_download(message, index)
 
         # Show thinking trace if available and enabled
         if (role == "assistant" and
@@ -263,6 +302,22 @@ def render_welcome_message():
                 st.rerun()
 
 
+def render_warm_pool_status():
+    """Readiness of the shared agents and how long the warm-up took."""
+    status = get_warm_pool().status
+    if status.ready:
+        st.caption(f"الوكلاء جاهزون — اكتملت التهيئة المسبقة خلال {status.seconds:.1f} ثانية")
+    elif status.error:
+        st.caption(f"تعذرت التهيئة المسبقة ({status.error}) — تُنشأ الوكلاء عند أول طلب")
+    else:
+        st.caption("جارٍ تهيئة الوكلاء في الخلفية...")
+
+    if status.steps:
+        with st.expander("تفاصيل التهيئة", expanded=False):
+            for step in status.steps:
+                st.caption(f"{step.label}: {step.seconds * 1000:,.0f} ملي ثانية")
+
+
 def render_sidebar():
     """Render the sidebar."""
 
@@ -296,6 +351,9 @@ def render_sidebar():
         # Settings panel
         render_settings_panel()
 
+        # Agent readiness
+        render_warm_pool_status()
+
         st.markdown("---")
 
         # Actions
@@ -305,9 +363,13 @@ def render_sidebar():
                 project_id = st.session_state.get('selected_project', 'project1')
                 messages_key = f"messages_{project_id}"
                 st.session_state[messages_key] = []
-                orchestrator_key = f"orchestrator_{project_id}"
-                if orchestrator_key in st.session_state:
-                    del st.session_state[orchestrator_key]
+                executor = get_job_executor()
+                for job in executor.active(get_job_session_id()):
+                    if job.meta["messages_key"] == messages_key:
+                        executor.cancel(job.id)
+                session_key = f"agent_session_{project_id}"
+                if session_key in st.session_state:
+                    del st.session_state[session_key]
                 st.rerun()
         with col2:
             if st.button("تسجيل الخروج", use_container_width=True):
@@ -316,11 +378,8 @@ def render_sidebar():
                 st.rerun()
 
 
-def process_user_message(prompt: str, messages_key: str):
-    """Process a user message and generate response."""
-    project_id = st.session_state.get('selected_project', 'project1')
-
-    # Build context with uploaded CSV data
+def build_request_context(project_id: str) -> dict:
+    """Prompt context for a request, with the project's uploaded CSV data if any."""
     context = {}
     csv_data = st.session_state.get('uploaded_csv_data', {}).get(project_id, {})
     if csv_data:
@@ -334,32 +393,111 @@ def process_user_message(prompt: str, messages_key: str):
             if len(fdata['rows']) > 20:
                 csv_context_parts.append(f"... و{len(fdata['rows']) - 20} سجلاً إضافياً")
         context['uploaded_data'] = '\n'.join(csv_context_parts)
-
-    # Get response from orchestrator
-    try:
-        orchestrator = get_orchestrator()
+        context['_uploaded_rows'] = [row for fdata in csv_data.values() for row in fdata['rows']]
+    return context
+
+
+def run_agent_request(job, pool, project_id: str, session, prompt: str, context: dict) -> dict:
+    """
+    Runs on a worker thread: no Streamlit calls here, everything needed is passed in.
+
+    The request works on a copy of the session's follow-up state, kept in
+    job.meta until commit_agent_session applies it. Returns the assistant
+    message for the history.
+    """
+    from agents import execution_context
+    orchestrator = pool.orchestrator(project_id)
+    working = session.model_copy(deep=True)
+    job.meta["session"] = working
+    with execution_context(working, cancel_check=lambda: job.cancel_requested) as request:
+        # Live view of every agent's steps, shown while the job runs
+        job.progress = request.progress
         response = orchestrator.invoke(prompt, context=context if context else None)
 
-        # Update active agent
-        st.session_state.active_agent_id = response.metadata.get('agent_id')
+    return {
+        "role": "assistant",
+        "content": response.content,
+        "thinking": response.thinking,
+        "agent": response.agent_name,
+        "agent_en": response.agent_name_en,
+        "metadata": response.metadata
+    }
+
+
+def commit_agent_session(job, session):
+    """Apply a finished request's follow-up state to the live session; only called for DONE jobs."""
+    working = job.meta.pop("session")
+    for field in type(session).model_fields:
+        setattr(session, field, getattr(working, field))
+
+
+def process_user_message(prompt: str, messages_key: str):
+    """Queue a user message for the agents; the answer joins the history when the job finishes."""
+    from utils.jobs import QueueFullError
+    project_id = st.session_state.get('selected_project', 'project1')
+    context = build_request_context(project_id)
+    pool, session = get_warm_pool(), get_agent_session()
+
+    try:
+        get_job_executor().submit(
+            get_job_session_id(),
+            lambda job: run_agent_request(job, pool, project_id, session, prompt, context),
+            label=prompt,
+            meta={"project_id": project_id, "messages_key": messages_key},
+            on_done=lambda job: commit_agent_session(job, session)
+        )
+    except QueueFullError as e:
+        st.warning(f"{e} — انتظر اكتمال أحد الطلبات أو ألغِه")
+        return
 
-        # Add response to history
-        st.session_state[messages_key].append({
-            "role": "assistant",
-            "content": response.content,
-            "thinking": response.thinking,
-            "agent": response.agent_name,
-            "agent_en": response.agent_name_en,
-            "metadata": response.metadata
-        })
+    st.session_state[messages_key].append({
+        "role": "user",
+        "content": prompt
+    })
+
+
+def collect_finished_jobs() -> int:
+    """Move results of finished jobs into their conversations; returns how many were collected."""
+    from utils.jobs import DONE, CANCELLED
+    finished = get_job_executor().take_finished(get_job_session_id())
+    for job in finished:
+        if job.status == DONE:
+            message = job.result
+            if job.meta["project_id"] == st.session_state.get('selected_project', 'project1'):
+                st.session_state.active_agent_id = message["metadata"].get('agent_id')
+        elif job.status == CANCELLED:
+            message = {"role": "assistant", "content": "تم إلغاء الطلب.", "agent": "النظام"}
+        else:
+            message = {"role": "assistant", "content": f"حدث خطأ أثناء المعالجة: {job.error}", "agent": "النظام"}
+        st.session_state.setdefault(job.meta["messages_key"], []).append(message)
+    return len(finished)
+
+
+@st.fragment(run_every=JOB_POLL_SECONDS)
+def render_active_jobs(project_id: str):
+    """Progress of this session's queued and running requests, refreshed without rerunning the page."""
+    from utils.jobs import QUEUED
+    executor = get_job_executor()
+    session_id = get_job_session_id()
+    active = executor.active(session_id)
+    if len(active) < len(executor.jobs(session_id)) or not active:
+        # A job finished: rerun the page so its answer joins the history (and polling stops when idle)
+        st.rerun()
 
-    except Exception as e:
-        error_message = f"حدث خطأ أثناء المعالجة: {str(e)}"
-        st.session_state[messages_key].append({
-            "role": "assistant",
-            "content": error_message,
-            "agent": "النظام"
-        })
+    for job in active:
+        if job.meta["project_id"] != project_id:
+            continue
+        with st.chat_message("assistant"):
+            if job.cancel_requested:
+                st.caption("جارٍ الإلغاء...")
+            elif job.status == QUEUED:
+                st.caption("في الانتظار — يبدأ بعد اكتمال الطلب السابق")
+            else:
+                st.caption(f"جارٍ المعالجة... ({job.elapsed:.0f} ثانية)")
+                if job.progress:
+                    st.caption(job.progress[-1])
+            if not job.cancel_requested and st.button("إلغاء", key=f"cancel_job_{job.id}"):
+                executor.cancel(job.id)
 
 
 def render_chat_interface():
@@ -367,77 +505,27 @@ def render_chat_interface():
     project_id = st.session_state.get('selected_project', 'project1')
     messages_key = f"messages_{project_id}"
     pending_key = f"pending_message_{project_id}"
-    processing_key = f"processing_{project_id}"
 
     # Initialize messages if needed
     if messages_key not in st.session_state:
         st.session_state[messages_key] = []
 
-    # Display chat history first (so user sees existing messages immediately)
-    if not st.session_state[messages_key]:
-        render_welcome_message()
-    else:
-        for i, message in enumerate(st.session_state[messages_key]):
-            render_chat_message(message, i)
+    collect_finished_jobs()
 
-    # Check for pending message — process AFTER displaying history
+    # Queue a pending message first: submitting is instant, the agents run in the background
     if pending_key in st.session_state and st.session_state[pending_key]:
         prompt = st.session_state[pending_key]
-        # Clear pending ONLY after we capture it, and mark as processing
         st.session_state[pending_key] = None
-        st.session_state[processing_key] = True
+        process_user_message(prompt, messages_key)
 
-        # Add user message to history and display it
-        st.session_state[messages_key].append({
-            "role": "user",
-            "content": prompt
-        })
-        with st.chat_message("user"):
-            st.markdown(prompt)
+    if not st.session_state[messages_key]:
+        render_welcome_message()
+    else:
+        for i, message in enumerate(st.session_state[messages_key]):
+            render_chat_message(message, i)
 
-        # Show assistant response with spinner
-        with st.chat_message("assistant"):
-            with st.spinner("جارٍ المعالجة..."):
-                process_user_message(prompt, messages_key)
-
-            # Display the response that was just added
-            if st.session_state[messages_key] and st.session_state[messages_key][-1]["role"] == "assistant":
-                last_msg = st.session_state[messages_key][-1]
-                st.markdown(last_msg["content"])
-
-                if (st.session_state.get('show_thinking', True) and last_msg.get("thinking")):
-                    with st.expander("تفكير الوكيل", expanded=False):
-                        st.markdown(f"""
-                        <div style="
-                            background-color: #f8f9fa;
-                            padding: 12px;
-                            border-radius: 8px;
-                            border-right: 4px solid {THEME['accent']};
-                            margin: 8px 0;
-                            white-space: pre-wrap;
-                            color: #333;
-                            font-size: 0.9em;
-                            direction: rtl;
-                            text-align: right;
-                        ">
-                        {last_msg['thinking'].replace(chr(10), '<br/>')}
-                        </div>
-                        """, unsafe_allow_html=True)
-
-                if last_msg.get("agent"):
-                    st.markdown(f"""
-                    <span style="
-                        background-color: {THEME['primary']};
-                        color: white;
-                        padding: 4px 12px;
-                        border-radius: 16px;
-                        font-size: 12px;
-                        display: inline-block;
-                        margin-top: 8px;
-                    ">{last_msg['agent']}</span>
-                    """, unsafe_allow_html=True)
-
-        st.session_state[processing_key] = False
+    if get_job_executor().active(get_job_session_id()):
+        render_active_jobs(project_id)
 
     # Chat input — always at the bottom
     if prompt := st.chat_input("اكتب رسالتك هنا..."):